@@ -185,6 +185,23 @@ MIDTRANS_SERVER_KEY = ''
 MIDTRANS_IS_PRODUCTION = True #false untuk sandbox
 MIDTRANS_BASE_URL = 'https://app.midtrans.com/snap/v1/transactions'
 
+# Client Midtrans bersama per proses (store/payment_gateway.py)
+MIDTRANS_POOL_SIZE = 20  # koneksi keep-alive per host, juga ukuran thread pool async
+MIDTRANS_CONNECT_TIMEOUT = 5  # detik
+MIDTRANS_READ_TIMEOUT = 20  # detik
+MIDTRANS_RETRIES = 2  # hanya gagal connect dan response 429/503
+MIDTRANS_RETRY_BACKOFF = 0.3  # detik, dikali 2 tiap percobaan
+# Override URL API, misalnya 'http://127.0.0.1:8765/snap/v1' dan
+# 'http://127.0.0.1:8765' untuk manage.py fake_snap_server
+MIDTRANS_SNAP_BASE_URL = None
+MIDTRANS_CORE_API_BASE_URL = None
+# True jika dijalankan lewat ecommerce/asgi.py (uvicorn/daphne): create-transaction/
+# memakai view async sehingga menunggu Midtrans tidak menahan thread worker
+MIDTRANS_ASYNC_CHECKOUT = False
+# Notifikasi diverifikasi lokal lewat signature_key (store/payment_signature.py);
+# jika tanda tangan/nominal tidak cocok, True = cek ulang ke status API, False = tolak
+MIDTRANS_VERIFY_FALLBACK = True
+
 # Default Auto Field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -281,6 +298,79 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
 CART_SESSION_ID = 'cart'
 CART_SESSION_TIMEOUT = 3600  # 1 jam
 
+# Keranjang user login disimpan di cache ini (store/cart_store.py). Di production
+# gunakan cache bersama (Redis/Memcached), locmem hanya berlaku per proses.
+CART_CACHE_ALIAS = 'default'
+# Perubahan keranjang ditulis ke database paling lambat setelah sekian detik
+# atau sekian baris berubah (selain itu lewat command flush_carts dan checkout)
+CART_WRITE_BEHIND_SECONDS = 30
+CART_WRITE_BEHIND_MAX_LINES = 20
+
+# Keranjang terbuka (Order complete=False) yang tidak berubah selama sekian hari
+# dihapus oleh command compact_abandoned_carts
+CART_ABANDONED_DAYS = 30
+
+# Umur cookie keranjang guest (format v2 bertanda tangan, store/cart_cookie.py)
+CART_COOKIE_MAX_AGE = 60 * 60 * 24 * 30  # 30 hari
+
+# Maksimal operasi per request batch keranjang (/cart/batch/)
+CART_BATCH_MAX_OPERATIONS = 50
+
+# Stok direservasi saat transaksi pembayaran dibuat dan dilepas jika belum
+# dibayar setelah sekian detik (store/inventory.py, command expire_stock_reservations)
+STORE_RESERVATION_TTL = 15 * 60
+# Stok di bawah atau sama dengan ini berstatus "Stok Menipis"
+STORE_LOW_STOCK_THRESHOLD = 5
+# Jumlah shard default untuk produk laris (command shard_stock)
+STORE_STOCK_SHARDS = 8
+
+# Admission control checkout saat flash sale (store/admission.py): batas
+# checkout bersamaan per proses worker dan per produk; kelebihannya diantrekan
+# (HTTP 429 + tiket) sampai CHECKOUT_QUEUE_MAX, selebihnya langsung ditolak 429
+CHECKOUT_ADMISSION_ENABLED = False
+CHECKOUT_MAX_CONCURRENT = 20
+CHECKOUT_MAX_CONCURRENT_PER_PRODUCT = 5
+CHECKOUT_QUEUE_MAX = 500
+CHECKOUT_TICKET_TTL = 300  # tiket hangus jika tidak dipoll selama ini (detik)
+CHECKOUT_SLOT_TIMEOUT = 60  # slot produk milik worker yang mati terlepas setelah ini
+CHECKOUT_POLL_INTERVAL = 2
+CHECKOUT_SHED_RETRY_AFTER = 30
+
+# Idempotency create_transaction/processOrder (store/idempotency.py): hasil
+# request sukses disimpan sekian detik untuk dikembalikan ke retry/double-click
+IDEMPOTENCY_KEY_TTL = 600
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # request pertama dianggap mati setelah ini
+IDEMPOTENCY_WAIT_TIMEOUT = 15  # lama duplikat bersamaan menunggu request pertama
+
+# Inbox notifikasi Midtrans (store/payment_inbox.py): webhook hanya menyimpan
+# notifikasi, command process_payment_notifications yang memprosesnya
+PAYMENT_INBOX_BATCH_SIZE = 50
+PAYMENT_INBOX_LOCK_TIMEOUT = 60  # notifikasi milik worker yang mati diambil ulang setelah ini
+PAYMENT_INBOX_MAX_ATTEMPTS = 8  # setelah itu ditandai failed (bisa diulang dari admin)
+PAYMENT_INBOX_RETRY_BACKOFF = 5  # detik, dikali 2 tiap percobaan
+PAYMENT_INBOX_RETENTION_DAYS = 7  # notifikasi selesai dihapus purge_payment_notifications
+
+# Posisi terakhir command reconcile_transactions, untuk melanjutkan run yang terputus
+RECONCILE_CHECKPOINT_FILE = os.path.join(BASE_DIR, 'reconcile_checkpoint.json')
+
+# Backend pencarian produk (dotted path). None = pilih otomatis sesuai
+# database: MySQL FULLTEXT, SQLite FTS5, selain itu icontains.
+STORE_SEARCH_BACKEND = None
+
+# Lama cache fragmen kartu produk (detik); key ikut berubah saat produk diubah
+PRODUCT_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Listing produk memakai keyset pagination; ?page=N lama hanya dilayani
+# sampai halaman ini. Total produk untuk UI di-cache (detik).
+STORE_MAX_OFFSET_PAGE = 5
+STORE_COUNT_CACHE_TIMEOUT = 300
+
+# Lama cache facet katalog (detik); juga dibuang otomatis saat produk/kategori berubah
+STORE_FACET_CACHE_TIMEOUT = 60
+
+# Jumlah produk terkait di halaman detail (co-purchase, lalu kategori yang sama)
+STORE_RELATED_PRODUCTS = 4
+
 # ===========================
 # ADMIN INTERFACE CONFIGURATION
 # ===========================
@@ -21,6 +21,10 @@
             tablet: 992,
             desktop: 1200
         },
+
+        // Keranjang: klik digabung lalu dikirim sebagai satu request batch
+        cartBatchUrl: '/cart/batch/',
+        cartBatchDelay: 400, // ms sejak klik terakhir
         
         // Selectors
         selectors: {
@@ -422,31 +426,9 @@
         button.disabled = true;
         button.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
         
-        // Prepare request data
-        const requestData = {
-            productId: productId,
-            action: action
-        };
-        
-        if (variantId) {
-            requestData.variantId = variantId;
-        }
-        
-        // Make AJAX request
-        fetch('/update_item/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': getCsrfToken()
-            },
-            body: JSON.stringify(requestData)
-        })
-        .then(response => response.json())
+        // Klik dikumpulkan dan dikirim sebagai satu request /cart/batch/
+        queueCartChange(productId, action, variantId)
         .then(data => {
-            if (data.error) {
-                throw new Error(data.error);
-            }
-            
             // Update UI
             updateCartUI(data);
             
@@ -495,6 +477,76 @@
         });
     }
 
+    /**
+     * Debounced cart batch client: klik yang berdekatan digabung per baris
+     * (produk + varian) lalu dikirim sekali ke /cart/batch/
+     */
+    const pendingCartOperations = new Map();
+    let pendingCartClicks = [];
+    let cartBatchTimer = null;
+
+    function queueCartChange(productId, action, variantId = null, quantity = 1) {
+        const key = `${productId}:${variantId || ''}`;
+        const operation = pendingCartOperations.get(key) || { productId, variantId, delta: 0 };
+
+        if (action === 'add') {
+            operation.delta += quantity;
+        } else if (action === 'remove') {
+            operation.delta -= quantity;
+        } else if (action === 'delete') {
+            operation.remove = true;
+            operation.delta = 0;
+        }
+        pendingCartOperations.set(key, operation);
+
+        // Debounce: tunda pengiriman sampai user berhenti mengklik
+        clearTimeout(cartBatchTimer);
+        cartBatchTimer = setTimeout(flushCartChanges, MANIPI_CONFIG.cartBatchDelay);
+        return new Promise((resolve, reject) => {
+            pendingCartClicks.push({ productId, variantId, resolve, reject });
+        });
+    }
+
+    function flushCartChanges() {
+        if (pendingCartOperations.size === 0) return;
+
+        const operations = Array.from(pendingCartOperations.values());
+        const clicks = pendingCartClicks;
+        pendingCartOperations.clear();
+        pendingCartClicks = [];
+
+        fetch(MANIPI_CONFIG.cartBatchUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCsrfToken()
+            },
+            body: JSON.stringify({ operations })
+        })
+        .then(response => response.json().then(data => {
+            if (!response.ok || data.error) {
+                throw new Error(data.error || `HTTP ${response.status}`);
+            }
+            return data;
+        }))
+        .then(data => {
+            // Tiap klik menerima ringkasan keranjang plus jumlah barisnya sendiri
+            clicks.forEach(click => {
+                const item = (data.items || []).find(entry =>
+                    String(entry.productId) === String(click.productId) &&
+                    String(entry.variantId || '') === String(click.variantId || '')
+                );
+                click.resolve(Object.assign({}, data, {
+                    productId: click.productId,
+                    quantity: item ? item.quantity : undefined
+                }));
+            });
+        })
+        .catch(error => {
+            clicks.forEach(click => click.reject(error));
+        });
+    }
+
     /**
      * Initialize wishlist integration
      */
@@ -901,6 +953,7 @@
         // Utilities
         formatPrice: formatPrice,
         getCsrfToken: getCsrfToken,
+        queueCartChange: queueCartChange,
         trackEvent: trackEvent,
         throttle: throttle,
         debounce: debounce,
@@ -298,19 +298,8 @@ class StoreManager {
         // Add loading state
         this.setButtonLoading(button, true);
 
-        // AJAX request to update cart
-        fetch('/update_item/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': this.getCSRFToken(),
-            },
-            body: JSON.stringify({
-                productId: productId,
-                action: action
-            })
-        })
-        .then(response => response.json())
+        // Perubahan keranjang lewat client batch (debounced) dari main.js
+        window.Manipi.queueCartChange(productId, action, button.dataset.variant || null)
         .then(data => {
             this.setButtonLoading(button, false);
             this.showCartFeedback(button, 'added');
@@ -488,26 +477,8 @@ class StoreManager {
     }
 
     addToCartWithQuantity(productId, quantity) {
-        const requests = [];
-        
-        // Make multiple requests for the specified quantity
-        for (let i = 0; i < quantity; i++) {
-            requests.push(
-                fetch('/update_item/', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'X-CSRFToken': this.getCSRFToken(),
-                    },
-                    body: JSON.stringify({
-                        productId: productId,
-                        action: 'add'
-                    })
-                })
-            );
-        }
-
-        Promise.all(requests)
+        // Satu operasi batch dengan delta = quantity, bukan satu request per item
+        window.Manipi.queueCartChange(productId, 'add', null, quantity)
             .then(() => {
                 this.updateCartCounter();
                 this.showNotification(`${quantity} item(s) added to cart!`, 'success');
@@ -5,10 +5,10 @@ const updateBtns = document.querySelectorAll('.update-cart');
 updateBtns.forEach((btn) => {
     btn.addEventListener('click', async () => {
         const productId = btn.dataset.product;
+        const variantId = btn.dataset.variant || null;
         const action = btn.dataset.action;
 
         console.log(`Product ID: ${productId}, Action: ${action}`);
-        console.log(`User: ${user}`);
 
         // Add animation feedback for button click
         animateButton(btn);
@@ -17,33 +17,57 @@ updateBtns.forEach((btn) => {
         const spinner = createLoadingSpinner();
         btn.appendChild(spinner);
 
-        // Handle cart update based on user authentication
-        if (user === 'AnonymousUser') {
-            addCookieItem(productId, action);
-        } else {
-            await updateUserOrder(productId, action);
-        }
+        // Keranjang guest juga lewat server: cookie-nya ditandatangani server
+        await queueCartOperation(productId, action, variantId);
 
         // Remove loading spinner after action
         spinner.remove();
     });
 });
 
-// Function to update order for authenticated users
-const updateUserOrder = async (productId, action) => {
-    console.log('User is authenticated, sending data...');
+// Klik yang berdekatan dikumpulkan lalu dikirim sebagai satu request batch
+const CART_BATCH_URL = '/cart/batch/';
+const CART_BATCH_DELAY = 400; // ms sejak klik terakhir
+const pendingOperations = new Map();
+const pendingClicks = [];
+let batchTimer = null;
+
+// Function to queue a cart change (guest and authenticated users)
+const queueCartOperation = (productId, action, variantId = null) => {
+    const key = `${productId}:${variantId || ''}`;
+    const operation = pendingOperations.get(key) || { productId, variantId, delta: 0 };
+
+    if (action === 'add') {
+        operation.delta += 1;
+    } else if (action === 'remove') {
+        operation.delta -= 1;
+    } else if (action === 'delete') {
+        operation.remove = true;
+    }
+    pendingOperations.set(key, operation);
+
+    // Debounce: tunda pengiriman sampai user berhenti mengklik
+    clearTimeout(batchTimer);
+    batchTimer = setTimeout(flushCartOperations, CART_BATCH_DELAY);
+    return new Promise((resolve) => pendingClicks.push(resolve));
+};
+
+// Kirim semua operasi yang tertunda dalam satu request
+const flushCartOperations = async () => {
+    if (pendingOperations.size === 0) return;
 
-    const url = '/update_item/';
-    const payload = { productId, action };
+    const operations = Array.from(pendingOperations.values());
+    pendingOperations.clear();
+    console.log('Sending cart batch:', operations);
 
     try {
-        const response = await fetch(url, {
+        const response = await fetch(CART_BATCH_URL, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': csrftoken,
             },
-            body: JSON.stringify(payload),
+            body: JSON.stringify({ operations }),
         });
 
         const data = await response.json();
@@ -53,37 +77,12 @@ const updateUserOrder = async (productId, action) => {
         location.reload();
     } catch (error) {
         console.error('Error updating order:', error);
+    } finally {
+        // Selesaikan semua klik yang ikut dalam batch ini
+        pendingClicks.splice(0).forEach((resolve) => resolve());
     }
 };
 
-// Function to handle cart updates for anonymous users
-const addCookieItem = (productId, action) => {
-    console.log('User is not authenticated');
-
-    if (action === 'add') {
-        cart[productId] = cart[productId] || { quantity: 0 };
-        cart[productId].quantity += 1;
-    }
-
-    if (action === 'remove') {
-        if (cart[productId]) {
-            cart[productId].quantity -= 1;
-
-            // Remove item from cart if quantity is zero or less
-            if (cart[productId].quantity <= 0) {
-                console.log('Item removed from cart');
-                delete cart[productId];
-            }
-        }
-    }
-
-    console.log('Updated Cart:', cart);
-    document.cookie = `cart=${JSON.stringify(cart)};domain=;path=/`;
-
-    // Reload page to reflect changes
-    location.reload();
-};
-
 // Function to add animation feedback to buttons
 const animateButton = (btn) => {
     btn.style.transition = 'transform 0.2s ease-in-out';
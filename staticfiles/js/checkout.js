@@ -34,21 +34,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
             };
             
-            // Kirim request untuk membuat transaksi
-            fetch('/create-transaction/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': getCookie('csrftoken')
-                },
-                body: JSON.stringify(orderData)
-            })
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('Network response was not ok');
-                }
-                return response.json();
-            })
+            // Kirim request untuk membuat transaksi (antre dulu jika checkout sedang ramai)
+            requestTransaction(orderData, newIdempotencyKey(), null, paymentButton)
             .then(data => {
                 if (data.redirect_url) {
                     // Redirect ke halaman pembayaran Midtrans
@@ -62,12 +49,84 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Restore button state
                 paymentButton.innerHTML = 'Bayar Sekarang';
                 paymentButton.disabled = false;
-                showErrorAlert('Terjadi kesalahan saat memproses pembayaran. Silakan coba lagi nanti.');
+                showErrorAlert(error.userMessage || 'Terjadi kesalahan saat memproses pembayaran. Silakan coba lagi nanti.');
             });
         });
     }
 });
 
+// Buat transaksi; saat checkout ramai server membalas 429 dengan tiket antrian,
+// posisi tiket dipoll sampai giliran lalu request diulang dengan tiket tersebut
+function requestTransaction(orderData, idempotencyKey, ticket, paymentButton) {
+    const headers = {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': getCookie('csrftoken'),
+        // Key yang sama untuk retry/antrian agar server tidak membuat transaksi ganda
+        'Idempotency-Key': idempotencyKey
+    };
+    if (ticket) {
+        headers['X-Checkout-Ticket'] = ticket;
+    }
+    return fetch('/create-transaction/', {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify(orderData)
+    })
+    .then(response => response.json().then(data => ({ response, data })))
+    .then(({ response, data }) => {
+        if (response.status === 429 && data.queued) {
+            return waitForTurn(data, response, paymentButton)
+                .then(() => requestTransaction(orderData, idempotencyKey, data.ticket, paymentButton));
+        }
+        if (!response.ok) {
+            const error = new Error(data.error || 'Network response was not ok');
+            if (response.status === 429 || response.status === 409) {
+                error.userMessage = data.error;
+            }
+            throw error;
+        }
+        return data;
+    });
+}
+
+function newIdempotencyKey() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+function waitForTurn(queue, response, paymentButton) {
+    const delay = (parseInt(response.headers.get('Retry-After'), 10) || 2) * 1000;
+    const showPosition = (status) => {
+        if (status.status === 'waiting') {
+            paymentButton.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> ' +
+                'Antrian ke-' + status.position + ', sekitar ' + status.eta + ' detik';
+        }
+    };
+    showPosition(queue);
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(queue.status_url)
+            .then(res => res.json())
+            .then(status => {
+                if (status.status === 'ready') {
+                    resolve();
+                } else if (status.status === 'expired') {
+                    const error = new Error('Queue ticket expired');
+                    error.userMessage = 'Waktu antrian habis. Silakan coba lagi.';
+                    reject(error);
+                } else {
+                    showPosition(status);
+                    setTimeout(poll, delay);
+                }
+            })
+            .catch(reject);
+        };
+        setTimeout(poll, delay);
+    });
+}
+
 // Fungsi validasi form checkout
 function validateCheckoutForm() {
     let isValid = true;
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import *
 
 
@@ -20,16 +21,18 @@ class ProductReviewInline(admin.TabularInline):
 # Product Admin with improved display
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'format_discount_price', 'kategori', 'stock', 'stock_status', 'is_featured', 'is_new')
-    list_filter = ('kategori', 'stock_status', 'is_featured', 'is_new')
+    list_display = ('name', 'price', 'format_discount_price', 'category', 'stock', 'stock_status', 'is_featured', 'is_new')
+    list_filter = ('category', 'stock_status', 'is_featured', 'is_new')
+    list_select_related = ('category',)
     search_fields = ('name', 'description', 'sku')
-    readonly_fields = ('created_at', 'updated_at', 'sales_count', 'rating', 'review_count')
+    readonly_fields = ('created_at', 'updated_at', 'sales_count', 'stock_shards', 'rating', 'review_count', 'rating_sum',
+                       'rating_5_count', 'rating_4_count', 'rating_3_count', 'rating_2_count', 'rating_1_count')
     fieldsets = (
         ('Informasi Dasar', {
-            'fields': ('name', 'slug', 'description', 'kategori', 'sku')
+            'fields': ('name', 'slug', 'description', 'category', 'sku')
         }),
         ('Harga & Stok', {
-            'fields': ('price', 'discount_percent', 'stock', 'stock_status', 'sales_count')
+            'fields': ('price', 'discount_percent', 'stock', 'stock_status', 'stock_shards', 'sales_count')
         }),
         ('Gambar Produk', {
             'fields': ('image', 'image_2', 'image_3', 'image_4')
@@ -38,7 +41,8 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('digital', 'features', 'specifications', 'weight', 'dimensions')
         }),
         ('Rating & Review', {
-            'fields': ('rating', 'review_count')
+            'fields': ('rating', 'review_count', 'rating_sum', 'rating_5_count', 'rating_4_count',
+                       'rating_3_count', 'rating_2_count', 'rating_1_count')
         }),
         ('Metadata', {
             'fields': ('is_featured', 'is_new', 'created_at', 'updated_at')
@@ -54,6 +58,10 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
 
+    def get_queryset(self, request):
+        # Jumlah produk per subtree dihitung sekaligus untuk semua baris
+        return super().get_queryset(request).select_related('parent').with_product_counts()
+
 @admin.register(ProductReview)
 class ProductReviewAdmin(admin.ModelAdmin):
     list_display = ('product', 'user', 'rating', 'created_at', 'is_verified_purchase')
@@ -80,12 +88,44 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('complete', 'date_ordered')
     search_fields = ('customer__name', 'customer__email', 'id')
 
+    def get_queryset(self, request):
+        # Total dan jumlah item dihitung di database untuk semua baris sekaligus
+        return super().get_queryset(request).select_related('customer').with_totals()
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('product', 'variant', 'order', 'quantity', 'get_total')
     list_filter = ('order__complete', 'date_added')
     search_fields = ('product__name', 'order__id')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'variant__product', 'order')
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'product', 'variant', 'quantity', 'status', 'expires_at')
+    list_filter = ('status',)
+    search_fields = ('product__name', 'order__id')
+    list_select_related = ('product', 'variant__product')
+    readonly_fields = ('order', 'product', 'variant', 'shard', 'quantity', 'status', 'expires_at',
+                       'created_at', 'updated_at')
+
+@admin.register(PaymentNotification)
+class PaymentNotificationAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('order_id',)
+    readonly_fields = ('digest', 'order_id', 'body', 'status', 'attempts', 'available_at', 'last_error',
+                       'received_at', 'processed_at')
+    actions = ['retry_notifications']
+
+    @admin.action(description="Proses ulang notifikasi terpilih")
+    def retry_notifications(self, request, queryset):
+        updated = queryset.exclude(status=PaymentNotification.DONE).update(
+            status=PaymentNotification.PENDING, attempts=0, available_at=timezone.now(),
+        )
+        self.message_user(request, f"{updated} notifikasi dijadwalkan ulang.")
+
 @admin.register(ShippingAddress)
 class ShippingAddressAdmin(admin.ModelAdmin):
     list_display = ('customer', 'order', 'address', 'city', 'state', 'zipcode')
@@ -0,0 +1,237 @@
+"""
+Admission control checkout untuk flash sale.
+
+create_transaction dan processOrder dibungkus checkout_admission. Request
+hanya diteruskan ke view jika masih ada slot: maksimal
+CHECKOUT_MAX_CONCURRENT checkout bersamaan per proses worker (node) dan
+CHECKOUT_MAX_CONCURRENT_PER_PRODUCT checkout bersamaan per produk di semua
+node (slot di cache bersama). Request yang tidak kebagian slot mendapat
+tiket antrian (HTTP 429 + Retry-After) yang posisinya bisa dipantau lewat
+checkout_queue_status; bila antrian sudah CHECKOUT_QUEUE_MAX, request
+langsung ditolak 429 tanpa tiket.
+
+Antrian FIFO memakai dua counter di cache: 'seq' (nomor tiket terakhir)
+dan 'admitted' (nomor tiket terakhir yang dipersilakan masuk). Setiap
+checkout yang selesai memajukan 'admitted' satu langkah. Jika antrian tidak
+maju selama dua kali rata-rata lama checkout (tiket ditinggal pemiliknya,
+atau tidak ada checkout yang sedang berjalan), polling memajukannya sebanyak
+slot kosong di node. Slot produk memakai cache.add dengan timeout, jadi slot
+milik worker yang mati terlepas sendiri.
+
+Nonaktif secara default (CHECKOUT_ADMISSION_ENABLED).
+"""
+import math
+import threading
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.urls import reverse
+
+from . import cart_cookie, cart_store
+
+SEQ_KEY = 'checkout:queue:seq'
+ADMITTED_KEY = 'checkout:queue:admitted'
+ADVANCED_AT_KEY = 'checkout:queue:advanced_at'
+SERVICE_TIME_KEY = 'checkout:service_time'
+TICKET_HEADER = 'HTTP_X_CHECKOUT_TICKET'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _ticket_key(ticket):
+    return f'checkout:ticket:{ticket}'
+
+
+class _NodeSlots:
+    """Jumlah checkout yang sedang berjalan di proses ini."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.active >= limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def free(self, limit):
+        return max(limit - self.active, 0)
+
+_node_slots = _NodeSlots()
+
+
+def _counter(key):
+    return cache.get(key) or 0
+
+def _incr(key, delta=1):
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Key terhapus di antara add dan incr (cache di-flush)
+        cache.set(key, delta, None)
+        return delta
+
+def _advance(count=1):
+    cache.set(ADVANCED_AT_KEY, time.time(), None)
+    return _incr(ADMITTED_KEY, count)
+
+def _cart_product_ids(request):
+    if request.user.is_authenticated:
+        lines = cart_store.cart_lines(cart_store.get_cart(request.user.id))
+    else:
+        lines = cart_cookie.read(request)[0]
+    return sorted({product_id for product_id, _, _ in lines})
+
+def _acquire_product_slots(product_ids, limit, timeout):
+    """Satu slot per produk (urutan tetap); None jika salah satu produk sudah penuh."""
+    acquired = []
+    for product_id in product_ids:
+        keys = [f'checkout:slot:{product_id}:{index}' for index in range(limit)]
+        taken, token = cache.get_many(keys), uuid.uuid4().hex
+        for key in keys:
+            if key not in taken and cache.add(key, token, timeout):
+                acquired.append((key, token))
+                break
+        else:
+            _release_product_slots(acquired)
+            return None
+    return acquired
+
+def _release_product_slots(slots):
+    for key, token in slots:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+def _acquire(request):
+    if not _node_slots.acquire(_setting('CHECKOUT_MAX_CONCURRENT', 20)):
+        return None
+    per_product = _setting('CHECKOUT_MAX_CONCURRENT_PER_PRODUCT', 5)
+    if not per_product:
+        return []
+    slots = _acquire_product_slots(
+        _cart_product_ids(request), per_product, _setting('CHECKOUT_SLOT_TIMEOUT', 60),
+    )
+    if slots is None:
+        _node_slots.release()
+    return slots
+
+def _release(slots, elapsed):
+    _release_product_slots(slots)
+    _node_slots.release()
+    # Satu checkout selesai, satu tiket berikutnya dipersilakan masuk
+    if _counter(SEQ_KEY) > _counter(ADMITTED_KEY):
+        _advance()
+    # Rata-rata bergerak lama checkout untuk perkiraan waktu tunggu
+    previous = cache.get(SERVICE_TIME_KEY)
+    cache.set(SERVICE_TIME_KEY, elapsed if previous is None else previous * 0.8 + elapsed * 0.2, None)
+
+def _eta(position):
+    service_time = cache.get(SERVICE_TIME_KEY) or 1.0
+    return math.ceil(position / max(_setting('CHECKOUT_MAX_CONCURRENT', 20), 1) * service_time)
+
+def ticket_status(ticket):
+    """Status tiket antrian: waiting (dengan position/eta), ready, atau expired."""
+    number = cache.get(_ticket_key(ticket)) if ticket else None
+    if number is None:
+        return {'status': 'expired'}
+    cache.touch(_ticket_key(ticket), _setting('CHECKOUT_TICKET_TTL', 300))
+
+    admitted = _counter(ADMITTED_KEY)
+    if number > admitted:
+        stalled = time.time() - (cache.get(ADVANCED_AT_KEY) or 0) > 2 * (cache.get(SERVICE_TIME_KEY) or 1.0)
+        free = _node_slots.free(_setting('CHECKOUT_MAX_CONCURRENT', 20))
+        if stalled and free:
+            admitted = _advance(min(free, number - admitted))
+    if number <= admitted:
+        return {'status': 'ready', 'position': 0, 'eta': 0}
+    position = number - admitted
+    return {'status': 'waiting', 'position': position, 'eta': _eta(position)}
+
+def _queued_response(ticket):
+    """429 dengan tiket antrian; tiket baru dibuat jika belum punya dan antrian belum penuh."""
+    if ticket is None:
+        if _counter(SEQ_KEY) - _counter(ADMITTED_KEY) >= _setting('CHECKOUT_QUEUE_MAX', 500):
+            response = JsonResponse({
+                'error': 'Checkout sedang penuh, silakan coba beberapa saat lagi.',
+                'queued': False,
+            }, status=429)
+            response['Retry-After'] = str(_setting('CHECKOUT_SHED_RETRY_AFTER', 30))
+            return response
+        ticket = uuid.uuid4().hex
+        cache.set(_ticket_key(ticket), _incr(SEQ_KEY), _setting('CHECKOUT_TICKET_TTL', 300))
+
+    status = ticket_status(ticket)
+    response = JsonResponse({
+        'error': 'Checkout sedang ramai, Anda masuk antrian.',
+        'queued': True,
+        'ticket': ticket,
+        'status_url': reverse('checkout_queue_status', args=[ticket]),
+        **status,
+    }, status=429)
+    response['Retry-After'] = str(_setting('CHECKOUT_POLL_INTERVAL', 2))
+    return response
+
+def _admit(request):
+    """(slots, None) jika request boleh masuk, (None, response 429) jika harus antre."""
+    ticket = request.META.get(TICKET_HEADER)
+    number = cache.get(_ticket_key(ticket)) if ticket else None
+    if number is None:
+        ticket = None
+        # Pendatang baru antre di belakang tiket yang sudah menunggu
+        if _counter(SEQ_KEY) > _counter(ADMITTED_KEY):
+            return None, _queued_response(None)
+    elif number > _counter(ADMITTED_KEY):
+        return None, _queued_response(ticket)
+
+    slots = _acquire(request)
+    if slots is None:
+        return None, _queued_response(ticket)
+    if ticket:
+        cache.delete(_ticket_key(ticket))
+    return slots, None
+
+def checkout_admission(view):
+    """Decorator untuk view checkout (sync maupun async), lihat docstring modul."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not _setting('CHECKOUT_ADMISSION_ENABLED', False) or request.method != 'POST':
+                return await view(request, *args, **kwargs)
+
+            slots, response = await sync_to_async(_admit)(request)
+            if response is not None:
+                return response
+            started = time.monotonic()
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(_release)(slots, time.monotonic() - started)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _setting('CHECKOUT_ADMISSION_ENABLED', False) or request.method != 'POST':
+            return view(request, *args, **kwargs)
+
+        slots, response = _admit(request)
+        if response is not None:
+            return response
+        started = time.monotonic()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _release(slots, time.monotonic() - started)
+    return wrapper
@@ -0,0 +1,96 @@
+"""
+Cache fragmen HTML kartu produk untuk grid katalog.
+
+Key berisi id produk dan updated_at, jadi perubahan produk otomatis memakai
+key baru. Perubahan varian (yang tidak menyentuh updated_at produk) dan
+penghapusan produk dibersihkan lewat signal di store/signals.py.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.template.loader import render_to_string
+
+logger = logging.getLogger('store')
+
+CARD_TEMPLATE = 'store/includes/product_card.html'
+
+# Dikirim setiap kali satu grid dirender: hits, misses, render_seconds
+product_cards_rendered = Signal()
+
+def card_cache_key(product):
+    updated = product.updated_at.timestamp() if product.updated_at else 0
+    return f"product_card:{product.pk}:{updated:.6f}"
+
+def invalidate_card(product):
+    cache.delete(card_cache_key(product))
+
+def render_product_cards(products):
+    """
+    Render semua kartu produk. Kartu yang sudah ada di cache diambil dengan
+    satu get_many, hanya kartu yang hilang yang dirender lalu disimpan
+    dengan satu set_many.
+    """
+    products = list(products)
+    keys = {product.pk: card_cache_key(product) for product in products}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = {}
+    started = time.perf_counter()
+    for product in products:
+        if keys[product.pk] not in cached:
+            missing[keys[product.pk]] = render_to_string(CARD_TEMPLATE, {'product': product})
+    render_seconds = time.perf_counter() - started
+
+    if missing:
+        cache.set_many(missing, timeout=getattr(settings, 'PRODUCT_CARD_CACHE_TIMEOUT', 60 * 60 * 24))
+
+    product_cards_rendered.send(
+        sender=render_product_cards,
+        hits=len(products) - len(missing),
+        misses=len(missing),
+        render_seconds=render_seconds,
+    )
+    cards = {**cached, **missing}
+    return ''.join(cards[keys[product.pk]] for product in products)
+
+
+class CardCacheStats:
+    """Statistik hit ratio dan estimasi waktu render yang dihemat (per proses)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.render_seconds = 0.0
+
+    def record(self, sender, hits, misses, render_seconds, **kwargs):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.render_seconds += render_seconds
+        logger.debug("product cards: %d hit, %d miss, render %.1f ms",
+                     hits, misses, render_seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            avg_render = self.render_seconds / self.misses if self.misses else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                # Setiap hit menghemat kira-kira rata-rata waktu render satu kartu
+                'render_ms_saved': self.hits * avg_render * 1000,
+            }
+
+
+stats = CardCacheStats()
+product_cards_rendered.connect(stats.record, dispatch_uid='store.card_cache.stats')
@@ -0,0 +1,105 @@
+"""
+Cookie keranjang guest.
+
+Format v2 adalah token django.core.signing (HMAC dengan SECRET_KEY,
+dikompresi) berisi JSON ringkas:
+
+    {"v": 2, "n": 4, "t": 23000, "l": [12, 0, 3, 15, 4, 1]}
+
+'l' berisi baris keranjang yang dipadatkan menjadi deret integer
+(product_id, variant_id atau 0, quantity), 'n' jumlah item dan 't' snapshot
+total harga (Rupiah) saat cookie terakhir ditulis server. Badge header cukup
+membaca 'n'/'t' tanpa query; harga divalidasi ulang di halaman cart/checkout.
+
+Cookie format lama (JSON mentah {"12": {"quantity": 3}}) tetap dibaca dan
+diganti v2 pada penulisan berikutnya.
+"""
+import json
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core import signing
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'store.cart.cookie'
+VERSION = 2
+
+
+def _legacy_lines(raw):
+    """Baris dari cookie JSON lama; cookie rusak dianggap keranjang kosong."""
+    try:
+        cart = json.loads(unquote(raw))
+    except ValueError:
+        return []
+    if not isinstance(cart, dict):
+        return []
+    lines = []
+    for product_id, line in cart.items():
+        try:
+            quantity = line['quantity']
+            if quantity > 0: # items with negative quantity = lot of freebies
+                variant_id = line.get('variant_id')
+                lines.append((int(product_id), int(variant_id) if variant_id else None, quantity))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            pass
+    return lines
+
+def decode(raw):
+    """
+    Baca nilai cookie. Mengembalikan (lines, snapshot) dengan snapshot
+    {'n': jumlah item, 't': total} untuk v2, atau None untuk format lama.
+    """
+    if not raw:
+        return [], None
+    if unquote(raw).lstrip().startswith('{'):
+        return _legacy_lines(raw), None
+    try:
+        data = signing.loads(raw, salt=COOKIE_SALT)
+        if data.get('v') != VERSION:
+            raise ValueError(data.get('v'))
+        packed = data['l']
+        lines = [
+            (int(packed[i]), int(packed[i + 1]) or None, int(packed[i + 2]))
+            for i in range(0, len(packed) - len(packed) % 3, 3)
+            if int(packed[i + 2]) > 0
+        ]
+        return lines, {'n': int(data['n']), 't': int(data['t'])}
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return [], None
+
+def encode(lines, count, total):
+    packed = []
+    for product_id, variant_id, quantity in lines:
+        packed += [int(product_id), int(variant_id or 0), int(quantity)]
+    return signing.dumps(
+        {'v': VERSION, 'n': int(count), 't': int(round(total)), 'l': packed},
+        salt=COOKIE_SALT, compress=True,
+    )
+
+def read(request):
+    return decode(request.COOKIES.get(COOKIE_NAME))
+
+def write(response, lines, count, total):
+    response.set_cookie(
+        COOKIE_NAME, encode(lines, count, total),
+        max_age=getattr(settings, 'CART_COOKIE_MAX_AGE', 60 * 60 * 24 * 30),
+        httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+def lines_from_items(items):
+    """Baris keranjang dari items hasil cookieCart/price_cart_lines (produk terhapus sudah terbuang)."""
+    return [
+        (item['id'], item['variant']['id'] if item.get('variant') else None, item['quantity'])
+        for item in items
+    ]
+
+def sync(request, response, data):
+    """
+    Tulis ulang cookie setelah harga divalidasi ulang (halaman cart/checkout)
+    bila formatnya masih lama atau snapshot jumlah/total sudah berubah.
+    """
+    order = data['order']
+    lines, snapshot = read(request)
+    fresh = {'n': int(order['get_cart_items']), 't': int(round(order['get_cart_total']))}
+    if lines and snapshot != fresh:
+        write(response, lines_from_items(data['items']), fresh['n'], fresh['t'])
@@ -0,0 +1,189 @@
+"""
+Keranjang user login yang disimpan di cache (write-behind ke Order/OrderItem).
+
+Isi cache per user berbentuk ringkas:
+
+    {'l': {'12:0': 3, '12:5': 1}, 'd': ['12:0'], 't': 1712345678.0}
+
+'l' adalah baris keranjang ("product_id:variant_id", 0 = tanpa varian) ->
+quantity, 'd' baris yang belum ditulis ke database dan 't' waktu perubahan
+pertama yang belum ditulis. Cache menjadi sumber kebenaran untuk keranjang
+terbuka: badge jumlah item di halaman katalog dibaca tanpa query, sedangkan
+perubahan ditulis ke OrderItem oleh flush() -- otomatis saat perubahan
+tertunda sudah cukup lama/banyak, lewat command flush_carts, dan wajib secara
+sinkron sebelum cart/checkout membaca Order dari database.
+
+Perubahan yang belum di-flush hilang jika entry cache terhapus, karena itu
+batas write-behind dibuat pendek. Cache harus dibagi antar proses (Redis atau
+Memcached) di production; locmem hanya cocok untuk development satu proses.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Customer, Order, OrderItem
+
+DIRTY_KEY = 'cart:dirty'
+
+
+class CartBusy(Exception):
+    """Keranjang sedang dikunci request lain terlalu lama."""
+
+
+def _cache():
+    return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+def _cart_key(user_id):
+    return f'cart:user:{user_id}'
+
+def line_key(product_id, variant_id=None):
+    return f'{product_id}:{variant_id or 0}'
+
+def parse_line_key(key):
+    product_id, variant_id = key.split(':')
+    return int(product_id), int(variant_id) or None
+
+@contextmanager
+def _lock(name, wait=2.0):
+    """Lock sederhana berbasis cache.add (atomik di locmem, Redis dan Memcached)."""
+    cache = _cache()
+    lock_key, token = f'cart:lock:{name}', uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(lock_key, token, 10):
+        if time.monotonic() > deadline:
+            raise CartBusy(name)
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+def _load_from_db(user_id):
+    lines = {}
+    rows = OrderItem.objects.filter(
+        order__customer__user_id=user_id, order__complete=False, product__isnull=False, quantity__gt=0,
+    ).values_list('product_id', 'variant_id', 'quantity')
+    for product_id, variant_id, quantity in rows:
+        key = line_key(product_id, variant_id)
+        lines[key] = lines.get(key, 0) + quantity
+    return {'l': lines, 'd': [], 't': None}
+
+def _save(user_id, cart):
+    _cache().set(_cart_key(user_id), cart, getattr(settings, 'CART_SESSION_TIMEOUT', 3600))
+
+def get_cart(user_id):
+    """Keranjang dari cache; satu query ke database hanya jika belum ter-cache."""
+    cart = _cache().get(_cart_key(user_id))
+    if cart is None:
+        cart = _load_from_db(user_id)
+        _cache().add(_cart_key(user_id), cart, getattr(settings, 'CART_SESSION_TIMEOUT', 3600))
+    return cart
+
+def item_count(user_id):
+    return sum(get_cart(user_id)['l'].values())
+
+def cart_lines(cart):
+    """Baris keranjang sebagai (product_id, variant_id, quantity), sama seperti cart_cookie.decode()."""
+    return [(*parse_line_key(key), quantity) for key, quantity in cart['l'].items()]
+
+def apply_changes(user_id, deltas, removals=()):
+    """
+    Terapkan {(product_id, variant_id): delta} dan removals ke keranjang di cache.
+    Database ditulis belakangan oleh flush(); langsung di sini jika perubahan
+    tertunda sudah melewati CART_WRITE_BEHIND_SECONDS/CART_WRITE_BEHIND_MAX_LINES.
+    """
+    with _lock(user_id):
+        cart = get_cart(user_id)
+        lines, dirty = cart['l'], set(cart['d'])
+        for (product_id, variant_id), delta in deltas.items():
+            key = line_key(product_id, variant_id)
+            quantity = lines.get(key, 0) + delta
+            if quantity > 0:
+                lines[key] = quantity
+            else:
+                lines.pop(key, None)
+            dirty.add(key)
+        for product_id, variant_id in removals:
+            key = line_key(product_id, variant_id)
+            lines.pop(key, None)
+            dirty.add(key)
+
+        was_clean = not cart['d']
+        cart['d'] = sorted(dirty)
+        if cart['d'] and cart['t'] is None:
+            cart['t'] = time.time()
+        _save(user_id, cart)
+
+        overdue = cart['t'] is not None and (
+            time.time() - cart['t'] >= getattr(settings, 'CART_WRITE_BEHIND_SECONDS', 30)
+            or len(cart['d']) >= getattr(settings, 'CART_WRITE_BEHIND_MAX_LINES', 20)
+        )
+        if overdue:
+            _flush_locked(user_id, cart)
+        elif was_clean and cart['d']:
+            _mark_dirty(user_id)
+    return cart
+
+def flush(user_id):
+    """Tulis perubahan tertunda ke Order/OrderItem secara sinkron."""
+    with _lock(user_id):
+        cart = _cache().get(_cart_key(user_id))
+        if cart and cart['d']:
+            _flush_locked(user_id, cart)
+
+def _flush_locked(user_id, cart):
+    customer = Customer.objects.get(user_id=user_id)
+    order, created = Order.objects.get_or_create(customer=customer, complete=False)
+
+    current = {}
+    if not created:
+        for product_id, variant_id, quantity in order.orderitem_set.values_list('product_id', 'variant_id', 'quantity'):
+            current[line_key(product_id, variant_id)] = quantity or 0
+
+    # Tulis selisih antara isi cache dan database untuk baris yang berubah
+    deltas, removals = {}, set()
+    for key in cart['d']:
+        target, stored = cart['l'].get(key, 0), current.get(key, 0)
+        if target <= 0 and key in current:
+            removals.add(parse_line_key(key))
+        elif target != stored:
+            deltas[parse_line_key(key)] = target - stored
+    OrderItem.objects.apply_deltas(order, deltas, removals)
+
+    cart['d'], cart['t'] = [], None
+    _save(user_id, cart)
+    _unmark_dirty(user_id)
+
+def forget(user_id):
+    """Buang keranjang dari cache (misalnya setelah order selesai)."""
+    _cache().delete(_cart_key(user_id))
+    _unmark_dirty(user_id)
+
+def _mark_dirty(user_id):
+    with _lock('dirty'):
+        dirty = _cache().get(DIRTY_KEY) or set()
+        dirty.add(user_id)
+        _cache().set(DIRTY_KEY, dirty, None)
+
+def _unmark_dirty(user_id):
+    with _lock('dirty'):
+        dirty = _cache().get(DIRTY_KEY) or set()
+        if user_id in dirty:
+            dirty.discard(user_id)
+            _cache().set(DIRTY_KEY, dirty, None)
+
+def flush_all():
+    """Flush semua keranjang yang punya perubahan tertunda (untuk command flush_carts)."""
+    flushed = 0
+    for user_id in list(_cache().get(DIRTY_KEY) or ()):
+        try:
+            flush(user_id)
+        except CartBusy:
+            # Sedang dipakai request lain; dicoba lagi di run berikutnya
+            continue
+        flushed += 1
+    return flushed
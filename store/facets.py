@@ -0,0 +1,98 @@
+"""
+Facet katalog untuk sidebar/filter store: jumlah per kategori, per
+stock_status, diskon vs non-diskon, dan rentang harga untuk pencarian aktif.
+
+Semua facet berasal dari satu query GROUP BY, lalu di-cache per query
+pencarian yang dinormalisasi. Cache dibuang (lewat nomor versi) oleh signal
+setiap kali Product atau Category berubah.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, Max, Min, Value, When
+
+from .models import Product
+from .search import search_products, tokenize
+
+VERSION_KEY = 'store:facets:version'
+
+def normalize_query(query):
+    return ' '.join(tokenize(query or ''))
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+def invalidate_facets():
+    """Naikkan versi sehingga semua facet yang ter-cache tidak dipakai lagi."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+def _cache_key(normalized):
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    return f"store:facets:{_version()}:{digest}"
+
+def compute_facets(query=''):
+    """Hitung facet langsung dari database (satu query agregat)."""
+    products = search_products(Product.objects.all(), query, ranked=False)
+
+    rows = products.order_by().annotate(
+        discounted=Case(When(discount_percent__gt=0, then=Value(True)), default=Value(False),
+                        output_field=BooleanField()),
+    ).values(
+        'category_id', 'category__name', 'category__slug', 'category__path', 'stock_status', 'discounted',
+    ).annotate(
+        total=Count('id'), min_price=Min('price'), max_price=Max('price'),
+    )
+
+    categories, stock_status = {}, {}
+    discount = {'with_discount': 0, 'without_discount': 0}
+    prices = []
+    total = 0
+    for row in rows:
+        total += row['total']
+        if row['category_id'] is not None:
+            category = categories.setdefault(row['category_id'], {
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'slug': row['category__slug'],
+                'path': row['category__path'],
+                'count': 0,
+            })
+            category['count'] += row['total']
+        stock_status[row['stock_status']] = stock_status.get(row['stock_status'], 0) + row['total']
+        discount['with_discount' if row['discounted'] else 'without_discount'] += row['total']
+        prices.extend([row['min_price'], row['max_price']])
+
+    return {
+        'query': query,
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda category: category['name'] or ''),
+        'stock_status': stock_status,
+        'discount': discount,
+        'price': {'min': min(prices) if prices else 0, 'max': max(prices) if prices else 0},
+    }
+
+def catalog_facets(query=''):
+    """Facet untuk query pencarian, diambil dari cache bila masih ada."""
+    normalized = normalize_query(query)
+    key = _cache_key(normalized)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(normalized)
+        cache.set(key, facets, getattr(settings, 'STORE_FACET_CACHE_TIMEOUT', 60))
+    return facets
+
+def subtree_counts(facets):
+    """
+    Jumlah produk per kategori termasuk semua sub-kategorinya (filter store
+    memakai subtree), dihitung dari facet tanpa query tambahan.
+    """
+    counts = {}
+    for category in facets['categories']:
+        ancestor_ids = category['path'].strip('/').split('/') if category['path'] else []
+        for ancestor_id in ancestor_ids:
+            counts[int(ancestor_id)] = counts.get(int(ancestor_id), 0) + category['count']
+    return counts
@@ -0,0 +1,206 @@
+"""
+Server Midtrans palsu untuk pengujian dan benchmark lokal.
+
+Meniru endpoint yang dipakai toko: POST /snap/v1/transactions (Snap) dan
+GET /v2/<order_id>/status (Core API), dengan jeda respons yang bisa diatur
+untuk meniru gateway yang lambat, dan opsi menolak sebagian request dengan
+503 (acak lewat fail_rate, atau berurutan lewat fail_next untuk test).
+order_id yang dipakai dua kali ditolak 400 seperti Midtrans asli.
+
+Jalankan lewat `manage.py fake_snap_server`, lalu arahkan
+MIDTRANS_SNAP_BASE_URL ke http://<host>:<port>/snap/v1 dan
+MIDTRANS_CORE_API_BASE_URL ke http://<host>:<port>.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUS_CODES = {'pending': '201', 'deny': '202', 'expire': '407'}  # selain ini '200'
+STATUS_PATH = re.compile(r'^/v2/(?P<order_id>[^/]+)/status$')  # order_id atau transaction_id
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, seperti API Midtrans
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status = self.server.next_failure()
+        if status is None and self.server.fail_rate and random.random() < self.server.fail_rate:
+            status = 503
+        if status is not None:
+            self._send(status, {'status_code': str(status), 'status_message': 'Service temporarily unavailable'})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if self.path.rstrip('/') != '/snap/v1/transactions':
+            return self._send(404, {'error_messages': ['Not found']})
+        if not self._delay():
+            return
+        try:
+            details = json.loads(raw)['transaction_details']
+            order_id, gross_amount = details['order_id'], int(details['gross_amount'])
+        except (ValueError, KeyError, TypeError):
+            return self._send(400, {'error_messages': ['transaction_details is required']})
+
+        if not self.server.register(order_id, gross_amount):
+            return self._send(400, {'error_messages': ['transaction_details.order_id sudah digunakan']})
+        token = uuid.uuid4().hex
+        host, port = self.server.server_address[:2]
+        self._send(201, {
+            'token': token,
+            'redirect_url': f'http://{host}:{port}/snap/v2/vtweb/{token}',
+        })
+
+    def do_GET(self):
+        match = STATUS_PATH.match(self.path)
+        if not match:
+            return self._send(404, {'status_code': '404', 'status_message': 'Not found'})
+        if not self._delay():
+            return
+        transaction = self.server.lookup(match['order_id'])
+        if transaction is None:
+            return self._send(200, {
+                'status_code': '404', 'status_message': "Transaction doesn't exist.",
+            })
+        self._send(200, {
+            'status_code': STATUS_CODES.get(transaction['status'], '200'),
+            'status_message': 'Success, transaction found',
+            'order_id': transaction['order_id'],
+            'transaction_id': transaction['transaction_id'],
+            'gross_amount': f"{transaction['gross_amount']}.00",
+            'transaction_status': transaction['status'],
+            'fraud_status': 'accept',
+            'payment_type': 'bank_transfer',
+        })
+
+
+class FakeSnapServer(ThreadingHTTPServer):
+    """Server palsu; bisa dipakai sebagai context manager (jalan di thread)."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0,
+                 transaction_status='pending', server_key='', verbose=False):
+        super().__init__((host, port), _Handler)
+        self.server_key = server_key
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.transaction_status = transaction_status
+        self.verbose = verbose
+        self.transactions = {}
+        self._by_transaction_id = {}
+        self.requests = 0
+        self.connections = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def snap_base_url(self):
+        return f'{self.base_url}/snap/v1'
+
+    def handle_error(self, request, client_address):
+        # Client menutup koneksi lebih dulu (mis. timeout baca); bukan error server
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def fail_next(self, *statuses):
+        """Jawab request berikutnya dengan status HTTP ini (satu per request), mis. fail_next(503, 429)."""
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def next_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def register(self, order_id, gross_amount):
+        """Catat transaksi baru; False jika order_id sudah dipakai."""
+        with self._lock:
+            if order_id in self.transactions:
+                return False
+            transaction = {
+                'order_id': order_id,
+                'transaction_id': str(uuid.uuid4()),
+                'gross_amount': gross_amount,
+                'status': self.transaction_status,
+            }
+            self.transactions[order_id] = self._by_transaction_id[transaction['transaction_id']] = transaction
+            return True
+
+    def lookup(self, order_or_transaction_id):
+        with self._lock:
+            return (self.transactions.get(order_or_transaction_id)
+                    or self._by_transaction_id.get(order_or_transaction_id))
+
+    def set_status(self, order_id, transaction_status):
+        """Ubah transaction_status yang dijawab status API untuk order ini."""
+        with self._lock:
+            self.transactions[order_id]['status'] = transaction_status
+
+    def notification(self, order_id, transaction_status=None, fraud_status='accept'):
+        """Body notifikasi bertanda tangan (server_key) seperti yang dikirim Midtrans."""
+        transaction = self.lookup(order_id)
+        transaction_status = transaction_status or transaction['status']
+        status_code = STATUS_CODES.get(transaction_status, '200')
+        gross_amount = f"{transaction['gross_amount']}.00"
+        payload = f"{order_id}{status_code}{gross_amount}{self.server_key}"
+        return {
+            'order_id': order_id,
+            'transaction_id': transaction['transaction_id'],
+            'transaction_status': transaction_status,
+            'fraud_status': fraud_status,
+            'status_code': status_code,
+            'gross_amount': gross_amount,
+            'payment_type': 'bank_transfer',
+            'signature_key': hashlib.sha512(payload.encode()).hexdigest(),
+        }
+
+    def __enter__(self):
+        # poll_interval pendek supaya shutdown() di akhir test tidak menunggu lama
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,204 @@
+"""
+Idempotency untuk endpoint checkout.
+
+Request POST ke view yang dibungkus idempotent(scope) diberi key dari header
+Idempotency-Key, atau bila tidak ada, dari isi keranjang, order terbuka dan
+body request (double-click dan retry browser menghasilkan key yang sama,
+sedangkan keranjang yang sama dibeli lagi setelah order sebelumnya selesai
+berada di order baru sehingga key-nya berbeda). Key selalu
+digabung dengan scope dan identitas pembeli sebelum di-hash, jadi key dari
+client tidak bisa dipakai untuk membaca hasil milik orang lain.
+
+Request pertama mengklaim key di tabel IdempotencyKey lalu menjalankan view;
+response sukses (2xx) disimpan selama IDEMPOTENCY_KEY_TTL detik dan
+dikembalikan apa adanya untuk request berikutnya dengan key yang sama, tanpa
+memanggil Midtrans atau menulis database lagi. Duplikat yang datang saat
+request pertama masih berjalan menunggu hasilnya (maksimal
+IDEMPOTENCY_WAIT_TIMEOUT detik) alih-alih ikut memproses. Response gagal
+tidak disimpan sehingga request boleh diulang. Key yang sama dengan body
+atau keranjang berbeda ditolak 422.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from . import cart_cookie, cart_store
+from .models import IdempotencyKey, Order
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def _sha256(*parts):
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+def _identity(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'guest:' + _sha256(
+        request.COOKIES.get(cart_cookie.COOKIE_NAME, ''),
+        request.META.get('REMOTE_ADDR', ''),
+        request.META.get('HTTP_USER_AGENT', ''),
+    )
+
+def _cart_signature(request):
+    if request.user.is_authenticated:
+        lines = cart_store.cart_lines(cart_store.get_cart(request.user.id))
+    else:
+        lines = cart_cookie.read(request)[0]
+    return repr(sorted((product_id, variant_id or 0, quantity) for product_id, variant_id, quantity in lines))
+
+def _cart_version(request):
+    """
+    pk order terbuka milik user sebagai versi keranjang. Keranjang di cache
+    ditulis dulu (view checkout juga melakukannya) agar order itu sudah ada.
+    Guest tidak perlu: order guest dibuat per checkout dan cookie keranjangnya
+    sudah masuk identitas.
+    """
+    if not request.user.is_authenticated:
+        return ''
+    cart_store.flush(request.user.id)
+    open_order = Order.objects.filter(
+        customer__user_id=request.user.id, complete=False,
+    ).order_by('pk').values_list('pk', flat=True).first()
+    return str(open_order or '')
+
+def request_key(request, scope):
+    """
+    (key, fingerprint) untuk request; fingerprint = hash body + isi keranjang.
+    Tanpa header, key diturunkan dari fingerprint dan versi keranjang.
+    """
+    fingerprint = _sha256(request.body.decode('utf-8', 'replace'), _cart_signature(request))
+    client_key = request.META.get(HEADER, '').strip()[:255]
+    if not client_key:
+        client_key = f'cart:{_cart_version(request)}:{fingerprint}'
+    return _sha256(scope, _identity(request), client_key), fingerprint
+
+def _claim(key, fingerprint):
+    """Klaim key untuk diproses; mengembalikan (berhasil, record)."""
+    now = timezone.now()
+    lock_until = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    expires_at = now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 600))
+    try:
+        with transaction.atomic():
+            return True, IdempotencyKey.objects.create(
+                key=key, fingerprint=fingerprint, locked_until=lock_until, expires_at=expires_at,
+            )
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is None:
+        return False, None
+    if record.expires_at <= now or (record.status_code is None and record.locked_until <= now):
+        # Hasil lama sudah kedaluwarsa atau pemroses sebelumnya mati: ambil alih
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, locked_until=record.locked_until, expires_at=record.expires_at,
+        ).update(fingerprint=fingerprint, status_code=None, content_type='', body='',
+                 locked_until=lock_until, expires_at=expires_at)
+        if taken:
+            record.refresh_from_db()
+            return True, record
+    return False, record
+
+def _replay(record):
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+def _attempt(key, fingerprint, deadline):
+    """Satu percobaan klaim: (record, None) jika berhasil, (None, response) jika
+    request selesai tanpa menjalankan view, (None, None) jika harus menunggu."""
+    claimed, record = _claim(key, fingerprint)
+    if claimed:
+        return record, None
+    if record is not None and record.fingerprint != fingerprint:
+        return None, JsonResponse(
+            {'error': 'Idempotency-Key sudah dipakai untuk request yang berbeda'}, status=422,
+        )
+    if record is not None and record.status_code is not None and record.expires_at > timezone.now():
+        return None, _replay(record)
+    if time.monotonic() > deadline:
+        return None, JsonResponse({'error': 'Request yang sama masih diproses'}, status=409)
+    return None, None
+
+def _store(record, response):
+    records = IdempotencyKey.objects.filter(pk=record.pk)
+    if 200 <= response.status_code < 300 and not response.streaming:
+        records.update(
+            status_code=response.status_code,
+            content_type=response.get('Content-Type', ''),
+            body=response.content.decode(response.charset),
+        )
+    else:
+        records.delete()
+
+def _abandon(record):
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+def idempotent(scope):
+    """Decorator untuk view checkout (sync maupun async), lihat docstring modul."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'POST':
+                    return await view(request, *args, **kwargs)
+
+                key, fingerprint = await sync_to_async(request_key)(request, scope)
+                deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 15)
+                while True:
+                    record, response = await sync_to_async(_attempt)(key, fingerprint, deadline)
+                    if record is not None or response is not None:
+                        break
+                    await asyncio.sleep(0.05)
+                if response is not None:
+                    return response
+
+                try:
+                    response = await view(request, *args, **kwargs)
+                except Exception:
+                    await sync_to_async(_abandon)(record)
+                    raise
+                await sync_to_async(_store)(record, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view(request, *args, **kwargs)
+
+            key, fingerprint = request_key(request, scope)
+            deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 15)
+            while True:
+                record, response = _attempt(key, fingerprint, deadline)
+                if record is not None or response is not None:
+                    break
+                # Duplikat bersamaan: tunggu hasil request pertama
+                time.sleep(0.05)
+            if response is not None:
+                return response
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                _abandon(record)
+                raise
+            _store(record, response)
+            return response
+        return wrapper
+    return decorator
+
+def purge_expired():
+    """Hapus key yang sudah kedaluwarsa; mengembalikan jumlahnya."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,286 @@
+"""
+Reservasi stok produk dan varian.
+
+Stok dipotong saat checkout membuat transaksi pembayaran (reserve_order) dan
+dicatat sebagai StockReservation aktif dengan batas waktu. Pembayaran
+berhasil menjadikannya committed (commit_order, sales_count bertambah);
+pembayaran gagal/dibatalkan atau reservasi yang kedaluwarsa mengembalikan
+stoknya (release_order, release_expired).
+
+Pemotongan stok adalah UPDATE bersyarat "stock = stock - n WHERE stock >= n",
+jadi tidak pernah oversell, dan kunci baris hanya dipegang selama transaksi
+reservasi yang singkat. Produk laris (flash sale) bisa dipecah ke beberapa
+StockShard (Product.stock_shards > 0): setiap reservasi memotong satu shard
+acak sehingga checkout bersamaan tidak antre di satu baris. Untuk produk
+seperti ini Product.stock/ProductVariant.stock hanya ringkasan yang
+diperbarui sync_sharded_stock().
+
+Baris dengan varian memakai stok varian, selain itu stok produk. Produk
+digital dan pre-order tidak dibatasi stok.
+"""
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import (
+    Order, OrderItem, Product, ProductVariant, StockReservation, StockShard, stock_status_expression,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Stok tidak cukup; items berisi (product_id, variant_id, quantity) yang gagal."""
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.items = items
+
+
+def _line_sort_key(key):
+    # Baris selalu dikunci dengan urutan yang sama agar order bersamaan tidak deadlock
+    return key[0], key[1] or 0
+
+def _tracked_lines(order):
+    """{(product_id, variant_id): (quantity, stock_shards)} untuk baris order yang stoknya dibatasi."""
+    lines = {}
+    rows = (
+        OrderItem.objects.filter(order=order, product__isnull=False, quantity__gt=0)
+        .exclude(product__digital=True).exclude(product__stock_status='pre_order')
+        .values_list('product_id', 'variant_id', 'quantity', 'product__stock_shards')
+    )
+    for product_id, variant_id, quantity, shards in rows:
+        previous = lines.get((product_id, variant_id), (0, shards))[0]
+        lines[(product_id, variant_id)] = (previous + quantity, shards)
+    return lines
+
+def _update_product_status(product_ids):
+    # Dipisah dari UPDATE stok karena MySQL mengevaluasi SET dari kiri ke kanan
+    Product.objects.filter(pk__in=product_ids).update(stock_status=stock_status_expression())
+
+def _take(product_id, variant_id, quantity, shards):
+    """Potong stok; mengembalikan [(shard_id, quantity)] atau None jika tidak cukup."""
+    if shards:
+        return _take_sharded(product_id, variant_id, quantity)
+    if variant_id:
+        taken = ProductVariant.objects.filter(pk=variant_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity,
+        )
+    else:
+        # updated_at ikut diubah agar cache kartu produk (sisa stok) kedaluwarsa
+        taken = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity, updated_at=timezone.now(),
+        )
+        if taken:
+            _update_product_status([product_id])
+    return [(None, quantity)] if taken else None
+
+def _take_sharded(product_id, variant_id, quantity):
+    shards = StockShard.objects.filter(product_id=product_id, variant_key=variant_id or 0)
+    candidates = list(shards.filter(stock__gte=quantity).values_list('pk', flat=True))
+    random.shuffle(candidates)
+    for shard_id in candidates:
+        if StockShard.objects.filter(pk=shard_id, stock__gte=quantity).update(stock=F('stock') - quantity):
+            return [(shard_id, quantity)]
+
+    # Tidak ada shard yang cukup sendirian: kunci semua shard lalu ambil dari beberapa
+    with transaction.atomic():
+        rows = list(shards.select_for_update().filter(stock__gt=0).order_by('pk'))
+        if sum(row.stock for row in rows) < quantity:
+            if not rows and not variant_id:
+                # Semua shard habis: ringkasan langsung ditandai habis tanpa menunggu sync
+                if Product.objects.filter(pk=product_id, stock__gt=0).update(stock=0, updated_at=timezone.now()):
+                    _update_product_status([product_id])
+            return None
+        pieces, remaining = [], quantity
+        for row in rows:
+            part = min(row.stock, remaining)
+            row.stock -= part
+            pieces.append((row.pk, part))
+            remaining -= part
+            if not remaining:
+                break
+        StockShard.objects.bulk_update(rows, ['stock'])
+    return pieces
+
+def _restore(reservations):
+    """Kembalikan stok dari reservasi (ke shard asalnya bila masih ada)."""
+    by_shard, by_variant, by_product = defaultdict(int), defaultdict(int), defaultdict(int)
+    for reservation in reservations:
+        if reservation.shard_id:
+            by_shard[(reservation.product_id, reservation.variant_id, reservation.shard_id)] += reservation.quantity
+        elif reservation.variant_id:
+            by_variant[reservation.variant_id] += reservation.quantity
+        else:
+            by_product[reservation.product_id] += reservation.quantity
+
+    for (product_id, variant_id, shard_id), quantity in sorted(by_shard.items()):
+        if not StockShard.objects.filter(pk=shard_id).update(stock=F('stock') + quantity):
+            # Shard sudah digabung kembali oleh shard_stock
+            if variant_id:
+                by_variant[variant_id] += quantity
+            else:
+                by_product[product_id] += quantity
+    for variant_id, quantity in sorted(by_variant.items()):
+        ProductVariant.objects.filter(pk=variant_id).update(stock=F('stock') + quantity)
+    for product_id, quantity in sorted(by_product.items()):
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity, updated_at=timezone.now())
+    if by_product:
+        _update_product_status(list(by_product))
+
+def reserve_order(order, ttl=None):
+    """
+    Reservasi stok untuk seluruh isi order, menggantikan reservasi aktif
+    sebelumnya. Semua baris atau tidak sama sekali: jika ada yang kurang,
+    InsufficientStock dilempar dan tidak ada stok yang berubah.
+    """
+    ttl = ttl if ttl is not None else getattr(settings, 'STORE_RESERVATION_TTL', 15 * 60)
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    reservations = []
+    with transaction.atomic():
+        release_order(order)
+        lines = _tracked_lines(order)
+        for (product_id, variant_id) in sorted(lines, key=_line_sort_key):
+            quantity, shards = lines[(product_id, variant_id)]
+            pieces = _take(product_id, variant_id, quantity, shards)
+            if pieces is None and release_expired(product_id=product_id):
+                # Ada stok yang tertahan reservasi kedaluwarsa, coba sekali lagi
+                pieces = _take(product_id, variant_id, quantity, shards)
+            if pieces is None:
+                raise InsufficientStock([(product_id, variant_id, quantity)])
+            reservations += [
+                StockReservation(order=order, product_id=product_id, variant_id=variant_id,
+                                 shard_id=shard_id, quantity=part, expires_at=expires_at)
+                for shard_id, part in pieces
+            ]
+        StockReservation.objects.bulk_create(reservations)
+    return reservations
+
+def release_order(order):
+    """Kembalikan stok dari reservasi aktif order (pembayaran gagal/dibatalkan)."""
+    with transaction.atomic():
+        active = list(StockReservation.objects.select_for_update().filter(
+            order_id=order.pk, status=StockReservation.ACTIVE,
+        ))
+        if active:
+            _restore(active)
+            StockReservation.objects.filter(pk__in=[r.pk for r in active]).update(
+                status=StockReservation.RELEASED, updated_at=timezone.now(),
+            )
+    return len(active)
+
+def release_expired(batch_size=500, product_id=None):
+    """Lepas satu batch reservasi aktif yang sudah lewat expires_at; mengembalikan jumlahnya."""
+    with transaction.atomic():
+        expired = StockReservation.objects.select_for_update(skip_locked=True).filter(
+            status=StockReservation.ACTIVE, expires_at__lte=timezone.now(),
+        )
+        if product_id is not None:
+            expired = expired.filter(product_id=product_id)
+        expired = list(expired.order_by('expires_at')[:batch_size])
+        if expired:
+            _restore(expired)
+            StockReservation.objects.filter(pk__in=[r.pk for r in expired]).update(
+                status=StockReservation.RELEASED, updated_at=timezone.now(),
+            )
+    return len(expired)
+
+def commit_order(order):
+    """
+    Catat stok order sebagai terjual (order selesai/pembayaran berhasil).
+    Idempoten. Order yang tidak punya reservasi aktif (checkout guest, atau
+    reservasinya sudah kedaluwarsa) dipotong stoknya saat ini; pembayaran
+    sudah masuk, jadi kekurangan stok hanya dicatat di log.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, stock_committed=False).update(stock_committed=True):
+            return False
+        reservations = StockReservation.objects.filter(order_id=order.pk, status=StockReservation.ACTIVE)
+        if not reservations.exists():
+            try:
+                reserve_order(order)
+            except InsufficientStock as exc:
+                logger.warning("Order %s dibayar tetapi stok tidak cukup: %s", order.pk, exc.items)
+        reservations.update(status=StockReservation.COMMITTED, updated_at=timezone.now())
+
+        sold = (
+            OrderItem.objects.filter(order_id=order.pk, product__isnull=False, quantity__gt=0)
+            .values('product_id').annotate(total=Sum('quantity')).order_by('product_id')
+        )
+        for row in sold:
+            Product.objects.filter(pk=row['product_id']).update(sales_count=F('sales_count') + row['total'])
+    order.stock_committed = True
+    return True
+
+def shard_stock(product, shards):
+    """
+    Pecah stok produk (dan tiap variannya) ke `shards` StockShard dengan
+    jumlah merata; shards=0 menggabungkannya kembali ke Product/ProductVariant.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product.pk)
+        variants = list(ProductVariant.objects.select_for_update().filter(product=product).order_by('pk'))
+        stock = {0: product.stock}
+        stock.update({variant.pk: variant.stock for variant in variants})
+        if product.stock_shards:
+            totals = StockShard.objects.filter(product=product).values('variant_key').annotate(total=Sum('stock'))
+            stock.update({row['variant_key']: row['total'] for row in totals})
+        StockShard.objects.filter(product=product).delete()
+
+        if shards:
+            rows = []
+            for variant_key, total in stock.items():
+                base, extra = divmod(total, shards)
+                rows += [
+                    StockShard(product=product, variant_id=variant_key or None, variant_key=variant_key,
+                               shard=index, stock=base + (1 if index < extra else 0))
+                    for index in range(shards)
+                ]
+            StockShard.objects.bulk_create(rows)
+
+        Product.objects.filter(pk=product.pk).update(
+            stock=stock[0], stock_shards=shards, updated_at=timezone.now(),
+        )
+        _update_product_status([product.pk])
+        for variant in variants:
+            ProductVariant.objects.filter(pk=variant.pk).update(stock=stock.get(variant.pk, 0))
+
+def sync_sharded_stock():
+    """Perbarui ringkasan stok produk/varian yang stoknya dipecah; mengembalikan jumlah produk yang berubah."""
+    product_ids = list(Product.objects.filter(stock_shards__gt=0).values_list('pk', flat=True))
+    if not product_ids:
+        return 0
+    totals = {
+        (row['product_id'], row['variant_key']): row['total']
+        for row in StockShard.objects.filter(product_id__in=product_ids)
+        .values('product_id', 'variant_key').annotate(total=Sum('stock'))
+    }
+
+    changed = []
+    for product_id, stock in Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'):
+        total = totals.get((product_id, 0), 0)
+        if total != stock:
+            Product.objects.filter(pk=product_id).update(stock=total, updated_at=timezone.now())
+            changed.append(product_id)
+    if changed:
+        _update_product_status(changed)
+
+    variants = ProductVariant.objects.filter(product_id__in=product_ids).values_list('pk', 'product_id', 'stock')
+    for variant_id, product_id, stock in variants:
+        total = totals.get((product_id, variant_id), 0)
+        if total != stock:
+            ProductVariant.objects.filter(pk=variant_id).update(stock=total)
+    return len(changed)
+
+def available_stock(product, variant=None):
+    """Stok yang masih bisa direservasi (menjumlah shard bila stoknya dipecah)."""
+    if product.stock_shards:
+        shards = StockShard.objects.filter(product=product, variant_key=variant.pk if variant else 0)
+        return shards.aggregate(total=Sum('stock'))['total'] or 0
+    return variant.stock if variant else product.stock
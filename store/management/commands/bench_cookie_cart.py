@@ -0,0 +1,70 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Product, ProductVariant
+from store.utils import cookieCart
+
+
+class Command(BaseCommand):
+    help = "Benchmark jumlah query cookieCart untuk keranjang guest berbagai ukuran."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', nargs='+', type=int, default=[1, 10, 50, 200],
+                            help="Jumlah baris keranjang yang diuji")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Jumlah pengulangan untuk mengukur waktu")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'count_only':>11} {'ms/call':>9}")
+
+        # Semua data benchmark dibuat di dalam transaksi yang di-rollback
+        with transaction.atomic():
+            for size in options['lines']:
+                cart = self._build_cart(size)
+                request = factory.get('/')
+                request.COOKIES['cart'] = json.dumps(cart)
+
+                with CaptureQueriesContext(connection) as full:
+                    data = cookieCart(request)
+                with CaptureQueriesContext(connection) as count_only:
+                    cookieCart(request, count_only=True)
+
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    cookieCart(request)
+                elapsed = (time.perf_counter() - started) * 1000 / options['repeat']
+
+                assert len(data['items']) == size
+                self.stdout.write(
+                    f"{size:>6} {len(full.captured_queries):>8} "
+                    f"{len(count_only.captured_queries):>11} {elapsed:>9.2f}"
+                )
+            transaction.set_rollback(True)
+
+    def _build_cart(self, size):
+        # Dibuat satu per satu karena bulk_create tidak mengisi pk di MySQL
+        products = [
+            Product.objects.create(name=f"Bench {i}", price=10000 + i, discount_percent=i % 3 * 10)
+            for i in range(size)
+        ]
+        # Setengah baris memakai varian agar lookup varian ikut teruji
+        variant_by_product = {
+            product.pk: ProductVariant.objects.create(
+                product=product, name=f"V{product.pk}", value='M', price_adjustment=500
+            ).pk
+            for product in products[::2]
+        }
+
+        cart = {}
+        for product in products:
+            line = {'quantity': 2}
+            if product.pk in variant_by_product:
+                line['variant_id'] = variant_by_product[product.pk]
+            cart[str(product.pk)] = line
+        return cart
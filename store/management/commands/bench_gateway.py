@@ -0,0 +1,107 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import midtransclient
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from store import payment_gateway
+from store.fake_snap import FakeSnapServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark pembuatan transaksi Snap terhadap fake Snap server lokal: client baru "
+        "per request (cara lama), client bersama dengan koneksi keep-alive, dan jalur async."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Jumlah transaksi per mode")
+        parser.add_argument('--concurrency', type=int, default=20, help="Request bersamaan")
+        parser.add_argument('--latency-ms', type=int, default=100, help="Jeda respons fake Snap")
+        parser.add_argument('--modes', nargs='+', default=['fresh', 'pooled', 'async'],
+                            choices=['fresh', 'pooled', 'async'])
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':>7} {'sukses':>7} {'error':>6} {'koneksi':>8} {'detik':>7} {'req/s':>7} "
+            f"{'p50 ms':>7} {'p95 ms':>7}"
+        )
+        failed = False
+        for mode in options['modes']:
+            with FakeSnapServer(latency=options['latency_ms'] / 1000) as server:
+                gateway = override_settings(
+                    MIDTRANS_SNAP_BASE_URL=server.snap_base_url,
+                    MIDTRANS_POOL_SIZE=options['concurrency'],
+                )
+                with gateway:
+                    started = time.perf_counter()
+                    results = getattr(self, f'_run_{mode}')(
+                        server, options['requests'], options['concurrency'],
+                    )
+                    elapsed = time.perf_counter() - started
+            latencies = sorted(latency for ok, latency in results if ok)
+            errors = sum(1 for ok, _ in results if not ok)
+            failed = failed or bool(errors)
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000 if latencies else 0
+            self.stdout.write(
+                f"{mode:>7} {len(latencies):>7} {errors:>6} {server.connections:>8} {elapsed:>7.2f} "
+                f"{len(results) / elapsed:>7.1f} {p50:>7.0f} {p95:>7.0f}"
+            )
+        if failed:
+            raise CommandError("Sebagian transaksi gagal dibuat.")
+
+    def _parameters(self):
+        return {'transaction_details': {'order_id': f'BENCH-{uuid.uuid4().hex}', 'gross_amount': 10000}}
+
+    def _timed(self, call):
+        started = time.perf_counter()
+        try:
+            response = call(self._parameters())
+            return 'token' in response, time.perf_counter() - started
+        except Exception as exc:
+            self.stderr.write(f"{type(exc).__name__}: {exc}")
+            return False, time.perf_counter() - started
+
+    def _fresh_create(self, server):
+        def create(parameters):
+            # Cara lama: Snap baru (dan koneksi TLS baru) di setiap request
+            snap = midtransclient.Snap(
+                is_production=settings.MIDTRANS_IS_PRODUCTION,
+                server_key=settings.MIDTRANS_SERVER_KEY,
+                client_key=settings.MIDTRANS_CLIENT_KEY,
+            )
+            snap.api_config.SNAP_SANDBOX_BASE_URL = snap.api_config.SNAP_PRODUCTION_BASE_URL = server.snap_base_url
+            return snap.create_transaction(parameters)
+        return create
+
+    def _run_threads(self, call, total, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda _: self._timed(call), range(total)))
+
+    def _run_fresh(self, server, total, concurrency):
+        return self._run_threads(self._fresh_create(server), total, concurrency)
+
+    def _run_pooled(self, server, total, concurrency):
+        return self._run_threads(payment_gateway.create_transaction, total, concurrency)
+
+    def _run_async(self, server, total, concurrency):
+        async def one(semaphore):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await payment_gateway.acreate_transaction(self._parameters())
+                    return 'token' in response, time.perf_counter() - started
+                except Exception as exc:
+                    self.stderr.write(f"{type(exc).__name__}: {exc}")
+                    return False, time.perf_counter() - started
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(one(semaphore) for _ in range(total)))
+
+        return asyncio.run(run())
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from store import cart_cookie
+from store.models import OrderItem, Product, ProductVariant
+from store.utils import guestOrder
+
+
+class Command(BaseCommand):
+    help = "Benchmark jumlah query guestOrder (checkout guest) untuk keranjang berbagai ukuran."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', nargs='+', type=int, default=[1, 20, 100],
+                            help="Jumlah baris keranjang yang diuji")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'ms':>9}")
+
+        # Semua data benchmark dibuat di dalam transaksi yang di-rollback
+        with transaction.atomic():
+            for size in options['lines']:
+                lines = self._build_lines(size)
+                request = factory.post('/process_order/')
+                request.COOKIES[cart_cookie.COOKIE_NAME] = cart_cookie.encode(lines, size * 2, 0)
+                data = {'form': {'name': 'Bench Guest', 'email': f'bench-{size}@example.com'}}
+
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    customer, order = guestOrder(request, data)
+                elapsed = (time.perf_counter() - started) * 1000
+
+                assert OrderItem.objects.filter(order=order).count() == size
+                self.stdout.write(f"{size:>6} {len(queries.captured_queries):>8} {elapsed:>9.2f}")
+            transaction.set_rollback(True)
+
+    def _build_lines(self, size):
+        # Dibuat satu per satu karena bulk_create tidak mengisi pk di MySQL
+        lines = []
+        for i in range(size):
+            product = Product.objects.create(name=f"Guest Bench {i}", price=10000 + i)
+            variant_id = None
+            if i % 2:
+                variant_id = ProductVariant.objects.create(
+                    product=product, name=f"V{product.pk}", value='M', price_adjustment=500
+                ).pk
+            lines.append((product.pk, variant_id, 2))
+        return lines
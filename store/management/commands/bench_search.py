@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from store.models import Product
+from store.search import get_search_backend, search_products
+
+WORDS = [
+    'laptop', 'gaming', 'asus', 'samsung', 'xiaomi', 'headphone', 'bluetooth', 'kipas', 'angin',
+    'kaos', 'polo', 'kemeja', 'flannel', 'celana', 'jeans', 'jaket', 'bomber', 'sepatu', 'topi',
+    'indomie', 'goreng', 'keripik', 'pedas', 'biskuit', 'kelapa', 'coklat',
+    'kopi', 'susu', 'teh', 'botol', 'minuman',
+]
+
+CATEGORY_LABELS = ['Elektronik', 'Pakaian', 'Makanan', 'Minuman', 'Lainnya']
+
+
+class Command(BaseCommand):
+    help = "Bandingkan pencarian icontains lama dengan backend full-text yang aktif."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000,
+                            help="Jumlah produk sintetis yang dibuat sementara")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--queries', nargs='+', default=['laptop', 'kaos polo', 'coklat susu'])
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Backend: {type(backend).__name__}")
+
+        # Produk sintetis dihapus eksplisit di akhir: rebuild() FULLTEXT di MySQL
+        # menjalankan ALTER TABLE yang meng-commit transaksi, jadi rollback tidak cukup
+        prefix = f"BENCH-{time.time_ns()}-"
+        try:
+            self._seed(options['products'], prefix)
+            backend.rebuild()
+
+            self.stdout.write(f"{'query':<16} {'icontains ms':>13} {'fulltext ms':>12} {'hits':>12}")
+            for query in options['queries']:
+                legacy = Product.objects.filter(Q(name__icontains=query) | Q(kategori__icontains=query))
+                ranked = search_products(Product.objects.all(), query)
+                legacy_ms, legacy_hits = self._time(legacy, options['repeat'])
+                ranked_ms, ranked_hits = self._time(ranked, options['repeat'])
+                self.stdout.write(
+                    f"{query:<16} {legacy_ms:>13.2f} {ranked_ms:>12.2f} {legacy_hits:>5}/{ranked_hits:<6}"
+                )
+        finally:
+            deleted, _ = Product.objects.filter(sku__startswith=prefix).delete()
+            self.stdout.write(f"{deleted} baris sintetis dihapus.")
+            # Kembalikan index ke kondisi data asli
+            backend.rebuild()
+
+    def _seed(self, count, prefix):
+        rng = random.Random(42)
+        Product.objects.bulk_create([
+            Product(
+                name=' '.join(rng.sample(WORDS, 3)).title(),
+                # Deskripsi diisi kata acak agar selektivitas mirip katalog asli
+                description=' '.join(rng.choices(WORDS, k=2) + [f"kata{rng.randint(0, 5000)}" for _ in range(40)]),
+                features='\n'.join(rng.choices(WORDS, k=2)),
+                sku=f"{prefix}{i}",
+                kategori=rng.choice(CATEGORY_LABELS),
+                price=rng.randint(1000, 5000000),
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def _time(self, queryset, repeat):
+        hits = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            # Halaman pertama store (12 produk) plus COUNT untuk paginator
+            hits = queryset.count()
+            list(queryset[:12])
+        return (time.perf_counter() - started) * 1000 / repeat, hits
@@ -0,0 +1,51 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from store import payment_signature
+from store.fake_snap import FakeSnapServer
+from store.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Bandingkan waktu verifikasi notifikasi Midtrans secara lokal (signature_key) "
+        "dengan fallback ke status API (fake Snap server lokal)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help="Verifikasi lokal")
+        parser.add_argument('--fallback-iterations', type=int, default=200, help="Verifikasi lewat status API")
+        parser.add_argument('--latency-ms', type=int, default=50, help="Jeda respons fake status API")
+
+    def handle(self, *args, **options):
+        server_key = 'SB-Mid-server-BENCH'
+        with FakeSnapServer(latency=options['latency_ms'] / 1000, transaction_status='settlement',
+                            server_key=server_key) as server:
+            order_id = f'BENCH-{uuid.uuid4().hex}'
+            server.register(order_id, 10000)
+            # Transaction tidak disimpan; verify_notification hanya membaca transaction_id dan amount
+            payment = Transaction(transaction_id=order_id, amount=10000)
+            notification = server.notification(order_id)
+            forged = {**notification, 'signature_key': '0' * 128}
+
+            with override_settings(MIDTRANS_SERVER_KEY=server_key, MIDTRANS_CORE_API_BASE_URL=server.base_url):
+                local = self._time(lambda: payment_signature.verify_notification(notification, payment),
+                                   options['iterations'])
+                fallback = self._time(lambda: payment_signature.verify_notification(forged, payment),
+                                      options['fallback_iterations'])
+
+        self.stdout.write(f"{'mode':>9} {'iterasi':>8} {'us/verifikasi':>14} {'verifikasi/s':>13}")
+        for mode, iterations, elapsed in (('lokal', options['iterations'], local),
+                                          ('fallback', options['fallback_iterations'], fallback)):
+            self.stdout.write(
+                f"{mode:>9} {iterations:>8} {elapsed / iterations * 1e6:>14.1f} {iterations / elapsed:>13.0f}"
+            )
+
+    def _time(self, verify, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            verify()
+        return time.perf_counter() - started
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import Sum
+
+from store import inventory
+from store.models import Customer, Order, OrderItem, Product, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark reservasi stok: banyak thread membeli sisa N unit produk yang sama "
+        "secara bersamaan, dengan dan tanpa shard, lalu memeriksa tidak ada oversell."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--units', type=int, default=50, help="Sisa stok yang diperebutkan")
+        parser.add_argument('--buyers', type=int, default=200, help="Jumlah order yang mencoba membeli")
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--quantity', type=int, default=1, help="Unit per order")
+        parser.add_argument('--shards', nargs='+', type=int, default=[0, 8],
+                            help="Konfigurasi shard yang dibandingkan (0 = tanpa shard)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'shards':>6} {'sukses':>7} {'habis':>6} {'error':>6} {'sisa':>5} {'detik':>7} {'order/s':>8}"
+        )
+        for shards in options['shards']:
+            self._run(shards, options)
+        self.stdout.write(self.style.SUCCESS("OK: tidak ada oversell."))
+
+    def _run(self, shards, options):
+        units, quantity = options['units'], options['quantity']
+        # Thread memakai koneksi sendiri, jadi data harus di-commit (dihapus di akhir)
+        product = Product.objects.create(name=f"Flash Sale {time.time_ns()}", price=10000, stock=units)
+        customers = []
+        try:
+            if shards:
+                inventory.shard_stock(product, shards)
+            orders = []
+            for i in range(options['buyers']):
+                customer = Customer.objects.create(name=f"Bench Buyer {i}")
+                customers.append(customer)
+                order = Order.objects.create(customer=customer, complete=False)
+                OrderItem.objects.create(order=order, product=product, quantity=quantity)
+                orders.append(order)
+
+            started = time.perf_counter()
+            results = self._reserve_all(orders, options['threads'])
+            elapsed = time.perf_counter() - started
+
+            sold = results['ok'] * quantity
+            reserved = StockReservation.objects.filter(
+                product=product, status=StockReservation.ACTIVE,
+            ).aggregate(total=Sum('quantity'))['total'] or 0
+            product.refresh_from_db()
+            remaining = inventory.available_stock(product)
+            self.stdout.write(
+                f"{shards:>6} {results['ok']:>7} {results['short']:>6} {results['error']:>6} "
+                f"{remaining:>5} {elapsed:>7.2f} {len(orders) / elapsed:>8.1f}"
+            )
+            if results['error'] or sold > units or reserved != sold or remaining != units - sold:
+                raise CommandError("Stok tidak konsisten setelah reservasi bersamaan.")
+            if sold < min(units - units % quantity, len(orders) * quantity):
+                raise CommandError("Reservasi gagal padahal stok masih cukup.")
+        finally:
+            Order.objects.filter(customer__in=customers).delete()
+            Customer.objects.filter(pk__in=[customer.pk for customer in customers]).delete()
+            product.delete()
+
+    def _reserve_all(self, orders, threads):
+        def worker(chunk):
+            counts = {'ok': 0, 'short': 0, 'error': 0}
+            try:
+                for order in chunk:
+                    try:
+                        inventory.reserve_order(order)
+                        counts['ok'] += 1
+                    except inventory.InsufficientStock:
+                        counts['short'] += 1
+                    except Exception as exc:
+                        self.stderr.write(f"Order {order.pk}: {exc}")
+                        counts['error'] += 1
+            finally:
+                close_old_connections()
+                connection.close()
+            return counts
+
+        chunks = [orders[i::threads] for i in range(threads)]
+        totals = {'ok': 0, 'short': 0, 'error': 0}
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for counts in pool.map(worker, chunks):
+                for key, value in counts.items():
+                    totals[key] += value
+        return totals
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.related import build_related_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Perbarui matriks co-purchase dan tabel produk terkait dari order selesai "
+        "yang belum diproses sejak run sebelumnya."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Jumlah order per transaksi")
+        parser.add_argument('--top-k', type=int, default=None,
+                            help="Jumlah produk terkait per produk (default STORE_RELATED_PRODUCTS)")
+
+    def handle(self, *args, **options):
+        orders, pairs, products = build_related_products(
+            batch_size=options['batch_size'], top_k=options['top_k'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{orders} order diproses, {pairs} pasangan produk, {products} produk diperbarui."
+        ))
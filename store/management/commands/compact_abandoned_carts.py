@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from store.models import Order, OrderItem, ShippingAddress, StockReservation, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Hapus keranjang terbuka (Order complete=False) yang sudah lama ditinggalkan, "
+        "per batch kecil dengan transaksi singkat. Order yang punya transaksi pembayaran "
+        "atau reservasi stok aktif tidak disentuh. Jalankan berkala lewat cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Umur minimal keranjang tanpa perubahan (default CART_ABANDONED_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Jumlah order per transaksi")
+        parser.add_argument('--sleep', type=float, default=0.1, help="Jeda antar batch (detik)")
+        parser.add_argument('--dry-run', action='store_true', help="Hanya hitung, tidak menghapus")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'CART_ABANDONED_DAYS', 30)
+        cutoff = timezone.now() - timedelta(days=days)
+        abandoned = self._abandoned(cutoff)
+
+        if options['dry_run']:
+            orders = abandoned.count()
+            items = OrderItem.objects.filter(order__in=abandoned.values('pk')).count()
+            self.stdout.write(f"{orders} keranjang ({items} item) lebih tua dari {days} hari akan dihapus.")
+            return
+
+        totals = {'orders': 0, 'items': 0, 'addresses': 0}
+        while True:
+            batch = self._delete_batch(abandoned, options['batch_size'])
+            for key, count in batch.items():
+                totals[key] += count
+            if not batch['orders']:
+                break
+            self.stdout.write(f"  batch: {batch['orders']} order, {batch['items']} item")
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['orders']} keranjang terbengkalai dihapus "
+            f"({totals['items']} item, {totals['addresses']} alamat pengiriman)."
+        ))
+
+    def _abandoned(self, cutoff):
+        """Order terbuka tanpa perubahan sejak cutoff, tanpa pembayaran dan reservasi aktif."""
+        return Order.objects.filter(complete=False, updated_at__lt=cutoff).exclude(
+            Exists(Transaction.objects.filter(order=OuterRef('pk')))
+        ).exclude(
+            Exists(StockReservation.objects.filter(order=OuterRef('pk'), status=StockReservation.ACTIVE))
+        )
+
+    def _delete_batch(self, abandoned, batch_size):
+        with transaction.atomic():
+            # Baris yang sedang dipakai request lain dilewati, bukan ditunggu;
+            # kondisi dicek ulang di dalam transaksi yang sama
+            order_ids = list(
+                abandoned.select_for_update(skip_locked=True).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return {'orders': 0, 'items': 0, 'addresses': 0}
+            # OrderItem/ShippingAddress memakai SET_NULL, jadi dihapus eksplisit agar tidak jadi yatim
+            items, _ = OrderItem.objects.filter(order_id__in=order_ids).delete()
+            addresses, _ = ShippingAddress.objects.filter(order_id__in=order_ids).delete()
+            _, deleted = Order.objects.filter(pk__in=order_ids).delete()
+            orders = deleted.get(Order._meta.label, 0)
+        return {'orders': orders, 'items': items, 'addresses': addresses}
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Kembalikan stok dari reservasi yang kedaluwarsa (order belum dibayar) dan "
+        "perbarui ringkasan stok produk yang stoknya dipecah ke shard. Jalankan berkala lewat cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Jumlah reservasi per transaksi")
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            count = inventory.release_expired(batch_size=options['batch_size'])
+            released += count
+            if count < options['batch_size']:
+                break
+        synced = inventory.sync_sharded_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f"{released} reservasi dilepas, ringkasan stok {synced} produk ber-shard diperbarui."
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from store.fake_snap import FakeSnapServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Jalankan server Midtrans palsu (Snap + status Core API) untuk pengujian dan "
+        "benchmark lokal. Arahkan MIDTRANS_SNAP_BASE_URL dan MIDTRANS_CORE_API_BASE_URL ke server ini."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=300, help="Jeda setiap respons")
+        parser.add_argument('--fail-rate', type=float, default=0.0, help="Porsi request yang dijawab 503 (0-1)")
+        parser.add_argument('--status', default='pending', help="transaction_status untuk cek status")
+        parser.add_argument('--verbose', action='store_true', help="Log setiap request")
+
+    def handle(self, *args, **options):
+        server = FakeSnapServer(
+            options['host'], options['port'],
+            latency=options['latency_ms'] / 1000,
+            fail_rate=options['fail_rate'],
+            transaction_status=options['status'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(f"Fake Snap berjalan di {server.base_url}")
+        self.stdout.write(f"  MIDTRANS_SNAP_BASE_URL = '{server.snap_base_url}'")
+        self.stdout.write(f"  MIDTRANS_CORE_API_BASE_URL = '{server.base_url}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{server.requests} request dilayani.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import cart_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Tulis perubahan keranjang yang masih tertunda di cache ke Order/OrderItem. "
+        "Jalankan berkala (misalnya tiap menit lewat cron)."
+    )
+
+    def handle(self, *args, **options):
+        flushed = cart_store.flush_all()
+        self.stdout.write(self.style.SUCCESS(f"{flushed} keranjang ditulis ke database."))
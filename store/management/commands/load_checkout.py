@@ -0,0 +1,130 @@
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from store import cart_cookie
+from store.admission import checkout_admission, ticket_status
+from store.models import Customer, Order, Product
+from store.views import processOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Load generator lokal untuk admission control checkout: banyak pembeli guest "
+        "checkout produk yang sama bersamaan lewat processOrder (dengan jeda tambahan untuk "
+        "meniru payment gateway yang lambat), mengikuti antrian 429 sampai selesai atau ditolak."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help="Jumlah pembeli")
+        parser.add_argument('--threads', type=int, default=50, help="Pembeli yang datang bersamaan")
+        parser.add_argument('--delay-ms', type=int, default=200, help="Jeda tambahan per checkout")
+        parser.add_argument('--max-concurrent', type=int, default=5, help="CHECKOUT_MAX_CONCURRENT")
+        parser.add_argument('--per-product', type=int, default=3, help="CHECKOUT_MAX_CONCURRENT_PER_PRODUCT")
+        parser.add_argument('--queue-max', type=int, default=40, help="CHECKOUT_QUEUE_MAX")
+        parser.add_argument('--poll-interval', type=float, default=0.05,
+                            help="Jeda polling status antrian (detik, menggantikan Retry-After)")
+
+    def handle(self, *args, **options):
+        self.factory = RequestFactory()
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+        product = Product.objects.create(name=f"Load Test {time.time_ns()}", price=10000, stock=options['users'])
+        self.cookie = cart_cookie.encode([(product.pk, None, 1)], 1, product.price)
+        self.view = checkout_admission(self._slow(inspect.unwrap(processOrder), options['delay_ms'] / 1000))
+        self.prefix = f"loadtest-{time.time_ns()}"
+
+        admission = override_settings(
+            CHECKOUT_ADMISSION_ENABLED=True,
+            CHECKOUT_MAX_CONCURRENT=options['max_concurrent'],
+            CHECKOUT_MAX_CONCURRENT_PER_PRODUCT=options['per_product'],
+            CHECKOUT_QUEUE_MAX=options['queue_max'],
+        )
+        try:
+            with admission:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                    results = list(pool.map(
+                        lambda i: self._user(i, options['poll_interval']), range(options['users']),
+                    ))
+                elapsed = time.perf_counter() - started
+        finally:
+            customers = Customer.objects.filter(email__startswith=self.prefix)
+            Order.objects.filter(customer__in=customers).delete()
+            customers.delete()
+            product.delete()
+
+        outcomes = {}
+        for outcome, _, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(latency for outcome, latency, _ in results if outcome == 'ok')
+        queued = sum(1 for _, _, was_queued in results if was_queued)
+        self.stdout.write(f"Selesai dalam {elapsed:.2f}s: " + ", ".join(
+            f"{outcome}={count}" for outcome, count in sorted(outcomes.items())
+        ))
+        self.stdout.write(f"Sempat antre: {queued}, checkout bersamaan maksimum: {self.peak} "
+                          f"(batas {min(options['max_concurrent'], options['per_product'])})")
+        if latencies:
+            self.stdout.write(
+                f"Latensi sukses: p50={latencies[len(latencies) // 2] * 1000:.0f}ms "
+                f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms "
+                f"max={latencies[-1] * 1000:.0f}ms"
+            )
+
+    def _slow(self, view, delay):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                time.sleep(delay)
+                return view(request, *args, **kwargs)
+            finally:
+                with self.lock:
+                    self.active -= 1
+        return wrapper
+
+    def _user(self, index, poll_interval):
+        started, ticket, was_queued = time.perf_counter(), None, False
+        body = json.dumps({'form': {
+            'name': f"Load {index}", 'email': f"{self.prefix}-{index}@example.com", 'total': '10000',
+        }, 'shipping': {'address': 'Jl. Uji Beban 1', 'city': 'Jakarta', 'state': 'DKI Jakarta', 'zipcode': '12345'}})
+        try:
+            while True:
+                request = self.factory.post('/process_order/', data=body, content_type='application/json')
+                request.COOKIES[cart_cookie.COOKIE_NAME] = self.cookie
+                if ticket:
+                    request.META['HTTP_X_CHECKOUT_TICKET'] = ticket
+                request.user = _Anonymous()
+                response = self.view(request)
+                if response.status_code == 200:
+                    return 'ok', time.perf_counter() - started, was_queued
+                if response.status_code != 429:
+                    return f'http_{response.status_code}', time.perf_counter() - started, was_queued
+                data = json.loads(response.content)
+                if not data['queued']:
+                    return 'shed', time.perf_counter() - started, was_queued
+                ticket, was_queued = data['ticket'], True
+                while data.get('status') == 'waiting':
+                    time.sleep(poll_interval)
+                    data = ticket_status(ticket)
+                if data.get('status') == 'expired':
+                    return 'expired', time.perf_counter() - started, was_queued
+                time.sleep(poll_interval)
+        finally:
+            close_old_connections()
+            connection.close()
+
+
+class _Anonymous:
+    is_authenticated = False
+    id = None
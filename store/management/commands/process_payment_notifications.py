@@ -0,0 +1,66 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from store.payment_inbox import inbox_metrics, run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker inbox notifikasi Midtrans: beberapa thread mengambil notifikasi per batch, "
+        "memverifikasinya dan memperbarui Transaction/Order. Berjalan terus (jalankan lewat "
+        "supervisor/systemd) atau dengan --once untuk menghabiskan antrian lalu berhenti."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Jumlah thread worker")
+        parser.add_argument('--batch-size', type=int, default=None, help="Override PAYMENT_INBOX_BATCH_SIZE")
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help="Jeda saat inbox kosong (detik)")
+        parser.add_argument('--stats-interval', type=float, default=60, help="Tulis metrik inbox tiap sekian detik")
+        parser.add_argument('--once', action='store_true', help="Berhenti setelah inbox kosong")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {'done': 0, 'retry': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                result = run_worker(stop, options['batch_size'], options['idle_sleep'], drain=options['once'])
+                with lock:
+                    for outcome, count in result.items():
+                        totals[outcome] += count
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, name=f'payment-inbox-{i}') for i in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        started = time.monotonic()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(options['stats_interval'] / len(threads))
+                if not options['once'] and time.monotonic() - started >= options['stats_interval']:
+                    self._write_metrics()
+                    started = time.monotonic()
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Selesai: {totals['done']} diproses, {totals['retry']} dijadwalkan ulang, {totals['failed']} gagal."
+        ))
+        self._write_metrics()
+
+    def _write_metrics(self):
+        metrics = inbox_metrics()
+        self.stdout.write(
+            f"inbox: pending={metrics['pending']} oldest={metrics['oldest_pending_seconds']}s "
+            f"failed={metrics['failed']} processed_{metrics['window_seconds']}s={metrics['processed']} "
+            f"lag_avg={metrics['avg_lag_seconds']}s lag_max={metrics['max_lag_seconds']}s"
+        )
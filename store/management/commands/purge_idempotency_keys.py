@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Hapus Idempotency-Key checkout yang sudah kedaluwarsa. Jalankan berkala lewat cron."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} idempotency key dihapus."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.payment_inbox import purge_processed
+
+
+class Command(BaseCommand):
+    help = (
+        "Hapus notifikasi pembayaran yang sudah diproses lebih lama dari "
+        "PAYMENT_INBOX_RETENTION_DAYS. Jalankan berkala lewat cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Override PAYMENT_INBOX_RETENTION_DAYS")
+
+    def handle(self, *args, **options):
+        deleted = purge_processed(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} notifikasi pembayaran dihapus."))
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from store.models import RATING_STARS, Product, ProductReview
+
+AGGREGATE_FIELDS = ['rating', 'rating_sum', 'review_count', 'updated_at'] + [
+    f'rating_{star}_count' for star in RATING_STARS
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Hitung ulang rating, jumlah ulasan dan histogram bintang semua produk "
+        "dari ProductReview (satu query GROUP BY), untuk memperbaiki agregat yang menyimpang."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rows = ProductReview.objects.order_by().values('product_id').annotate(
+            total=Count('id'),
+            rating_total=Sum('rating'),
+            **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in RATING_STARS},
+        )
+
+        now = timezone.now()
+        products = []
+        for row in rows:
+            product = Product(
+                pk=row['product_id'],
+                review_count=row['total'],
+                rating_sum=row['rating_total'],
+                rating=round(Decimal(row['rating_total']) / row['total'], 1),
+                updated_at=now,
+            )
+            for star in RATING_STARS:
+                setattr(product, f'rating_{star}_count', row[f'star_{star}'])
+            products.append(product)
+
+        reviewed_ids = [product.pk for product in products]
+        with transaction.atomic():
+            Product.objects.bulk_update(products, AGGREGATE_FIELDS, batch_size=options['batch_size'])
+            # Produk yang semua ulasannya sudah hilang tetapi agregatnya masih terisi
+            reset = Product.objects.exclude(pk__in=reviewed_ids).filter(
+                Q(review_count__gt=0) | Q(rating_sum__gt=0)
+            ).update(
+                rating=Decimal('5.0'), rating_sum=0, review_count=0, updated_at=now,
+                **{f'rating_{star}_count': 0 for star in RATING_STARS},
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Agregat rating {len(products)} produk dibangun ulang, {reset} produk direset."
+        ))
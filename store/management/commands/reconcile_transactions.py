@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from midtransclient.error_midtrans import MidtransAPIError
+
+from store import payment_gateway, payment_signature, payment_state
+from store.models import Transaction
+
+RECONCILABLE = ('pending', 'challenge')
+
+
+class _RateLimiter:
+    """Membatasi panggilan ke sekian per detik di semua thread."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Command(BaseCommand):
+    help = (
+        "Cocokkan transaksi pending/challenge dengan status di Midtrans: baris dibaca per batch, "
+        "status API dipanggil bersamaan (dibatasi --rate per detik), hasilnya diterapkan lewat "
+        "state machine pembayaran, dan transaksi basi yang tidak dikenal Midtrans ditandai expired. "
+        "Posisi terakhir disimpan di file checkpoint sehingga run yang terputus bisa dilanjutkan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10, help="Panggilan status API bersamaan")
+        parser.add_argument('--rate', type=float, default=20, help="Maksimal panggilan per detik (0 = tanpa batas)")
+        parser.add_argument('--min-age-minutes', type=int, default=15,
+                            help="Lewati transaksi yang berubah kurang dari sekian menit lalu (webhook mungkin masih datang)")
+        parser.add_argument('--expire-after-hours', type=int, default=24,
+                            help="Transaksi pending yang tidak dikenal Midtrans setelah sekian jam ditandai expired")
+        parser.add_argument('--checkpoint', default=None,
+                            help="File checkpoint (default RECONCILE_CHECKPOINT_FILE)")
+        parser.add_argument('--restart', action='store_true', help="Abaikan checkpoint dan mulai dari awal")
+        parser.add_argument('--gateway-url', default=None,
+                            help="Base URL Core API, mis. fake_snap_server (http://127.0.0.1:8765)")
+        parser.add_argument('--dry-run', action='store_true', help="Hanya laporkan perubahan, tidak menulis apa pun")
+
+    def handle(self, *args, **options):
+        # Client sendiri: pool sebesar --concurrency tanpa mengubah client bersama proses ini
+        with payment_gateway.core_api(
+            base_url=options['gateway_url'],
+            pool_size=max(options['concurrency'], getattr(settings, 'MIDTRANS_POOL_SIZE', 20)),
+        ) as core_api:
+            self.core_api = core_api
+            self._reconcile(options)
+
+    def _reconcile(self, options):
+        path = options['checkpoint'] or getattr(
+            settings, 'RECONCILE_CHECKPOINT_FILE', os.path.join(settings.BASE_DIR, 'reconcile_checkpoint.json'),
+        )
+        checkpoint = None if options['restart'] else self._load_checkpoint(path)
+        if checkpoint:
+            cutoff, last_pk = datetime.fromisoformat(checkpoint['cutoff']), checkpoint['last_pk']
+            self.stdout.write(f"Melanjutkan dari checkpoint: transaksi setelah id {last_pk}.")
+        else:
+            cutoff, last_pk = timezone.now() - timedelta(minutes=options['min_age_minutes']), 0
+        stale_before = timezone.now() - timedelta(hours=options['expire_after_hours'])
+
+        self.verbosity = options['verbosity']
+        self.limiter = _RateLimiter(options['rate'])
+        self.report = {'checked': 0, 'unchanged': 0, 'not_found': 0, 'mismatch': 0, 'error': 0,
+                       'skipped': 0, 'transitions': {}}
+        candidates = Transaction.objects.filter(
+            status__in=RECONCILABLE, updated_at__lt=cutoff,
+        ).select_related('order').order_by('pk')
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            while True:
+                batch = list(candidates.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                results = list(pool.map(self._fetch_status, batch))
+                self._apply(self._plan(results, stale_before), options['dry_run'])
+                last_pk = batch[-1].pk
+                self.report['checked'] += len(batch)
+                if not options['dry_run']:
+                    self._save_checkpoint(path, cutoff, last_pk)
+                self.stdout.write(f"  batch sampai id {last_pk}: {len(batch)} transaksi diperiksa")
+
+        if not options['dry_run'] and os.path.exists(path):
+            os.remove(path)
+        self._write_report(options['dry_run'])
+
+    def _fetch_status(self, payment):
+        """(payment, response | None jika tidak dikenal Midtrans | Exception)."""
+        self.limiter.wait()
+        try:
+            return payment, self.core_api.transactions.status(payment.transaction_id)
+        except MidtransAPIError as exc:
+            if str((exc.api_response_dict or {}).get('status_code')) == '404':
+                return payment, None
+            return payment, exc
+        except Exception as exc:
+            return payment, exc
+
+    def _plan(self, results, stale_before):
+        """Kelompokkan hasil per status tujuan: {status: [(payment, response), ...]}."""
+        plan = {}
+        for payment, response in results:
+            if isinstance(response, Exception):
+                self.report['error'] += 1
+                self.stderr.write(f"{payment.transaction_id}: {type(response).__name__}: {response}")
+                continue
+            if response is None:
+                self.report['not_found'] += 1
+                # Snap token dibuat tetapi pembeli tidak pernah memilih metode pembayaran
+                if payment.status == 'pending' and payment.created_at < stale_before:
+                    plan.setdefault('expired', []).append((payment, None))
+                continue
+            if (response.get('order_id') != payment.transaction_id
+                    or not payment_signature.amount_matches(response, payment.amount)):
+                self.report['mismatch'] += 1
+                self.stderr.write(f"{payment.transaction_id}: status Midtrans tidak cocok dengan transaksi")
+                continue
+            status = payment_state.midtrans_status(response)
+            if status is None or status == payment.status:
+                self.report['unchanged'] += 1
+                continue
+            plan.setdefault(status, []).append((payment, response))
+        return plan
+
+    def _apply(self, plan, dry_run):
+        for status, items in plan.items():
+            key_counts = self.report['transitions']
+            if dry_run:
+                for payment, _ in items:
+                    key = f"{payment.status} -> {status}"
+                    key_counts[key] = key_counts.get(key, 0) + 1
+                    if self.verbosity >= 2:
+                        self.stdout.write(f"    {payment.transaction_id}: {key}")
+                continue
+            before = {payment.pk: payment.status for payment, _ in items}
+            responses = {payment.pk: response for payment, response in items if response is not None}
+            changed = payment_state.transition_many(
+                [payment for payment, _ in items], status, responses or None,
+            )
+            for payment in changed:
+                key = f"{before[payment.pk]} -> {status}"
+                key_counts[key] = key_counts.get(key, 0) + 1
+            # Status berubah (webhook) di antara cek dan update, atau transisi tidak diizinkan
+            self.report['skipped'] += len(items) - len(changed)
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)
+        except FileNotFoundError:
+            return None
+
+    def _save_checkpoint(self, path, cutoff, last_pk):
+        # Tulis ke file sementara lalu rename, supaya checkpoint tidak pernah setengah jadi
+        with open(f'{path}.tmp', 'w') as checkpoint:
+            json.dump({'cutoff': cutoff.isoformat(), 'last_pk': last_pk}, checkpoint)
+        os.replace(f'{path}.tmp', path)
+
+    def _write_report(self, dry_run):
+        report = self.report
+        title = "Dry run (tidak ada yang diubah)" if dry_run else "Rekonsiliasi selesai"
+        self.stdout.write(self.style.SUCCESS(f"{title}: {report['checked']} transaksi diperiksa."))
+        for key, count in sorted(report['transitions'].items()):
+            self.stdout.write(f"  {key}: {count}")
+        self.stdout.write(
+            f"  tidak berubah: {report['unchanged']}, tidak dikenal Midtrans: {report['not_found']}, "
+            f"tidak cocok: {report['mismatch']}, error: {report['error']}, dilewati: {report['skipped']}"
+        )
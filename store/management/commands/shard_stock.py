@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import inventory
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Pecah stok produk laris (flash sale) ke beberapa baris StockShard agar checkout "
+        "bersamaan tidak antre di satu baris, atau gabungkan kembali dengan --shards 0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', type=int)
+        parser.add_argument('--shards', type=int, default=None,
+                            help="Jumlah shard (default STORE_STOCK_SHARDS, 0 = gabungkan)")
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards is None:
+            shards = getattr(settings, 'STORE_STOCK_SHARDS', 8)
+        if shards < 0:
+            raise CommandError("--shards tidak boleh negatif")
+
+        products = Product.objects.filter(pk__in=options['product_ids'])
+        missing = set(options['product_ids']) - {product.pk for product in products}
+        if missing:
+            raise CommandError(f"Produk tidak ditemukan: {', '.join(map(str, sorted(missing)))}")
+        for product in products:
+            inventory.shard_stock(product, shards)
+            self.stdout.write(f"{product.name}: {shards or 'tanpa'} shard")
+        self.stdout.write(self.style.SUCCESS("Selesai."))
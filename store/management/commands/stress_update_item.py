@@ -0,0 +1,86 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from store import cart_store
+from store.models import Order, OrderItem, Product
+from store.views import updateItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress test updateItem: banyak thread menambah lalu mengurangi produk yang sama "
+        "secara bersamaan, lalu memeriksa tidak ada OrderItem ganda dan quantity tepat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--clicks', type=int, default=25, help="Klik 'add' per thread")
+        parser.add_argument('--removes', type=int, default=10, help="Klik 'remove' per thread")
+
+    def handle(self, *args, **options):
+        threads, clicks, removes = options['threads'], options['clicks'], options['removes']
+        if removes > clicks:
+            raise CommandError("--removes tidak boleh lebih besar dari --clicks")
+
+        # Thread memakai koneksi sendiri, jadi data harus di-commit (dihapus di akhir)
+        user = User.objects.create_user(username=f"stress-{time.time_ns()}")
+        product = Product.objects.create(name="Stress Test", price=10000)
+        self.factory = RequestFactory()
+        try:
+            order = Order.objects.create(customer=user.customer, complete=False)
+            with CaptureQueriesContext(connection) as queries:
+                self._click(user, product, 'add')
+            self.stdout.write(f"Query per klik: {len(queries.captured_queries)}")
+            expected = 1
+
+            for action, per_thread in (('add', clicks), ('remove', removes)):
+                started = time.perf_counter()
+                errors = self._run(user, product, action, threads, per_thread)
+                elapsed = time.perf_counter() - started
+                expected += threads * per_thread * (1 if action == 'add' else -1)
+                # Keranjang ditulis ke OrderItem secara write-behind
+                cart_store.flush(user.pk)
+
+                lines = list(OrderItem.objects.filter(order=order, product=product).values_list('quantity', flat=True))
+                self.stdout.write(
+                    f"{action:>6}: {threads * per_thread} klik dalam {elapsed:.2f}s, "
+                    f"{errors} error, baris={len(lines)}, quantity={sum(lines)} (harapan {expected})"
+                )
+                if errors or len(lines) != 1 or lines[0] != expected:
+                    raise CommandError("Keranjang tidak konsisten setelah klik bersamaan.")
+            self.stdout.write(self.style.SUCCESS("OK: satu baris, quantity sesuai."))
+        finally:
+            cart_store.forget(user.pk)
+            Order.objects.filter(customer=user.customer).delete()
+            product.delete()
+            user.delete()
+
+    def _click(self, user, product, action):
+        request = self.factory.post(
+            '/update_item/', data=json.dumps({'productId': product.pk, 'action': action}),
+            content_type='application/json',
+        )
+        request.user = user
+        return updateItem(request).status_code
+
+    def _run(self, user, product, action, threads, per_thread):
+        def worker(_):
+            failures = 0
+            try:
+                for _ in range(per_thread):
+                    if self._click(user, product, action) != 200:
+                        failures += 1
+            finally:
+                close_old_connections()
+                connection.close()
+            return failures
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return sum(pool.map(worker, range(threads)))
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = '`name`, `description`, `features`, `sku`, `kategori`'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            f"ALTER TABLE store_product ADD FULLTEXT INDEX store_product_fulltext ({SEARCH_COLUMNS})"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+            "USING fts5(name, description, features, sku, kategori, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, name, description, features, sku, kategori) "
+            "SELECT id, COALESCE(name, ''), COALESCE(description, ''), COALESCE(features, ''), "
+            "COALESCE(sku, ''), COALESCE(kategori, '') FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE store_product DROP INDEX store_product_fulltext")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_alter_orderitem_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
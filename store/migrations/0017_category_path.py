@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    categories = list(Category.objects.all())
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    # Telusuri pohon dari root, isi path dan depth setiap kategori
+    stack = [(category, '', 0) for category in children.get(None, [])]
+    while stack:
+        category, prefix, depth = stack.pop()
+        category.path = f"{prefix}{category.pk}/"
+        category.depth = depth
+        stack.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def link_products_to_categories(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+
+    categories = {}
+    for category in Category.objects.order_by('pk'):
+        categories.setdefault(category.name, category)
+
+    for name in Product.objects.order_by().values_list('kategori', flat=True).distinct():
+        category = categories.get(name)
+        if category is None:
+            # Buat kategori root untuk label yang belum punya objek Category
+            base_slug = slugify(name) or 'kategori'
+            slug, suffix = base_slug, 1
+            while Category.objects.filter(slug=slug).exists():
+                suffix += 1
+                slug = f"{base_slug}-{suffix}"
+            category = Category.objects.create(name=name, slug=slug)
+            category.path = f"{category.pk}/"
+            category.save(update_fields=['path'])
+            categories[name] = category
+        Product.objects.filter(kategori=name).update(category=category)
+
+
+def unlink_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Product.objects.update(category=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='store.category', verbose_name='Kategori'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='kategori',
+            field=models.CharField(default='Lainnya', editable=False, max_length=100, verbose_name='Label Kategori'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+        ),
+        migrations.RunPython(link_products_to_categories, unlink_products),
+    ]
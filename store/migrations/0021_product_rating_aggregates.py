@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:44
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductReview = apps.get_model('store', 'ProductReview')
+    rows = ProductReview.objects.order_by().values('product_id').annotate(
+        total=Count('id'),
+        rating_total=Sum('rating'),
+        **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    )
+    products = []
+    for row in rows:
+        product = Product(
+            pk=row['product_id'],
+            review_count=row['total'],
+            rating_sum=row['rating_total'],
+            rating=round(Decimal(row['rating_total']) / row['total'], 1),
+        )
+        for star in range(1, 6):
+            setattr(product, f'rating_{star}_count', row[f'star_{star}'])
+        products.append(product)
+    Product.objects.bulk_update(
+        products,
+        ['rating', 'rating_sum', 'review_count'] + [f'rating_{star}_count' for star in range(1, 6)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_related_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ulasan Bintang 1'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ulasan Bintang 2'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ulasan Bintang 3'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ulasan Bintang 4'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ulasan Bintang 5'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total Bintang'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
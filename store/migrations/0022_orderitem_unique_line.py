@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:46
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    OrderItem.objects.filter(variant__isnull=False).update(variant_key=F('variant_id'))
+
+    # Gabungkan baris ganda (order, product, varian) ke baris tertua
+    duplicates = OrderItem.objects.filter(
+        order__isnull=False, product__isnull=False,
+    ).order_by().values('order_id', 'product_id', 'variant_key').annotate(
+        lines=Count('id'), keep_id=Min('id'), total=Sum('quantity'),
+    ).filter(lines__gt=1)
+    for row in duplicates:
+        lines = OrderItem.objects.filter(
+            order_id=row['order_id'], product_id=row['product_id'], variant_key=row['variant_key'],
+        )
+        lines.exclude(pk=row['keep_id']).delete()
+        lines.filter(pk=row['keep_id']).update(quantity=row['total'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant_key',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'product', 'variant_key'), name='unique_order_item_line'),
+        ),
+    ]
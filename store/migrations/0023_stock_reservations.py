@@ -0,0 +1,81 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def backfill_stock_state(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    Product = apps.get_model('store', 'Product')
+    # Order lama yang sudah selesai tidak boleh dihitung ulang oleh commit_order
+    Order.objects.filter(complete=True).update(stock_committed=True)
+    # stock_status kini diturunkan dari stock (batas default "Stok Menipis" = 5)
+    Product.objects.exclude(stock_status='pre_order').update(stock_status=Case(
+        When(stock__lte=0, then=Value('out_of_stock')),
+        When(stock__lte=5, then=Value('low_stock')),
+        default=Value('available'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_orderitem_unique_line'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_committed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Jumlah Shard Stok'),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_key', models.PositiveIntegerField(default=0)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shard_rows', to='store.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Shard Stok',
+                'verbose_name_plural': 'Shard Stok',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Aktif'), ('committed', 'Terjual'), ('released', 'Dilepas')], default='active', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='store.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.productvariant')),
+                ('shard', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.stockshard')),
+            ],
+            options={
+                'verbose_name': 'Reservasi Stok',
+                'verbose_name_plural': 'Reservasi Stok',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('product', 'variant_key', 'shard'), name='unique_stock_shard'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['status', 'expires_at'], name='stock_reservation_expiry_idx'),
+        ),
+        migrations.RunPython(backfill_stock_state, migrations.RunPython.noop),
+    ]
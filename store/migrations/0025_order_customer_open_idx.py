@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'complete'], name='order_customer_open_idx'),
+        ),
+    ]
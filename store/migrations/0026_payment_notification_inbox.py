@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_order_customer_open_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('order_id', models.CharField(max_length=100)),
+                ('body', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Menunggu'), ('done', 'Diproses'), ('failed', 'Gagal')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Notifikasi Pembayaran',
+                'verbose_name_plural': 'Notifikasi Pembayaran',
+                'indexes': [models.Index(fields=['status', 'available_at'], name='payment_inbox_queue_idx'), models.Index(fields=['order_id'], name='payment_inbox_order_idx')],
+            },
+        ),
+    ]
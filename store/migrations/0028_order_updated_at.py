@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:49
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_updated_at(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    # Perkiraan terbaik untuk order lama: item terakhir ditambahkan, atau tanggal order;
+    # tanpa ini semua keranjang lama tampak baru dan tidak pernah dibersihkan
+    last_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('-date_added').values('date_added')[:1]
+    Order.objects.update(updated_at=Greatest(
+        F('date_ordered'), Coalesce(Subquery(last_item), F('date_ordered')),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0027_transaction_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['complete', 'updated_at'], name='order_open_updated_idx'),
+        ),
+    ]
@@ -1,8 +1,18 @@
-from django.db import models
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import (
+    Case, CharField, Count, DecimalField, Exists, F, FloatField, Func, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Round, Substr
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .search import get_search_backend
+
 # Custom field untuk Rupiah
 class FieldRupiah(models.IntegerField):
     def __init__(self, *args, **kwargs):
@@ -25,6 +35,28 @@ class FieldRupiah(models.IntegerField):
 # Alias untuk kompatibilitas dengan migrasi
 RupiahField = FieldRupiah
 
+def to_rupiah(value):
+    """Nominal (int, string angka atau float hasil hitung diskon) sebagai integer Rupiah."""
+    return int(Decimal(str(value).strip()).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+class CategoryQuerySet(models.QuerySet):
+    def with_product_counts(self):
+        """
+        Tambahkan products_total: jumlah produk di kategori beserta seluruh
+        subkategorinya (semua level), untuk semua baris dalam satu query.
+        """
+        counts = Product.objects.filter(
+            category__path__startswith=OuterRef('path')
+        ).order_by().annotate(
+            total=Func(F('id'), function='COUNT')
+        ).values('total')
+        # Path kosong akan menghitung semua produk lewat startswith
+        return self.annotate(products_total=Case(
+            When(path='', then=Value(0)),
+            default=Coalesce(Subquery(counts), Value(0)),
+            output_field=models.IntegerField(),
+        ))
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name="Nama Kategori")
     slug = models.SlugField(max_length=100, unique=True)
@@ -35,6 +67,12 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     icon_class = models.CharField(max_length=50, null=True, blank=True, verbose_name="Kelas Icon FontAwesome", 
                                  help_text="Contoh: fa-mobile-alt")
+    # Materialized path berisi id leluhur sampai diri sendiri, contoh: "1/5/12/".
+    # Dikelola otomatis oleh save(), jangan diubah manual.
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Kategori"
@@ -43,6 +81,71 @@ class Category(models.Model):
         
     def __str__(self):
         return self.name
+
+    def clean(self):
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if f"/{self.pk}/" in f"/{parent_path}":
+                raise ValidationError({'parent': "Kategori induk tidak boleh subkategori dari kategori ini."})
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+            # Sinkronkan label kategori produk jika nama kategori berubah
+            renamed = self.products.exclude(kategori=self.name)
+            if renamed.exists():
+                # updated_at ikut diubah agar cache kartu produk ikut kedaluwarsa
+                renamed.update(kategori=self.name, updated_at=timezone.now())
+                backend = get_search_backend()
+                for product in self.products.all():
+                    backend.index_product(product)
+
+    def _update_path(self):
+        """Hitung ulang path/depth dan pindahkan seluruh subtree bila parent berubah."""
+        old_path, old_depth = Category.objects.filter(pk=self.pk).values_list('path', 'depth').get()
+        if self.parent_id:
+            parent_path, parent_depth = Category.objects.filter(pk=self.parent_id).values_list('path', 'depth').get()
+            new_path, new_depth = f"{parent_path}{self.pk}/", parent_depth + 1
+        else:
+            new_path, new_depth = f"{self.pk}/", 0
+        self.path, self.depth = new_path, new_depth
+        if new_path == old_path:
+            return
+
+        if old_path:
+            # Satu UPDATE untuk semua keturunan: ganti prefix path lama dengan yang baru
+            Category.objects.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        else:
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+
+    def subtree_q(self, prefix=''):
+        """
+        Q untuk kategori ini beserta seluruh subkategorinya; prefix untuk lookup
+        lewat relasi, mis. 'category__'. Path kosong (kategori belum disimpan
+        atau terlewat backfill) akan cocok dengan semua baris lewat startswith,
+        jadi hanya kategori itu sendiri yang dicocokkan.
+        """
+        if not self.path:
+            return Q(**{f'{prefix}pk__in': [self.pk] if self.pk else []})
+        return Q(**{f'{prefix}path__startswith': self.path})
+
+    def get_descendants(self, include_self=True):
+        """Semua subkategori di bawah kategori ini (semua level)."""
+        descendants = Category.objects.filter(self.subtree_q())
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def get_subtree_products(self, active_only=True):
+        """Produk di kategori ini dan seluruh subkategorinya dalam satu query."""
+        products = Product.objects.filter(self.subtree_q('category__'))
+        if active_only:
+            products = products.filter(category__is_active=True)
+        return products
         
     @property
     def imageURL(self):
@@ -54,10 +157,9 @@ class Category(models.Model):
     @property
     def get_products_count(self):
         """Menghitung jumlah produk dalam kategori dan subkategori."""
-        count = Product.objects.filter(kategori=self.name).count()
-        for child in self.children.all():
-            count += Product.objects.filter(kategori=child.name).count()
-        return count
+        if hasattr(self, 'products_total'):
+            return self.products_total
+        return self.get_subtree_products(active_only=False).count()
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)  # Perbolehkan NULL
@@ -68,14 +170,6 @@ class Customer(models.Model):
         return self.email if self.email else "No Email"
 
 class Product(models.Model):
-    KATEGORI_CHOICES = (
-        ('Elektronik', 'Elektronik'),
-        ('Pakaian', 'Pakaian'),
-        ('Makanan', 'Makanan'), 
-        ('Minuman', 'Minuman'),
-        ('Lainnya', 'Lainnya'),
-    )
-    
     STATUS_CHOICES = (
         ('available', 'Tersedia'),
         ('low_stock', 'Stok Menipis'),
@@ -96,11 +190,21 @@ class Product(models.Model):
     image_2 = models.ImageField(null=True, blank=True, verbose_name="Gambar Tambahan 1")
     image_3 = models.ImageField(null=True, blank=True, verbose_name="Gambar Tambahan 2")
     image_4 = models.ImageField(null=True, blank=True, verbose_name="Gambar Tambahan 3")
+    category = models.ForeignKey(
+        Category,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='products',
+        verbose_name="Kategori"
+    )
+    # Salinan nama kategori (denormalisasi) untuk tampilan dan index full-text.
+    # Disinkronkan otomatis dari category, jangan diisi manual.
     kategori = models.CharField(
-        max_length=50,
-        choices=KATEGORI_CHOICES,
+        max_length=100,
         default='Lainnya',
-        verbose_name="Kategori"
+        editable=False,
+        verbose_name="Label Kategori"
     )
     description = models.TextField(null=True, blank=True, verbose_name="Deskripsi Produk")
     
@@ -111,7 +215,11 @@ class Product(models.Model):
     
     # Informasi Stok dan Penjualan
     stock = models.PositiveIntegerField(default=0, verbose_name="Stok Tersedia")
+    # Diturunkan dari stock oleh save() dan store/inventory.py, kecuali pre_order yang diisi manual
     stock_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available', verbose_name="Status Stok")
+    # > 0 berarti stok dipecah ke StockShard (produk laris/flash sale) dan
+    # stock di atas hanya ringkasan; diatur lewat command shard_stock
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Jumlah Shard Stok")
     sales_count = models.PositiveIntegerField(default=0, verbose_name="Jumlah Terjual")
     
     # Informasi Rating dan Ulasan
@@ -119,6 +227,13 @@ class Product(models.Model):
                                 validators=[MinValueValidator(0), MaxValueValidator(5)],
                                 verbose_name="Rating Produk")
     review_count = models.PositiveIntegerField(default=0, verbose_name="Jumlah Ulasan")
+    # Agregat ulasan, diperbarui inkremental oleh update_review_aggregates()
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Total Bintang")
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ulasan Bintang 1")
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ulasan Bintang 2")
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ulasan Bintang 3")
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ulasan Bintang 4")
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ulasan Bintang 5")
     
     # Metadata
     is_featured = models.BooleanField(default=False, verbose_name="Produk Unggulan")
@@ -171,15 +286,19 @@ class Product(models.Model):
     
     @property
     def get_category(self):
-        """Mendapatkan objek kategori berdasarkan nama kategori."""
-        try:
-            return Category.objects.get(name=self.kategori)
-        except Category.DoesNotExist:
-            return None
+        """Mendapatkan objek kategori produk."""
+        return self.category
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.category_id:
+            self.kategori = self.category.name
+        if self.stock_status != 'pre_order':
+            self.stock_status = stock_status_for(self.stock)
+        super().save(*args, **kwargs)
+
     @property 
     def imageURL(self):
         try:
@@ -221,6 +340,11 @@ class Product(models.Model):
             images.append(self.image4URL)
         return images
     
+    @property
+    def rating_histogram(self):
+        """Jumlah ulasan per bintang, {5: n, 4: n, ..., 1: n}."""
+        return {star: getattr(self, f'rating_{star}_count') for star in reversed(RATING_STARS)}
+
     @property
     def get_features_list(self):
         """Mengubah fitur produk menjadi list."""
@@ -232,6 +356,68 @@ class Product(models.Model):
         verbose_name = "Produk"
         verbose_name_plural = "Produk"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+            # Urutan keyset pagination katalog (-created_at, id)
+            models.Index(fields=['-created_at', 'id'], name='product_created_id_idx'),
+        ]
+
+RATING_STARS = range(1, 6)
+
+def stock_status_for(stock):
+    """Status stok (selain pre_order) untuk jumlah stok tertentu."""
+    if stock <= 0:
+        return 'out_of_stock'
+    if stock <= getattr(settings, 'STORE_LOW_STOCK_THRESHOLD', 5):
+        return 'low_stock'
+    return 'available'
+
+def stock_status_expression():
+    """Ekspresi SQL yang setara dengan stock_status_for(stock); pre_order tidak diubah."""
+    return Case(
+        When(stock_status='pre_order', then=Value('pre_order')),
+        When(stock__lte=0, then=Value('out_of_stock')),
+        When(stock__lte=getattr(settings, 'STORE_LOW_STOCK_THRESHOLD', 5), then=Value('low_stock')),
+        default=Value('available'),
+        output_field=CharField(),
+    )
+
+def update_review_aggregates(product_id, rating, delta):
+    """
+    Tambah (delta=1) atau kurangi (delta=-1) satu ulasan dari agregat produk
+    dengan UPDATE atomik, lalu hitung ulang rata-rata dari sum/count. Rata-rata
+    di-update terpisah karena MySQL mengevaluasi SET dari kiri ke kanan.
+    """
+    if product_id is None or rating not in RATING_STARS:
+        return
+    star_field = f'rating_{rating}_count'
+    products = Product.objects.filter(pk=product_id)
+    with transaction.atomic():
+        if delta > 0:
+            changes = {
+                'rating_sum': F('rating_sum') + rating,
+                'review_count': F('review_count') + 1,
+                star_field: F(star_field) + 1,
+            }
+        else:
+            changes = {
+                'rating_sum': F('rating_sum') - rating,
+                'review_count': F('review_count') - 1,
+                star_field: F(star_field) - 1,
+            }
+        # updated_at ikut diubah agar cache kartu produk ikut kedaluwarsa
+        products.update(updated_at=timezone.now(), **changes)
+        products.update(rating=average_rating_expression())
+
+def average_rating_expression():
+    """Rata-rata rating dari rating_sum/review_count; 5.0 bila belum ada ulasan."""
+    return Case(
+        When(review_count__gt=0, then=Round(
+            Cast(F('rating_sum'), FloatField()) / F('review_count'), 1,
+        )),
+        default=Value(5.0),
+        output_field=DecimalField(max_digits=3, decimal_places=1),
+    )
 
 class ProductReview(models.Model):
     RATING_CHOICES = (
@@ -258,6 +444,20 @@ class ProductReview(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating} bintang)"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = ProductReview.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'product_id', 'rating'
+                ).first()
+            super().save(*args, **kwargs)
+            # Agregat hanya disentuh jika produk atau bintangnya berubah
+            if previous != (self.product_id, self.rating):
+                if previous:
+                    update_review_aggregates(*previous, -1)
+                update_review_aggregates(self.product_id, self.rating, 1)
+
 class ProductVariant(models.Model):
     VARIANT_TYPE_CHOICES = (
         ('color', 'Warna'),
@@ -312,35 +512,192 @@ class ProductVariant(models.Model):
             # Jika tidak ada gambar varian, gunakan gambar produk
             return self.product.imageURL
 
+def _discount_price(prefix):
+    """Ekspresi SQL yang setara dengan Product.get_discount_price."""
+    price = Cast(F(f'{prefix}price'), FloatField())
+    return price - price * F(f'{prefix}discount_percent') / Value(100.0)
+
+def _line_total():
+    """Ekspresi SQL yang setara dengan OrderItem.get_total."""
+    unit_price = Case(
+        When(product__isnull=True, then=Value(0.0)),
+        When(variant__isnull=False,
+             then=_discount_price('variant__product__') + F('variant__price_adjustment')),
+        default=_discount_price('product__'),
+        output_field=FloatField(),
+    )
+    return unit_price * Coalesce(F('quantity'), 0)
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Tambahkan cart_total, cart_items dan needs_shipping yang dihitung di
+        database, sehingga N order cukup dengan satu query.
+        """
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.annotate(
+            cart_total=Coalesce(
+                Subquery(items.annotate(total=Sum(_line_total())).values('total')),
+                Value(0.0), output_field=FloatField(),
+            ),
+            cart_items=Coalesce(
+                Subquery(items.annotate(total=Sum('quantity')).values('total')),
+                Value(0),
+            ),
+            needs_shipping=Exists(
+                OrderItem.objects.filter(order=OuterRef('pk'), product__digital=False)
+            ),
+        )
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     date_ordered = models.DateTimeField(auto_now_add=True)
+    # Perubahan isi keranjang terakhir; apply_deltas ikut memperbaruinya
+    updated_at = models.DateTimeField(auto_now=True)
     complete = models.BooleanField(default=False)
     transaction_id = models.CharField(max_length=100, null=True)
+    # Sudah dihitung ke ProductCoPurchase oleh build_related_products
+    copurchase_processed = models.BooleanField(default=False, editable=False)
+    # Stok sudah dicatat terjual (sales_count) oleh inventory.commit_order
+    stock_committed = models.BooleanField(default=False, editable=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Status complete terakhir yang diketahui ada di database, untuk
+        # mendeteksi save yang menutup keranjang (lihat signals.forget_completed_cart)
+        self._saved_complete = None if 'complete' in self.get_deferred_fields() else self.complete
 
     def __str__(self):
         return str(self.id)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_complete = self.complete
+
+    @property
+    def just_completed(self):
+        """True selama post_save dari save yang mengubah keranjang terbuka menjadi selesai."""
+        return self.complete and self._saved_complete is False
+
+    def _get_total(self, name):
+        """Pakai anotasi dari with_totals() bila ada, jika tidak satu query agregat."""
+        if hasattr(self, name):
+            return getattr(self, name)
+        if self.pk is None:
+            return {'cart_total': 0, 'cart_items': 0, 'needs_shipping': False}[name]
+        return Order.objects.with_totals().filter(pk=self.pk).values_list(name, flat=True).get()
         
     @property
     def shipping(self):
-        shipping = False
-        orderitems = self.orderitem_set.all()
-        for i in orderitems:
-            if i.product.digital == False:
-                shipping = True
-        return shipping
+        return self._get_total('needs_shipping')
 
     @property
     def get_cart_total(self):
-        orderitems = self.orderitem_set.all()
-        total = sum([item.get_total for item in orderitems])
-        return total 
+        return self._get_total('cart_total')
 
     @property
     def get_cart_items(self):
-        orderitems = self.orderitem_set.all()
-        total = sum([item.quantity for item in orderitems])
-        return total 
+        return self._get_total('cart_items')
+
+    class Meta:
+        indexes = [
+            # Antrian order selesai yang belum masuk matriks co-purchase
+            models.Index(fields=['complete', 'copurchase_processed'], name='order_copurchase_queue_idx'),
+            # Keranjang terbuka per customer: get_or_create(customer=..., complete=False).
+            # Index komposit, bukan partial, karena MySQL tidak mendukung partial index.
+            models.Index(fields=['customer', 'complete'], name='order_customer_open_idx'),
+            # Keranjang terbengkalai untuk compact_abandoned_carts
+            models.Index(fields=['complete', 'updated_at'], name='order_open_updated_idx'),
+        ]
+
+
+class OrderItemQuerySet(models.QuerySet):
+    def cart_totals(self):
+        """
+        cart_total, cart_items dan needs_shipping untuk baris-baris ini dengan
+        satu query agregat (sama dengan anotasi Order.objects.with_totals()).
+        """
+        totals = self.aggregate(
+            cart_total=Coalesce(Sum(_line_total()), Value(0.0), output_field=FloatField()),
+            cart_items=Coalesce(Sum('quantity'), Value(0)),
+            shipping_lines=Count('pk', filter=Q(product__digital=False)),
+        )
+        totals['needs_shipping'] = totals.pop('shipping_lines') > 0
+        return totals
+
+    def change_quantity(self, order, product, delta, variant=None):
+        """Tambah/kurangi quantity satu baris keranjang, lihat apply_deltas()."""
+        self.apply_deltas(order, {(product.pk, variant.pk if variant else None): delta})
+
+    def apply_deltas(self, order, deltas, removals=()):
+        """
+        Terapkan perubahan quantity {(product_id, variant_id): delta} ke keranjang
+        dalam satu transaksi: semua penambahan lewat satu INSERT multi-baris
+        ... ON CONFLICT/ON DUPLICATE KEY UPDATE, semua pengurangan lewat satu
+        UPDATE, lalu baris yang habis (atau ada di removals) dihapus sekaligus.
+        Aman untuk request bersamaan karena bergantung pada unique_order_item_line.
+        """
+        increments = [(key, delta) for key, delta in deltas.items() if delta > 0]
+        decrements = [(key, delta) for key, delta in deltas.items() if delta < 0]
+        lines = self.filter(order=order)
+        with transaction.atomic(using=self.db):
+            if increments:
+                self._upsert_lines(order.pk, increments)
+            if decrements:
+                changed = lines.filter(_line_keys_q(key for key, _ in decrements))
+                changed.update(quantity=Case(
+                    *[When(product_id=product_id, variant_key=variant_id or 0,
+                           then=Coalesce(F('quantity'), 0) + delta)
+                      for (product_id, variant_id), delta in decrements],
+                    default=F('quantity'),
+                ))
+                changed.filter(quantity__lte=0).delete()
+            if removals:
+                lines.filter(_line_keys_q(removals)).delete()
+            if increments or decrements or removals:
+                Order.objects.filter(pk=order.pk).update(updated_at=timezone.now())
+
+    def _upsert_lines(self, order_id, increments):
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        columns = '(order_id, product_id, variant_id, variant_key, quantity, date_added)'
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(increments))
+        params = []
+        for (product_id, variant_id), delta in increments:
+            params += [order_id, product_id, variant_id, variant_id or 0, delta, now]
+
+        if connection.vendor == 'mysql':
+            sql = (f"INSERT INTO {table} {columns} VALUES {values} "
+                   f"ON DUPLICATE KEY UPDATE quantity = COALESCE(quantity, 0) + VALUES(quantity)")
+        elif connection.vendor in ('sqlite', 'postgresql'):
+            sql = (f"INSERT INTO {table} {columns} VALUES {values} "
+                   f"ON CONFLICT (order_id, product_id, variant_key) "
+                   f"DO UPDATE SET quantity = COALESCE({table}.quantity, 0) + excluded.quantity")
+        else:
+            # Tanpa upsert native: update dulu, insert jika belum ada
+            for (product_id, variant_id), delta in increments:
+                line = self.filter(order_id=order_id, product_id=product_id, variant_key=variant_id or 0)
+                if line.update(quantity=Coalesce(F('quantity'), 0) + delta):
+                    continue
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(order_id=order_id, product_id=product_id,
+                                    variant_id=variant_id, quantity=delta)
+                except IntegrityError:
+                    line.update(quantity=Coalesce(F('quantity'), 0) + delta)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+def _line_keys_q(keys):
+    """Q untuk sekumpulan baris keranjang (product_id, variant_id)."""
+    condition = Q(pk__in=[])
+    for product_id, variant_id in keys:
+        condition |= Q(product_id=product_id, variant_key=variant_id or 0)
+    return condition
 
 
 class OrderItem(models.Model):
@@ -348,9 +705,18 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True)
     variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, 
                                verbose_name="Varian Produk")
+    # variant_id atau 0. NULL selalu dianggap berbeda oleh unique constraint,
+    # jadi kolom non-null ini yang dipakai untuk mencegah baris ganda.
+    variant_key = models.PositiveIntegerField(default=0, editable=False)
     quantity = models.IntegerField(default=0, null=True, blank=True)
     date_added = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderItemQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.variant_key = self.variant_id or 0
+        super().save(*args, **kwargs)
+
     @property
     def get_total(self):
         # PERBAIKAN: Check if product exists
@@ -374,6 +740,122 @@ class OrderItem(models.Model):
     class Meta:
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product', 'variant_key'], name='unique_order_item_line'),
+        ]
+
+
+class ProductCoPurchase(models.Model):
+    """
+    Jumlah order selesai yang memuat product dan related sekaligus (matriks
+    co-purchase sparse, disimpan dua arah). Diisi bertahap oleh command
+    build_related_products.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Co-purchase Produk"
+        verbose_name_plural = "Co-purchase Produk"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_copurchase_pair'),
+        ]
+
+
+class RelatedProduct(models.Model):
+    """Top-k produk yang paling sering dibeli bersama, siap dibaca product_detail."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Produk Terkait"
+        verbose_name_plural = "Produk Terkait"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'),
+        ]
+
+class StockShard(models.Model):
+    """
+    Potongan stok produk/varian yang dipecah (Product.stock_shards > 0), supaya
+    reservasi bersamaan memotong baris yang berbeda. Lihat store/inventory.py.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shard_rows')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # variant_id atau 0, seperti OrderItem.variant_key
+    variant_key = models.PositiveIntegerField(default=0)
+    shard = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Shard Stok"
+        verbose_name_plural = "Shard Stok"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'variant_key', 'shard'], name='unique_stock_shard'),
+        ]
+
+
+class StockReservation(models.Model):
+    """
+    Stok yang sudah dipotong untuk order yang sedang dibayar. Aktif sampai
+    expires_at; menjadi committed saat pembayaran berhasil atau released
+    (stok dikembalikan) saat gagal, dibatalkan atau kedaluwarsa.
+    """
+    ACTIVE = 'active'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS_CHOICES = (
+        (ACTIVE, 'Aktif'),
+        (COMMITTED, 'Terjual'),
+        (RELEASED, 'Dilepas'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # Shard asal stok (hanya untuk produk yang stoknya dipecah)
+    shard = models.ForeignKey(StockShard, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Reservasi Stok"
+        verbose_name_plural = "Reservasi Stok"
+        indexes = [
+            # Antrian reservasi kedaluwarsa untuk release_expired()
+            models.Index(fields=['status', 'expires_at'], name='stock_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.quantity} x produk {self.product_id} ({self.status})"
+
+class IdempotencyKey(models.Model):
+    """
+    Hasil request checkout per Idempotency-Key (lihat store/idempotency.py).
+    status_code kosong berarti request pertama masih diproses.
+    """
+    # sha256 dari scope, identitas pembeli dan key dari client
+    key = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    body = models.TextField(blank=True)
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Key"
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.status_code or 'diproses'})"
 
 class ShippingAddress(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
@@ -413,6 +895,10 @@ class Transaction(models.Model):
         verbose_name = "Transaksi"
         verbose_name_plural = "Transaksi"
         ordering = ['-created_at']
+        indexes = [
+            # Transaksi pending/challenge untuk command reconcile_transactions
+            models.Index(fields=['status'], name='transaction_status_idx'),
+        ]
 
     def __str__(self):
         return f"Transaction {self.transaction_id} - {self.status}"
@@ -432,6 +918,46 @@ class Transaction(models.Model):
         }
         return status_classes.get(self.status, 'bg-secondary')
 
+class PaymentNotification(models.Model):
+    """
+    Inbox notifikasi webhook Midtrans (lihat store/payment_inbox.py). Handler
+    hanya menyimpan body mentah lalu langsung menjawab 200; worker
+    process_payment_notifications yang memverifikasi dan menerapkannya ke
+    Transaction dan Order.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Menunggu'),
+        (DONE, 'Diproses'),
+        (FAILED, 'Gagal'),
+    )
+
+    # sha256 body mentah: notifikasi yang dikirim ulang Midtrans tidak disimpan dua kali
+    digest = models.CharField(max_length=64, unique=True)
+    order_id = models.CharField(max_length=100)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Notifikasi boleh diambil worker mulai saat ini (dipakai juga untuk lock dan backoff)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Notifikasi Pembayaran"
+        verbose_name_plural = "Notifikasi Pembayaran"
+        indexes = [
+            # Antrian worker: notifikasi pending yang sudah boleh diambil
+            models.Index(fields=['status', 'available_at'], name='payment_inbox_queue_idx'),
+            models.Index(fields=['order_id'], name='payment_inbox_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} ({self.status})"
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     phone = models.CharField(max_length=15, null=True, blank=True)
@@ -0,0 +1,186 @@
+"""
+Keyset (cursor) pagination untuk listing produk.
+
+Berbeda dengan Paginator, halaman berikutnya diambil dengan WHERE pada
+posisi terakhir (created_at, id) sehingga tidak ada COUNT(*) dan tidak ada
+OFFSET yang makin lambat di halaman dalam. Cursor berupa token bertanda
+tangan (django.core.signing) sehingga tidak bisa dimanipulasi user.
+"""
+from datetime import datetime
+from math import ceil
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.http import urlencode
+
+CURSOR_SALT = 'store.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class PageMoved(Exception):
+    """?page=N di luar batas offset; view mengarahkan ke url (versi cursor)."""
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.url = url
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, approximate_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = approximate_count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """
+    Paginasi berdasarkan urutan (-created_at, id).
+
+    count_cache_key bersifat opsional: jika diisi, total produk dihitung sekali
+    lalu di-cache selama STORE_COUNT_CACHE_TIMEOUT detik untuk ditampilkan di UI.
+    """
+
+    def __init__(self, queryset, per_page, count_cache_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_cache_key = count_cache_key
+
+    def _encode(self, direction, product):
+        return signing.dumps(
+            {'d': direction, 'c': product.created_at.isoformat(), 'i': product.pk},
+            salt=CURSOR_SALT, compress=True,
+        )
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            return data['d'], datetime.fromisoformat(data['c']), int(data['i'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+
+    def approximate_count(self):
+        if not self.count_cache_key:
+            return None
+        timeout = getattr(settings, 'STORE_COUNT_CACHE_TIMEOUT', 300)
+        return cache.get_or_set(self.count_cache_key, self.queryset.count, timeout)
+
+    def page(self, cursor=None):
+        """Ambil satu halaman dari cursor (None = halaman pertama)."""
+        if not cursor:
+            return self._forward(None)
+        direction, created_at, pk = self._decode(cursor)
+        if direction == 'prev':
+            return self._backward(created_at, pk)
+        return self._forward((created_at, pk))
+
+    def offset_page(self, number):
+        """
+        Halaman bernomor (?page=N) untuk kompatibilitas URL lama. Hanya untuk
+        halaman dangkal; navigasi selanjutnya memakai cursor.
+        """
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset.order_by('-created_at', 'id')[offset:offset + self.per_page + 1])
+        return self._build(rows, has_next=len(rows) > self.per_page, has_previous=number > 1)
+
+    def offset_cursor(self, number):
+        """
+        Cursor untuk halaman bernomor (None = halaman pertama). Halaman di luar
+        jumlah produk menjadi halaman terakhir, seperti Paginator.get_page.
+        """
+        ordered = self.queryset.order_by('-created_at', 'id').only('created_at', 'id')
+        if number > 1:
+            previous = ordered[(number - 1) * self.per_page - 1:(number - 1) * self.per_page].first()
+            if previous is not None:
+                return self._encode('next', previous)
+            last_number = ceil(self.queryset.count() / self.per_page)
+            if last_number > 1:
+                previous = ordered[(last_number - 1) * self.per_page - 1]
+                return self._encode('next', previous)
+        return None
+
+    def _forward(self, position):
+        queryset = self.queryset.order_by('-created_at', 'id')
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=pk))
+        # Ambil satu baris ekstra untuk tahu apakah masih ada halaman berikutnya
+        rows = list(queryset[:self.per_page + 1])
+        return self._build(rows, has_next=len(rows) > self.per_page, has_previous=position is not None)
+
+    def _backward(self, created_at, pk):
+        queryset = self.queryset.order_by('created_at', '-id').filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build(rows, has_next=True, has_previous=has_previous)
+
+    def _build(self, rows, has_next, has_previous):
+        rows = rows[:self.per_page]
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode('next', rows[-1]) if has_next and rows else None,
+            previous_cursor=self._encode('prev', rows[0]) if has_previous and rows else None,
+            approximate_count=self.approximate_count(),
+        )
+
+def paginate_request(request, queryset, per_page, count_cache_key=None):
+    """
+    Halaman produk dari request: ?cursor=... untuk navigasi keyset, ?page=N
+    tetap dilayani untuk halaman dangkal (<= STORE_MAX_OFFSET_PAGE). Link lama
+    ke halaman yang lebih dalam menghasilkan PageMoved ke cursor yang setara.
+    """
+    paginator = KeysetPaginator(queryset, per_page, count_cache_key=count_cache_key)
+    cursor = request.GET.get('cursor')
+    page_number = request.GET.get('page')
+
+    if not cursor and page_number:
+        try:
+            number = max(int(page_number), 1)
+        except ValueError:
+            number = 1
+        if number > getattr(settings, 'STORE_MAX_OFFSET_PAGE', 5):
+            offset_cursor = paginator.offset_cursor(number)
+            querystring = page_querystring(request)
+            if offset_cursor:
+                querystring += urlencode({'cursor': offset_cursor})
+            raise PageMoved(f"{request.path}?{querystring}".rstrip('?&'))
+        return paginator.offset_page(number)
+
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        return paginator.page()
+
+def page_querystring(request):
+    """Query string filter aktif (tanpa page/cursor), siap disambung dengan cursor=."""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode() + '&' if params else ''
@@ -0,0 +1,188 @@
+"""
+Client Midtrans bersama, satu per proses worker.
+
+midtransclient.Snap/CoreApi memanggil requests.request langsung: setiap
+request membuka koneksi TLS baru dan tidak punya timeout. Modul ini membuat
+Snap dan CoreApi sekali per proses di atas satu requests.Session yang
+menyimpan koneksi keep-alive (maksimal MIDTRANS_POOL_SIZE per host), dengan
+timeout MIDTRANS_CONNECT_TIMEOUT/MIDTRANS_READ_TIMEOUT dan retry ber-backoff
+eksponensial.
+
+Retry hanya dilakukan jika request pasti belum diproses Midtrans: gagal
+connect, atau response 429/503. Timeout baca dan 5xx lain tidak diulang
+karena order_id Snap hanya bisa dipakai sekali.
+
+acreate_transaction adalah versi async untuk view yang dilayani lewat
+ecommerce/asgi.py. Panggilan HTTP-nya memakai session yang sama, tetapi
+berjalan di thread pool khusus gateway (sebesar pool koneksi), jadi event
+loop tidak ikut menunggu Midtrans.
+
+MIDTRANS_SNAP_BASE_URL dan MIDTRANS_CORE_API_BASE_URL mengganti URL API,
+misalnya ke fake_snap_server untuk pengujian dan benchmark. Pekerjaan batch
+yang butuh URL atau ukuran pool lain (reconcile_transactions) memakai
+core_api(), client tersendiri yang tidak mengganggu client bersama.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import midtransclient
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from midtransclient.http_client import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_lock = threading.Lock()
+_clients = {}
+_state = {'session': None, 'executor': None}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _TimeoutSession(requests.Session):
+    """Session dengan timeout default; midtransclient tidak pernah mengirim timeout."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class _PooledHttpClient(HttpClient):
+    """HttpClient midtransclient yang memakai session bersama alih-alih modul requests."""
+
+    def __init__(self, session):
+        self.http_client = session
+
+
+def _new_session(pool_size=None):
+    retries = _setting('MIDTRANS_RETRIES', 2)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        status_forcelist=(429, 503),
+        allowed_methods=None,
+        backoff_factor=_setting('MIDTRANS_RETRY_BACKOFF', 0.3),
+        # Retry-After dari gateway bisa puluhan detik; worker tidak boleh tertahan selama itu
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_size or _setting('MIDTRANS_POOL_SIZE', 20),
+        max_retries=retry,
+    )
+    session = _TimeoutSession((
+        _setting('MIDTRANS_CONNECT_TIMEOUT', 5),
+        _setting('MIDTRANS_READ_TIMEOUT', 20),
+    ))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _build(kind, session, base_url=None):
+    client_class = midtransclient.Snap if kind == 'snap' else midtransclient.CoreApi
+    client = client_class(
+        is_production=settings.MIDTRANS_IS_PRODUCTION,
+        server_key=settings.MIDTRANS_SERVER_KEY,
+        client_key=settings.MIDTRANS_CLIENT_KEY,
+    )
+    client.http_client = _PooledHttpClient(session)
+
+    config = client.api_config
+    if kind == 'snap':
+        base_url = base_url or _setting('MIDTRANS_SNAP_BASE_URL', None)
+        if base_url:
+            config.SNAP_SANDBOX_BASE_URL = config.SNAP_PRODUCTION_BASE_URL = base_url.rstrip('/')
+    else:
+        base_url = base_url or _setting('MIDTRANS_CORE_API_BASE_URL', None)
+        if base_url:
+            config.CORE_SANDBOX_BASE_URL = config.CORE_PRODUCTION_BASE_URL = base_url.rstrip('/')
+    return client
+
+
+def _client(kind):
+    client = _clients.get(kind)
+    if client is None:
+        with _lock:
+            client = _clients.get(kind)
+            if client is None:
+                if _state['session'] is None:
+                    _state['session'] = _new_session()
+                client = _clients[kind] = _build(kind, _state['session'])
+    return client
+
+
+def get_snap():
+    """midtransclient.Snap bersama untuk proses ini."""
+    return _client('snap')
+
+
+def get_core_api():
+    """midtransclient.CoreApi bersama untuk proses ini."""
+    return _client('core')
+
+
+@contextmanager
+def core_api(base_url=None, pool_size=None):
+    """
+    CoreApi dengan session sendiri (base_url dan pool_size bisa berbeda dari
+    settings), ditutup saat keluar dari blok with. Client bersama dan setting
+    proses tidak tersentuh.
+    """
+    session = _new_session(pool_size)
+    try:
+        yield _build('core', session, base_url)
+    finally:
+        session.close()
+
+
+def create_transaction(parameters):
+    """Buat transaksi Snap; mengembalikan dict berisi token dan redirect_url."""
+    return get_snap().create_transaction(parameters)
+
+
+def _executor():
+    if _state['executor'] is None:
+        with _lock:
+            if _state['executor'] is None:
+                _state['executor'] = ThreadPoolExecutor(
+                    max_workers=_setting('MIDTRANS_POOL_SIZE', 20), thread_name_prefix='midtrans',
+                )
+    return _state['executor']
+
+
+async def acreate_transaction(parameters):
+    """Versi async create_transaction untuk view ASGI."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), create_transaction, parameters)
+
+
+def reset():
+    """Buang client, session dan thread pool; dibuat ulang saat dipakai berikutnya."""
+    with _lock:
+        _clients.clear()
+        session, executor = _state['session'], _state['executor']
+        _state['session'] = _state['executor'] = None
+    if session is not None:
+        session.close()
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('MIDTRANS_'):
+        reset()
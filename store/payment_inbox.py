@@ -0,0 +1,168 @@
+"""
+Inbox notifikasi pembayaran Midtrans.
+
+midtrans_notification_handler hanya memanggil receive(): body mentah disimpan
+ke tabel PaymentNotification lalu Midtrans langsung dijawab 200, tanpa
+panggilan balik ke Midtrans dan tanpa mengunci Transaction/Order. Notifikasi
+yang dikirim ulang dengan body yang sama diabaikan (digest unik).
+
+Worker (command process_payment_notifications) mengambil notifikasi per batch
+dengan SELECT ... FOR UPDATE SKIP LOCKED, jadi beberapa worker bisa berjalan
+bersamaan tanpa mengambil baris yang sama. Dalam satu batch hanya notifikasi
+terbaru per order yang diterapkan. Tanda tangan dicek lokal (lihat
+store/payment_signature.py) dan status diterapkan lewat state machine
+store/payment_state.py, jadi notifikasi yang terlambat atau dikirim ulang
+tidak menimpa status yang lebih baru.
+
+Notifikasi yang gagal (transaksi belum tersimpan, status API fallback tidak
+bisa dihubungi) diulang dengan backoff eksponensial sampai
+PAYMENT_INBOX_MAX_ATTEMPTS kali lalu ditandai failed. Notifikasi yang tidak
+lolos verifikasi langsung ditandai failed. Notifikasi milik worker yang mati
+di tengah batch diambil worker lain setelah PAYMENT_INBOX_LOCK_TIMEOUT detik.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+
+from . import payment_signature, payment_state
+from .models import PaymentNotification, Transaction
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def receive(raw_body):
+    """Simpan notifikasi mentah ke inbox; False jika duplikat.
+
+    ValueError jika body bukan notifikasi Midtrans (bukan JSON atau tanpa order_id).
+    """
+    payload = json.loads(raw_body)
+    order_id = payload.get('order_id') if isinstance(payload, dict) else None
+    if not order_id:
+        raise ValueError("Notifikasi tanpa order_id")
+    try:
+        with transaction.atomic():
+            PaymentNotification.objects.create(
+                digest=hashlib.sha256(raw_body).hexdigest(),
+                order_id=str(order_id)[:100],
+                body=raw_body.decode('utf-8'),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def claim_batch(batch_size=None):
+    """Ambil notifikasi pending untuk diproses worker ini (dikunci PAYMENT_INBOX_LOCK_TIMEOUT detik)."""
+    batch_size = batch_size or _setting('PAYMENT_INBOX_BATCH_SIZE', 50)
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PaymentNotification.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentNotification.PENDING, available_at__lte=now)
+            .order_by('available_at', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        PaymentNotification.objects.filter(pk__in=ids).update(
+            available_at=now + timedelta(seconds=_setting('PAYMENT_INBOX_LOCK_TIMEOUT', 60)),
+            attempts=F('attempts') + 1,
+        )
+    return list(PaymentNotification.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def apply_notification(order_id, notification):
+    """Verifikasi notifikasi lalu terapkan statusnya; True jika status transaksi berubah."""
+    payment = Transaction.objects.get(transaction_id=order_id)
+    status_response = payment_signature.verify_notification(notification, payment)
+    status = payment_state.midtrans_status(status_response)
+    return status is not None and payment_state.transition(payment, status, status_response)
+
+
+def _retry_later(notification, error):
+    """Jadwalkan ulang notifikasi yang gagal; mengembalikan 'retry' atau 'failed'."""
+    now = timezone.now()
+    permanent = isinstance(error, payment_signature.InvalidNotification)
+    if permanent or notification.attempts >= _setting('PAYMENT_INBOX_MAX_ATTEMPTS', 8):
+        status, available_at, outcome = PaymentNotification.FAILED, now, 'failed'
+    else:
+        delay = min(_setting('PAYMENT_INBOX_RETRY_BACKOFF', 5) * 2 ** (notification.attempts - 1), 3600)
+        status, available_at, outcome = PaymentNotification.PENDING, now + timedelta(seconds=delay), 'retry'
+    PaymentNotification.objects.filter(pk=notification.pk).update(
+        status=status, available_at=available_at, last_error=f"{type(error).__name__}: {error}"[:2000],
+    )
+    return outcome
+
+
+def process_batch(notifications):
+    """Proses satu batch; mengembalikan jumlah notifikasi per hasil (done/retry/failed)."""
+    by_order = {}
+    for notification in notifications:
+        by_order.setdefault(notification.order_id, []).append(notification)
+
+    counts = {'done': 0, 'retry': 0, 'failed': 0}
+    for order_id, group in by_order.items():
+        try:
+            # Notifikasi yang lebih lama untuk order yang sama sudah tidak berlaku
+            apply_notification(order_id, json.loads(group[-1].body))
+        except Exception as exc:
+            for notification in group:
+                counts[_retry_later(notification, exc)] += 1
+            continue
+        PaymentNotification.objects.filter(pk__in=[notification.pk for notification in group]).update(
+            status=PaymentNotification.DONE, processed_at=timezone.now(), last_error='',
+        )
+        counts['done'] += len(group)
+    return counts
+
+
+def run_worker(stop, batch_size=None, idle_sleep=1.0, drain=False):
+    """Loop worker sampai stop (threading.Event) di-set, atau inbox kosong jika drain."""
+    totals = {'done': 0, 'retry': 0, 'failed': 0}
+    while not stop.is_set():
+        batch = claim_batch(batch_size)
+        if not batch:
+            if drain:
+                break
+            stop.wait(idle_sleep)
+            continue
+        for outcome, count in process_batch(batch).items():
+            totals[outcome] += count
+    return totals
+
+
+def inbox_metrics(window=300):
+    """Ukuran antrian dan lag inbox (detik) untuk monitoring."""
+    now = timezone.now()
+    queue = PaymentNotification.objects.filter(status=PaymentNotification.PENDING).aggregate(
+        count=Count('pk'), oldest=Min('received_at'),
+    )
+    lag = ExpressionWrapper(F('processed_at') - F('received_at'), output_field=DurationField())
+    recent = PaymentNotification.objects.filter(
+        status=PaymentNotification.DONE, processed_at__gte=now - timedelta(seconds=window),
+    ).aggregate(count=Count('pk'), avg_lag=Avg(lag), max_lag=Max(lag))
+    return {
+        'pending': queue['count'],
+        'oldest_pending_seconds': round((now - queue['oldest']).total_seconds(), 3) if queue['oldest'] else 0,
+        'failed': PaymentNotification.objects.filter(status=PaymentNotification.FAILED).count(),
+        'window_seconds': window,
+        'processed': recent['count'],
+        'avg_lag_seconds': round(recent['avg_lag'].total_seconds(), 3) if recent['avg_lag'] else 0,
+        'max_lag_seconds': round(recent['max_lag'].total_seconds(), 3) if recent['max_lag'] else 0,
+    }
+
+
+def purge_processed(days=None):
+    """Hapus notifikasi yang sudah diproses lebih dari sekian hari; mengembalikan jumlahnya."""
+    days = days if days is not None else _setting('PAYMENT_INBOX_RETENTION_DAYS', 7)
+    deleted, _ = PaymentNotification.objects.filter(
+        status=PaymentNotification.DONE, processed_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
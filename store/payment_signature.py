@@ -0,0 +1,71 @@
+"""
+Verifikasi notifikasi Midtrans tanpa memanggil balik API Midtrans.
+
+Midtrans menandatangani setiap notifikasi dengan
+signature_key = SHA512(order_id + status_code + gross_amount + server_key),
+dengan gross_amount persis seperti string yang dikirim (mis. "10000.00").
+verify_notification memeriksa tanda tangan itu dalam waktu konstan
+(hmac.compare_digest) lalu mencocokkan gross_amount dengan Transaction.amount
+yang tersimpan. Status API Midtrans hanya dipanggil jika salah satunya tidak
+cocok dan MIDTRANS_VERIFY_FALLBACK aktif; tanpa fallback notifikasi ditolak.
+Tanpa MIDTRANS_SERVER_KEY tanda tangan tidak pernah dianggap valid.
+"""
+import hashlib
+import hmac
+from decimal import InvalidOperation
+
+from django.conf import settings
+
+from . import payment_gateway
+from .models import to_rupiah
+
+
+class InvalidNotification(Exception):
+    """Notifikasi tidak lolos verifikasi (tanda tangan atau nominal tidak cocok)."""
+
+
+def signature_for(order_id, status_code, gross_amount, server_key=None):
+    """signature_key Midtrans untuk kombinasi ini (hex, huruf kecil)."""
+    if server_key is None:
+        server_key = settings.MIDTRANS_SERVER_KEY
+    return hashlib.sha512(f'{order_id}{status_code}{gross_amount}{server_key}'.encode()).hexdigest()
+
+
+def signature_valid(notification, server_key=None):
+    """True jika signature_key notifikasi cocok (dibandingkan dalam waktu konstan)."""
+    if server_key is None:
+        server_key = settings.MIDTRANS_SERVER_KEY
+    signature = notification.get('signature_key')
+    if not server_key or not isinstance(signature, str):
+        return False
+    expected = signature_for(
+        notification.get('order_id', ''), notification.get('status_code', ''),
+        notification.get('gross_amount', ''), server_key,
+    )
+    return hmac.compare_digest(expected.encode(), signature.lower().encode())
+
+
+def amount_matches(response, amount):
+    """True jika gross_amount dari Midtrans sama dengan nominal yang tersimpan (Rupiah bulat)."""
+    try:
+        return to_rupiah(response['gross_amount']) == to_rupiah(amount)
+    except (KeyError, InvalidOperation, TypeError, ValueError):
+        return False
+
+
+def verify_notification(notification, payment):
+    """
+    Status transaksi yang sudah terverifikasi untuk Transaction payment:
+    notifikasi itu sendiri jika tanda tangan dan nominalnya cocok, atau hasil
+    status API (fallback). InvalidNotification jika keduanya gagal.
+    """
+    if (notification.get('order_id') == payment.transaction_id
+            and signature_valid(notification) and amount_matches(notification, payment.amount)):
+        return notification
+    if not getattr(settings, 'MIDTRANS_VERIFY_FALLBACK', True):
+        raise InvalidNotification(f"Tanda tangan atau nominal notifikasi {payment.transaction_id} tidak cocok")
+
+    status_response = payment_gateway.get_core_api().transactions.status(payment.transaction_id)
+    if status_response.get('order_id') != payment.transaction_id or not amount_matches(status_response, payment.amount):
+        raise InvalidNotification(f"Status Midtrans untuk {payment.transaction_id} tidak cocok dengan transaksi")
+    return status_response
@@ -0,0 +1,135 @@
+"""
+State machine Transaction.status.
+
+Setiap perubahan status adalah satu UPDATE ... WHERE status IN (status asal
+yang diizinkan), jadi tidak ada read-modify-write: notifikasi "pending" yang
+terlambat tidak bisa menimpa "settlement", dan notifikasi yang dikirim ulang
+hanya menjadi UPDATE yang tidak mengenai baris apa pun. transition()
+mengembalikan True hanya jika status benar-benar berubah.
+
+Jika status baru berarti lunas, Order.complete diset di transaksi database
+yang sama, lalu stok dicatat terjual dan keranjang di cache dibuang; jika
+berarti gagal, reservasi stok dilepas. Efek ini sama dengan signal post_save
+Order/Transaction, yang tidak terpanggil karena perubahan memakai update().
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import cart_store, inventory
+from .models import Order, Transaction
+
+# Status tujuan -> status asal yang diizinkan. "pending" adalah status awal
+# (dibuat create_transaction), jadi tidak pernah menjadi tujuan transisi;
+# hanya restart() yang mengembalikannya untuk transaksi Snap baru.
+# Redirect payment_error ("failed") tidak dianggap final: notifikasi lunas
+# dari Midtrans setelahnya tetap diterapkan.
+TRANSITIONS = {
+    'pending': (),
+    'challenge': ('pending',),
+    'success': ('pending', 'challenge', 'failed'),
+    'settlement': ('pending', 'challenge', 'success', 'failed'),
+    'deny': ('pending', 'challenge'),
+    'canceled': ('pending', 'challenge', 'success'),
+    'expired': ('pending',),
+    'failed': ('pending',),
+}
+PAID = ('success', 'settlement')
+FAILED = ('deny', 'canceled', 'failed', 'expired')
+# Status yang boleh diganti transaksi Snap baru untuk order yang sama
+RESTARTABLE = ('pending',) + FAILED
+
+
+def midtrans_status(response):
+    """Status Transaction untuk response/notifikasi Midtrans; None jika tidak dikenal."""
+    transaction_status = response.get('transaction_status')
+    if transaction_status == 'capture':
+        return 'challenge' if response.get('fraud_status') == 'challenge' else 'success'
+    if transaction_status in ('cancel', 'expire'):
+        return 'canceled'
+    if transaction_status in ('settlement', 'deny', 'pending'):
+        return transaction_status
+    return None
+
+
+def _apply_effects(payments, status):
+    """Efek transisi yang sudah berlaku: order lunas ditutup, pembayaran gagal melepas stok."""
+    if status in PAID:
+        Order.objects.filter(pk__in=[payment.order_id for payment in payments], complete=False).update(complete=True)
+        for payment in payments:
+            order = payment.order
+            order.complete = True
+            inventory.commit_order(order)
+            cart_store.forget(payment.user_id)
+    elif status in FAILED:
+        for payment in payments:
+            inventory.release_order(payment.order)
+
+
+def transition(payment, status, payment_response=None):
+    """
+    Ubah payment ke status jika status saat ini mengizinkan; True jika berubah.
+    payment_response (jika ada) ikut disimpan hanya saat transisi berlaku.
+    """
+    allowed = TRANSITIONS[status]
+    if not allowed:
+        return False
+    fields = {'status': status, 'updated_at': timezone.now()}
+    if payment_response is not None:
+        fields['payment_response'] = payment_response
+
+    with transaction.atomic():
+        if not Transaction.objects.filter(pk=payment.pk, status__in=allowed).update(**fields):
+            return False
+        _apply_effects([payment], status)
+
+    for field, value in fields.items():
+        setattr(payment, field, value)
+    return True
+
+
+def restart(payment, transaction_id, amount, payment_response):
+    """
+    Pakai ulang payment untuk transaksi Snap baru dari order yang sama (status
+    kembali pending) jika pembayaran sebelumnya belum berjalan atau gagal;
+    True jika berubah. Pembayaran lunas atau challenge tidak pernah ditimpa.
+    """
+    fields = {
+        'transaction_id': transaction_id, 'amount': amount, 'payment_response': payment_response,
+        'status': 'pending', 'updated_at': timezone.now(),
+    }
+    if not Transaction.objects.filter(pk=payment.pk, status__in=RESTARTABLE).update(**fields):
+        return False
+    for field, value in fields.items():
+        setattr(payment, field, value)
+    return True
+
+
+def transition_many(payments, status, responses=None):
+    """
+    Versi batch transition(): satu UPDATE status untuk semua payment yang
+    statusnya mengizinkan, payment_response per baris lewat bulk_update
+    (responses: dict pk -> response). Mengembalikan payment yang berubah.
+    """
+    allowed = TRANSITIONS[status]
+    by_pk = {payment.pk: payment for payment in payments}
+    if not allowed or not by_pk:
+        return []
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Kunci baris yang masih boleh berubah, supaya daftar yang berubah pasti tepat
+        pks = list(Transaction.objects.select_for_update().filter(
+            pk__in=by_pk, status__in=allowed,
+        ).order_by('pk').values_list('pk', flat=True))
+        if not pks:
+            return []
+        Transaction.objects.filter(pk__in=pks, status__in=allowed).update(status=status, updated_at=now)
+        changed = [by_pk[pk] for pk in pks]
+        for payment in changed:
+            payment.status, payment.updated_at = status, now
+        if responses:
+            for payment in changed:
+                payment.payment_response = responses[payment.pk]
+            Transaction.objects.bulk_update(changed, ['payment_response'])
+        _apply_effects(changed, status)
+    return changed
@@ -0,0 +1,119 @@
+"""
+Produk terkait berbasis co-purchase.
+
+build_related_products memproses order selesai yang belum dihitung
+(Order.copurchase_processed=False) per batch: pasangan produk dalam satu
+order dihitung sebagai matriks sparse {(product, related): jumlah}, ditambahkan
+ke ProductCoPurchase, lalu top-k tetangga untuk produk yang tersentuh ditulis
+ulang ke RelatedProduct. Order lama tidak pernah dibaca ulang.
+"""
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Order, OrderItem, Product, ProductCoPurchase, RelatedProduct
+
+# Order dengan produk sebanyak ini dianggap borongan dan tidak ikut dihitung
+# (pasangannya kuadratik dan tidak mencerminkan kemiripan produk)
+MAX_BASKET_SIZE = 50
+
+def related_products_for(product, limit=None):
+    """
+    Produk terkait untuk halaman detail: hasil co-purchase (satu query
+    ber-index), dilengkapi produk satu kategori bila kurang dari limit.
+    """
+    limit = limit or getattr(settings, 'STORE_RELATED_PRODUCTS', 4)
+    related = list(
+        Product.objects.filter(recommended_for__product=product).order_by('recommended_for__rank')[:limit]
+    )
+    if len(related) < limit and product.category_id:
+        exclude_ids = [product.pk] + [item.pk for item in related]
+        related += list(
+            Product.objects.filter(category_id=product.category_id)
+            .exclude(pk__in=exclude_ids)[:limit - len(related)]
+        )
+    return related
+
+def count_pairs(order_ids):
+    """Matriks co-purchase sparse untuk sekumpulan order."""
+    baskets = defaultdict(set)
+    items = OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).values_list(
+        'order_id', 'product_id'
+    )
+    for order_id, product_id in items:
+        baskets[order_id].add(product_id)
+
+    pairs = Counter()
+    for basket in baskets.values():
+        if 1 < len(basket) <= MAX_BASKET_SIZE:
+            pairs.update(permutations(sorted(basket), 2))
+    return pairs
+
+def _apply_pairs(pairs):
+    """Tambahkan hitungan baru ke ProductCoPurchase (update untuk yang ada, insert sisanya)."""
+    by_product = defaultdict(dict)
+    for (product_id, related_id), count in pairs.items():
+        by_product[product_id][related_id] = count
+
+    # Baris dikunci sampai commit, jadi count bisa dijumlah di Python lalu bulk_update
+    changed = []
+    for row in ProductCoPurchase.objects.select_for_update().filter(product_id__in=by_product):
+        delta = by_product[row.product_id].pop(row.related_id, None)
+        if delta:
+            row.count += delta
+            changed.append(row)
+    ProductCoPurchase.objects.bulk_update(changed, ['count'], batch_size=500)
+
+    ProductCoPurchase.objects.bulk_create([
+        ProductCoPurchase(product_id=product_id, related_id=related_id, count=count)
+        for product_id, related in by_product.items()
+        for related_id, count in related.items()
+    ])
+    return set(by_product)
+
+def _rebuild_top_k(product_ids, top_k):
+    """Tulis ulang RelatedProduct untuk produk yang hitungannya berubah."""
+    neighbors = defaultdict(list)
+    rows = ProductCoPurchase.objects.filter(product_id__in=product_ids).order_by(
+        'product_id', '-count', 'related_id'
+    ).values_list('product_id', 'related_id', 'count')
+    for product_id, related_id, count in rows:
+        if len(neighbors[product_id]) < top_k:
+            neighbors[product_id].append((related_id, count))
+
+    RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+    RelatedProduct.objects.bulk_create([
+        RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=count)
+        for product_id, related in neighbors.items()
+        for rank, (related_id, count) in enumerate(related, start=1)
+    ])
+
+def build_related_products(batch_size=500, top_k=None):
+    """
+    Proses order selesai yang belum dihitung. Mengembalikan
+    (jumlah order, jumlah pasangan, jumlah produk yang diperbarui).
+    """
+    top_k = top_k or getattr(settings, 'STORE_RELATED_PRODUCTS', 4)
+    total_orders = total_pairs = 0
+    touched = set()
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(complete=True, copurchase_processed=False)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            pairs = count_pairs(order_ids)
+            updated = _apply_pairs(pairs) if pairs else set()
+            if updated:
+                _rebuild_top_k(updated, top_k)
+            Order.objects.filter(id__in=order_ids).update(copurchase_processed=True)
+
+        total_orders += len(order_ids)
+        total_pairs += len(pairs)
+        touched |= updated
+    return total_orders, total_pairs, len(touched)
@@ -0,0 +1,174 @@
+"""
+Backend pencarian produk.
+
+Backend dipilih lewat settings.STORE_SEARCH_BACKEND (dotted path). Jika
+kosong, backend dipilih otomatis berdasarkan vendor database: FULLTEXT
+untuk MySQL, FTS5 untuk SQLite, dan icontains untuk database lainnya.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Kolom Product yang ikut diindeks
+SEARCH_FIELDS = ('name', 'description', 'features', 'sku', 'kategori')
+
+# Bobot bm25 per kolom (urutan sama dengan SEARCH_FIELDS): nama paling penting
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 5.0, 3.0)
+
+FTS_TABLE = 'store_product_fts'
+FULLTEXT_INDEX = 'store_product_fulltext'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(query):
+    """Pecah query user menjadi token kata (tanpa operator/tanda baca)."""
+    return _TOKEN_RE.findall(query.lower())
+
+
+class IcontainsBackend:
+    """Pencarian lama: LIKE '%...%' tanpa ranking, tanpa indeks."""
+
+    def search(self, queryset, query, ranked=True):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(kategori__icontains=query)
+        )
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class MySQLFullTextBackend(IcontainsBackend):
+    """
+    FULLTEXT index InnoDB. Index diperbarui otomatis oleh MySQL pada setiap
+    INSERT/UPDATE/DELETE, jadi index_product/remove_product tidak perlu apa-apa.
+    """
+
+    # Nilai default innodb_ft_min_token_size
+    min_token_size = 3
+
+    def _columns(self):
+        return ', '.join(connection.ops.quote_name(field) for field in SEARCH_FIELDS)
+
+    def search(self, queryset, query, ranked=True):
+        tokens = [token for token in tokenize(query) if len(token) >= self.min_token_size]
+        if not tokens:
+            # Token terlalu pendek tidak masuk FULLTEXT index
+            return super().search(queryset, query, ranked)
+        boolean_query = ' '.join(f'+{token}*' for token in tokens)
+        rank = RawSQL(f"MATCH ({self._columns()}) AGAINST (%s IN BOOLEAN MODE)", [boolean_query])
+        if not ranked:
+            # alias() agar skor tidak ikut SELECT/GROUP BY saat diagregasi
+            return queryset.alias(search_rank=rank).filter(search_rank__gt=0)
+        return queryset.annotate(search_rank=rank).filter(search_rank__gt=0).order_by(
+            '-search_rank', '-created_at'
+        )
+
+    def rebuild(self):
+        # Drop lalu buat ulang index agar FULLTEXT benar-benar dibangun ulang
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE store_product DROP INDEX {FULLTEXT_INDEX}")
+            cursor.execute(
+                f"ALTER TABLE store_product ADD FULLTEXT INDEX {FULLTEXT_INDEX} ({self._columns()})"
+            )
+            cursor.execute("SELECT COUNT(*) FROM store_product")
+            return cursor.fetchone()[0]
+
+
+class SQLiteFTS5Backend(IcontainsBackend):
+    """
+    Tabel virtual FTS5 terpisah (store_product_fts) dengan rowid = Product.id.
+    Dipakai untuk development lokal dengan SQLite.
+    """
+
+    def search(self, queryset, query, ranked=True):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        # Setiap token dikutip agar karakter spesial tidak dibaca sebagai sintaks FTS5
+        fts_query = ' '.join(f'"{token}"*' for token in tokens)
+        if not ranked:
+            # Cukup filter id; aman dipakai sebagai subquery atau dengan GROUP BY
+            return queryset.filter(
+                id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query])
+            )
+        product_table = queryset.model._meta.db_table
+        # MATCH di subquery id__in memakai index FTS5; bm25() hanya dihitung untuk
+        # baris yang lolos, lewat subquery berkorelasi rowid. bm25() bernilai
+        # negatif (makin kecil makin relevan), jadi dibalik.
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {', '.join(map(str, FTS_WEIGHTS))}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {product_table}.id",
+            [fts_query],
+        )
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query])
+        ).annotate(search_rank=rank).order_by('-search_rank', '-created_at')
+
+    def _row(self, product):
+        return [product.pk] + [getattr(product, field) or '' for field in SEARCH_FIELDS]
+
+    def index_product(self, product):
+        placeholders = ', '.join(['%s'] * (len(SEARCH_FIELDS) + 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES ({placeholders})",
+                self._row(product),
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        columns = ', '.join(SEARCH_FIELDS)
+        selected = ', '.join(f"COALESCE({field}, '')" for field in SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {selected} FROM store_product"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+
+BACKENDS_BY_VENDOR = {
+    'mysql': MySQLFullTextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_backend = None
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = BACKENDS_BY_VENDOR.get(connection.vendor, IcontainsBackend)
+        _backend = backend_class()
+    return _backend
+
+def search_products(queryset, query, ranked=True):
+    """
+    Filter queryset produk dengan backend aktif. Dengan ranked=True hasil
+    diurutkan berdasarkan relevansi; ranked=False hanya memfilter (untuk
+    agregasi seperti facet).
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    return get_search_backend().search(queryset, query, ranked)
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Customer, UserProfile
+from .models import Customer, UserProfile, Product, ProductVariant, ProductReview, Category, Order, Transaction, update_review_aggregates
+from .search import get_search_backend
+from .card_cache import invalidate_card
+from .facets import invalidate_facets
+from . import cart_store, inventory
 
 @receiver(post_save, sender=User)
 def create_user_profile_and_customer(sender, instance, created, **kwargs):
@@ -12,4 +16,58 @@ def create_user_profile_and_customer(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        instance.profile.save()
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    get_search_backend().index_product(instance)
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_card(sender, instance, **kwargs):
+    invalidate_card(instance)
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_variant_product_card(sender, instance, **kwargs):
+    try:
+        invalidate_card(instance.product)
+    except Product.DoesNotExist:
+        pass
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_facets(sender, **kwargs):
+    invalidate_facets()
+
+@receiver(post_delete, sender=ProductReview)
+def remove_review_from_rating(sender, instance, **kwargs):
+    update_review_aggregates(instance.product_id, instance.rating, -1)
+
+@receiver(post_save, sender=Order)
+def forget_completed_cart(sender, instance, update_fields=None, **kwargs):
+    # Keranjang di cache dibuang hanya saat save ini menutup keranjang terbuka;
+    # save ulang order lama tidak boleh menghapus keranjang yang sedang diisi
+    if update_fields is not None and 'complete' not in update_fields:
+        return
+    if instance.just_completed and instance.customer_id:
+        user_id = Customer.objects.filter(pk=instance.customer_id).values_list('user_id', flat=True).first()
+        if user_id:
+            cart_store.forget(user_id)
+
+@receiver(post_save, sender=Order)
+def commit_completed_order_stock(sender, instance, **kwargs):
+    # Reservasi stok menjadi penjualan (idempoten, cukup sekali per order)
+    if instance.complete and not instance.stock_committed:
+        inventory.commit_order(instance)
+
+@receiver(post_save, sender=Transaction)
+def release_failed_payment_stock(sender, instance, **kwargs):
+    # Pembayaran gagal/dibatalkan/kedaluwarsa: stok yang direservasi dikembalikan
+    if instance.status in ('deny', 'canceled', 'failed', 'expired'):
+        inventory.release_order(instance.order)
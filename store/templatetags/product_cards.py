@@ -0,0 +1,11 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from store.card_cache import render_product_cards
+
+register = template.Library()
+
+@register.simple_tag
+def product_cards(products):
+    """Render grid kartu produk memakai cache fragmen."""
+    return mark_safe(render_product_cards(products))
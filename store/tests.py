@@ -1,3 +1,1482 @@
-from django.test import TestCase
+import json
+import os
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.test import (
+    AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.urls import reverse
+from django.utils import timezone
+from midtransclient.error_midtrans import MidtransAPIError
+
+from . import cart_cookie, cart_store, idempotency, inventory, payment_gateway, payment_inbox, payment_signature, payment_state, views
+from .fake_snap import FakeSnapServer
+from .management.commands import reconcile_transactions as reconcile_command
+from .models import (
+    IdempotencyKey, Order, OrderItem, PaymentNotification, Product, ProductReview, StockReservation,
+    StockShard, Transaction,
+)
+from .pagination import InvalidCursor, KeysetPaginator, PageMoved, paginate_request
+
+
+def run_concurrently(target, threads):
+    """Jalankan target(index) di beberapa thread sekaligus; error thread dilempar ulang."""
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            close_old_connections()
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class CartLineUpsertTests(TransactionTestCase):
+    """OrderItem.objects.change_quantity/apply_deltas dari banyak koneksi sekaligus."""
+
+    threads = 8
+
+    def setUp(self):
+        user = User.objects.create_user(username='pembeli')
+        self.order = Order.objects.create(customer=user.customer, complete=False)
+        self.product = Product.objects.create(name="Kaos", price=50000)
+        self.key = (self.product.pk, None)
+
+    def lines(self):
+        return list(OrderItem.objects.filter(order=self.order).values_list('quantity', flat=True))
+
+    def test_concurrent_increments_keep_one_line(self):
+        def click(index):
+            for _ in range(10):
+                if index % 2:
+                    OrderItem.objects.change_quantity(self.order, self.product, 1)
+                else:
+                    OrderItem.objects.apply_deltas(self.order, {self.key: 2})
+
+        run_concurrently(click, self.threads)
+
+        self.assertEqual(self.lines(), [4 * 10 * 1 + 4 * 10 * 2])
+
+    def test_concurrent_mixed_deltas(self):
+        OrderItem.objects.apply_deltas(self.order, {self.key: 100})
+
+        def click(index):
+            for _ in range(10):
+                OrderItem.objects.change_quantity(self.order, self.product, 1 if index % 2 else -1)
+
+        run_concurrently(click, self.threads)
+
+        self.assertEqual(self.lines(), [100])
+
+    def test_decrement_to_zero_deletes_line(self):
+        OrderItem.objects.apply_deltas(self.order, {self.key: self.threads})
+
+        run_concurrently(
+            lambda index: OrderItem.objects.change_quantity(self.order, self.product, -1), self.threads,
+        )
+
+        self.assertEqual(self.lines(), [])
+
+    def test_removals_delete_line(self):
+        other = Product.objects.create(name="Topi", price=25000)
+        OrderItem.objects.apply_deltas(self.order, {self.key: 3, (other.pk, None): 1})
+
+        OrderItem.objects.apply_deltas(self.order, {(other.pk, None): 2}, removals=[self.key])
+
+        self.assertEqual(
+            list(OrderItem.objects.filter(order=self.order).values_list('product_id', 'quantity')),
+            [(other.pk, 3)],
+        )
+
+
+class InventoryTests(TestCase):
+    """Reservasi stok di store/inventory.py."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli', password='rahasia')
+        self.order = Order.objects.create(customer=self.user.customer, complete=False)
+        self.product = Product.objects.create(name="Kaos", price=50000, stock=5)
+
+    def new_order(self, quantity, product=None):
+        user = User.objects.create_user(username=f'pembeli-{User.objects.count()}')
+        order = Order.objects.create(customer=user.customer, complete=False)
+        OrderItem.objects.change_quantity(order, product or self.product, quantity)
+        return order
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_reserve_takes_stock(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 3)
+
+        inventory.reserve_order(self.order)
+
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(self.order.stock_reservations.get().quantity, 3)
+
+    def test_reserve_rejects_shortage_without_side_effects(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 6)
+
+        with self.assertRaises(inventory.InsufficientStock) as raised:
+            inventory.reserve_order(self.order)
+
+        self.assertEqual(raised.exception.items, [(self.product.pk, None, 6)])
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_create_transaction_returns_409_when_stock_short(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 6)
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('create_transaction'), json.dumps({'gross_amount': 300000}), content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['items'], [{'productId': self.product.pk, 'variantId': None, 'quantity': 6}])
+        self.assertEqual(self.stock(), 5)
+
+    def test_release_expired_restores_stock(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 4)
+        inventory.reserve_order(self.order, ttl=0)
+
+        self.assertEqual(inventory.release_expired(), 1)
+
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(self.order.stock_reservations.get().status, StockReservation.RELEASED)
+        self.assertEqual(inventory.release_expired(), 0)
+
+    def test_reserve_reclaims_expired_reservations(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 5)
+        inventory.reserve_order(self.order, ttl=0)
+
+        inventory.reserve_order(self.new_order(3))
+
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(self.order.stock_reservations.get().status, StockReservation.RELEASED)
+
+    def test_release_order_restores_stock(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+        inventory.reserve_order(self.order)
+
+        self.assertEqual(inventory.release_order(self.order), 1)
+        self.assertEqual(inventory.release_order(self.order), 0)
+        self.assertEqual(self.stock(), 5)
+
+    def test_commit_order_is_idempotent(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+        inventory.reserve_order(self.order)
+
+        self.assertTrue(inventory.commit_order(self.order))
+        self.assertFalse(inventory.commit_order(Order.objects.get(pk=self.order.pk)))
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.sales_count), (3, 2))
+        self.assertTrue(Order.objects.get(pk=self.order.pk).stock_committed)
+        self.assertEqual(self.order.stock_reservations.get().status, StockReservation.COMMITTED)
+
+    def test_commit_order_without_reservation_takes_stock(self):
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+
+        inventory.commit_order(self.order)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.sales_count), (3, 2))
+
+    def test_sharded_reserve_falls_back_to_several_shards(self):
+        inventory.shard_stock(self.product, 2)
+        self.product.refresh_from_db()
+        self.assertEqual(sorted(StockShard.objects.values_list('stock', flat=True)), [2, 3])
+        OrderItem.objects.change_quantity(self.order, self.product, 4)
+
+        reservations = inventory.reserve_order(self.order)
+
+        # Tidak ada shard yang cukup sendirian, jadi stok diambil dari kedua shard
+        self.assertEqual(sorted(r.quantity for r in reservations), [1, 3])
+        self.assertEqual(len({r.shard_id for r in reservations}), 2)
+        self.assertEqual(inventory.available_stock(self.product), 1)
+
+        with self.assertRaises(inventory.InsufficientStock):
+            inventory.reserve_order(self.new_order(2))
+
+        inventory.release_order(self.order)
+        self.assertEqual(inventory.available_stock(self.product), 5)
+
+    def test_sharded_stock_merges_back(self):
+        inventory.shard_stock(self.product, 3)
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+        inventory.reserve_order(self.order)
+
+        inventory.shard_stock(self.product, 0)
+
+        self.assertFalse(StockShard.objects.exists())
+        self.assertEqual(self.stock(), 3)
+        inventory.release_order(self.order)
+        self.assertEqual(self.stock(), 5)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class StockContentionTests(TransactionTestCase):
+    """Checkout bersamaan untuk stok terakhir tidak boleh oversell."""
+
+    threads = 8
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Flash Sale", price=10000, stock=5)
+        self.orders = []
+        for index in range(self.threads):
+            user = User.objects.create_user(username=f'pembeli-{index}')
+            order = Order.objects.create(customer=user.customer, complete=False)
+            OrderItem.objects.change_quantity(order, self.product, 1)
+            self.orders.append(order)
+
+    def reserve_all(self):
+        reserved = []
+
+        def checkout(index):
+            try:
+                inventory.reserve_order(self.orders[index])
+            except inventory.InsufficientStock:
+                return
+            reserved.append(index)
+
+        run_concurrently(checkout, self.threads)
+        return reserved
+
+    def test_no_oversell(self):
+        self.assertEqual(len(self.reserve_all()), 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_no_oversell_with_shards(self):
+        inventory.shard_stock(self.product, 4)
+        self.product.refresh_from_db()
+
+        self.assertEqual(len(self.reserve_all()), 5)
+        self.assertEqual(inventory.available_stock(self.product), 0)
+        self.assertEqual(StockReservation.objects.filter(status=StockReservation.ACTIVE).count(), 5)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Navigasi cursor pada urutan (-created_at, id), termasuk created_at kembar."""
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        # Tiga kelompok created_at kembar agar tie-breaker id ikut teruji
+        for index, age in enumerate([0, 0, 0, 1, 1, 1, 2]):
+            product = Product.objects.create(name=f"Produk {index}", price=1000)
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(hours=age))
+        self.expected = list(Product.objects.order_by('-created_at', 'id').values_list('pk', flat=True))
+        self.paginator = KeysetPaginator(Product.objects.all(), per_page=2)
+
+    def ids(self, page):
+        return [product.pk for product in page]
+
+    def test_next_then_prev_walks_every_row_once(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.paginator.page(page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(expected))
+        self.assertFalse(page.has_previous())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        cursor = self.paginator.page().next_cursor
+        tampered = cursor[:-2] + ('AA' if not cursor.endswith('AA') else 'BB')
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(tampered)
+
+        request = RequestFactory().get('/', {'cursor': tampered})
+        page = paginate_request(request, Product.objects.all(), 2)
+        self.assertEqual(self.ids(page), self.expected[:2])
+
+    @override_settings(STORE_MAX_OFFSET_PAGE=1)
+    def test_deep_page_number_redirects_to_equivalent_cursor(self):
+        request = RequestFactory().get('/store/', {'category': 'Semua', 'page': 3})
+        with self.assertRaises(PageMoved) as moved:
+            paginate_request(request, Product.objects.all(), 2)
+        self.assertTrue(moved.exception.url.startswith('/store/?category=Semua&cursor='))
+
+        follow = RequestFactory().get(moved.exception.url)
+        page = paginate_request(follow, Product.objects.all(), 2)
+        self.assertEqual(self.ids(page), self.expected[4:6])
+        self.assertEqual(self.ids(self.paginator.offset_page(3)), self.expected[4:6])
+
+    @override_settings(STORE_MAX_OFFSET_PAGE=1)
+    def test_page_past_the_end_lands_on_last_page(self):
+        request = RequestFactory().get('/store/', {'page': 99})
+        with self.assertRaises(PageMoved) as moved:
+            paginate_request(request, Product.objects.all(), 2)
+        page = paginate_request(RequestFactory().get(moved.exception.url), Product.objects.all(), 2)
+        self.assertEqual(self.ids(page), self.expected[6:])
+        self.assertFalse(page.has_next())
+
+
+class ReviewAggregateTests(TestCase):
+    """Agregat rating produk yang dijaga ProductReview.save dan sinyal delete."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Kaos Polo", price=75000)
+        self.users = [User.objects.create_user(username=f'pengulas{index}') for index in range(3)]
+
+    def review(self, user, rating):
+        return ProductReview.objects.create(product=self.product, user=user, rating=rating, review_text="Oke")
+
+    def aggregates(self):
+        product = Product.objects.get(pk=self.product.pk)
+        return product.review_count, product.rating_sum, product.rating, product.rating_histogram
+
+    def test_create_edit_and_delete_keep_aggregates_in_step(self):
+        first = self.review(self.users[0], 5)
+        self.review(self.users[1], 4)
+        self.assertEqual(self.aggregates(), (2, 9, Decimal('4.5'), {5: 1, 4: 1, 3: 0, 2: 0, 1: 0}))
+
+        first.rating = 2
+        first.save()
+        self.assertEqual(self.aggregates(), (2, 6, Decimal('3.0'), {5: 0, 4: 1, 3: 0, 2: 1, 1: 0}))
+
+        # Simpan ulang tanpa perubahan bintang tidak boleh menghitung dua kali
+        first.review_text = "Ternyata cepat rusak"
+        first.save()
+        self.assertEqual(self.aggregates()[:2], (2, 6))
+
+        first.delete()
+        self.assertEqual(self.aggregates(), (1, 4, Decimal('4.0'), {5: 0, 4: 1, 3: 0, 2: 0, 1: 0}))
+
+    def test_last_review_deleted_resets_average(self):
+        self.review(self.users[0], 1).delete()
+        self.assertEqual(self.aggregates(), (0, 0, Decimal('5.0'), {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}))
+
+    def test_rebuild_matches_incremental_values(self):
+        for user, rating in zip(self.users, [5, 3, 3]):
+            self.review(user, rating)
+        empty = Product.objects.create(name="Topi", price=20000)
+        Product.objects.filter(pk=empty.pk).update(review_count=3, rating_sum=7, rating_1_count=1)
+        incremental = self.aggregates()
+
+        # Rusak agregat lalu bangun ulang dari tabel ulasan
+        Product.objects.filter(pk=self.product.pk).update(review_count=0, rating_sum=0, rating_3_count=9)
+        call_command('rebuild_product_ratings', stdout=StringIO())
+
+        self.assertEqual(self.aggregates(), incremental)
+        self.assertEqual(incremental, (3, 11, Decimal('3.7'), {5: 1, 4: 0, 3: 2, 2: 0, 1: 0}))
+        empty.refresh_from_db()
+        self.assertEqual((empty.review_count, empty.rating_sum, empty.rating_1_count), (0, 0, 0))
+        self.assertEqual(empty.rating, Decimal('5.0'))
+
+
+class CartCookieTests(TestCase):
+    """Cookie keranjang guest: format v2 bertanda tangan dan format JSON lama."""
+
+    def request_with(self, raw):
+        request = RequestFactory().get('/cart/')
+        request.COOKIES[cart_cookie.COOKIE_NAME] = raw
+        return request
+
+    def test_v2_round_trip(self):
+        raw = cart_cookie.encode([(12, None, 3), (15, 4, 1), (20, None, 0)], 4, 23000.4)
+        self.assertEqual(cart_cookie.decode(raw), ([(12, None, 3), (15, 4, 1)], {'n': 4, 't': 23000}))
+
+    def test_tampered_or_unknown_version_is_empty_cart(self):
+        raw = cart_cookie.encode([(12, None, 3)], 3, 9000)
+        tampered = raw[:-1] + ('A' if raw[-1] != 'A' else 'B')
+        old_version = signing.dumps(
+            {'v': 1, 'n': 3, 't': 9000, 'l': [12, 0, 3]}, salt=cart_cookie.COOKIE_SALT, compress=True,
+        )
+        unsigned = signing.dumps({'v': 2, 'n': 3, 't': 9000, 'l': [12, 0, 3]}, salt='salt-lain')
+        for value in (tampered, old_version, unsigned, 'sampah'):
+            with self.subTest(value=value):
+                self.assertEqual(cart_cookie.decode(value), ([], None))
+
+    def test_legacy_json_cookie_is_still_read(self):
+        legacy = json.dumps({'12': {'quantity': 2}, '15': {'quantity': 1, 'variant_id': 4}, '9': {'quantity': -5}})
+        for value in (legacy, quote(legacy)):
+            with self.subTest(value=value):
+                self.assertEqual(cart_cookie.decode(value), ([(12, None, 2), (15, 4, 1)], None))
+
+    def sync(self, raw, count, total):
+        data = {
+            'order': {'get_cart_items': count, 'get_cart_total': total},
+            'items': [{'id': 12, 'variant': None, 'quantity': 3}],
+        }
+        response = HttpResponse()
+        cart_cookie.sync(self.request_with(raw), response, data)
+        return response.cookies.get(cart_cookie.COOKIE_NAME)
+
+    def test_sync_rewrites_stale_or_legacy_snapshot_only(self):
+        current = cart_cookie.encode([(12, None, 3)], 3, 60000)
+        self.assertIsNone(self.sync(current, 3, 60000))
+
+        # Harga berubah sejak cookie ditulis: snapshot total diperbarui
+        rewritten = self.sync(current, 3, 66000)
+        self.assertEqual(cart_cookie.decode(rewritten.value), ([(12, None, 3)], {'n': 3, 't': 66000}))
+        self.assertTrue(rewritten['httponly'])
+
+        legacy = self.sync(json.dumps({'12': {'quantity': 3}}), 3, 60000)
+        self.assertEqual(cart_cookie.decode(legacy.value)[1], {'n': 3, 't': 60000})
+
+
+@override_settings(CART_WRITE_BEHIND_SECONDS=30, CART_WRITE_BEHIND_MAX_LINES=20)
+class CartStoreTests(TestCase):
+    """Keranjang write-behind: perubahan di cache, ditulis ke OrderItem oleh flush."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli')
+        self.kopi = Product.objects.create(name="Kopi", price=20000)
+        self.teh = Product.objects.create(name="Teh", price=15000)
+
+    def stored(self, user=None):
+        return dict(OrderItem.objects.filter(
+            order__customer__user=user or self.user, order__complete=False,
+        ).values_list('product_id', 'quantity'))
+
+    def dirty(self):
+        return cache.get(cart_store.DIRTY_KEY) or set()
+
+    def test_flush_writes_deltas_and_removals(self):
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): 3, (self.teh.pk, None): 1})
+        self.assertEqual(self.stored(), {})
+        self.assertIn(self.user.id, self.dirty())
+
+        cart_store.flush(self.user.id)
+        self.assertEqual(self.stored(), {self.kopi.pk: 3, self.teh.pk: 1})
+        self.assertNotIn(self.user.id, self.dirty())
+
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): -1}, removals=[(self.teh.pk, None)])
+        cart_store.flush(self.user.id)
+        self.assertEqual(self.stored(), {self.kopi.pk: 2})
+        self.assertEqual(cart_store.item_count(self.user.id), 2)
+
+    @override_settings(CART_WRITE_BEHIND_MAX_LINES=2)
+    def test_too_many_pending_lines_flush_inline(self):
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): 1})
+        self.assertEqual(self.stored(), {})
+
+        cart = cart_store.apply_changes(self.user.id, {(self.teh.pk, None): 2})
+        self.assertEqual(self.stored(), {self.kopi.pk: 1, self.teh.pk: 2})
+        self.assertEqual((cart['d'], cart['t']), ([], None))
+        self.assertNotIn(self.user.id, self.dirty())
+
+    def test_old_pending_change_flushes_inline(self):
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): 1})
+        cart = cache.get(f'cart:user:{self.user.id}')
+        cart['t'] -= 31
+        cache.set(f'cart:user:{self.user.id}', cart)
+
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): 1})
+        self.assertEqual(self.stored(), {self.kopi.pk: 2})
+
+    def test_flush_all_skips_busy_cart_and_keeps_it_dirty(self):
+        other = User.objects.create_user(username='pembeli2')
+        cart_store.apply_changes(self.user.id, {(self.kopi.pk, None): 1})
+        cart_store.apply_changes(other.id, {(self.teh.pk, None): 4})
+
+        # Keranjang pertama sedang dikunci request lain; jam dimajukan agar
+        # _lock langsung menyerah tanpa menunggu batas 2 detik
+        cache.add(f'cart:lock:{self.user.id}', 'request-lain', 10)
+        ticks = iter(range(0, 10_000, 10))
+        with mock.patch.object(cart_store.time, 'monotonic', lambda: next(ticks)):
+            self.assertEqual(cart_store.flush_all(), 1)
+
+        self.assertEqual(self.stored(other), {self.teh.pk: 4})
+        self.assertEqual(self.stored(), {})
+        self.assertEqual(self.dirty(), {self.user.id})
+
+        cache.delete(f'cart:lock:{self.user.id}')
+        self.assertEqual(cart_store.flush_all(), 1)
+        self.assertEqual(self.stored(), {self.kopi.pk: 1})
+        self.assertEqual(self.dirty(), set())
+
+
+class CompactAbandonedCartsTests(TestCase):
+    """compact_abandoned_carts memakai Order.updated_at, bukan tanggal order/item."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username='pembeli').customer
+        self.product = Product.objects.create(name="Kopi", price=20000)
+        self.long_ago = timezone.now() - timedelta(days=60)
+
+    def cart(self, quantity=1, **fields):
+        order = Order.objects.create(customer=self.customer, **fields)
+        OrderItem.objects.apply_deltas(order, {(self.product.pk, None): quantity})
+        Order.objects.filter(pk=order.pk).update(date_ordered=self.long_ago, updated_at=self.long_ago)
+        OrderItem.objects.filter(order=order).update(date_added=self.long_ago)
+        return order
+
+    def test_apply_deltas_bumps_updated_at(self):
+        order = self.cart()
+        OrderItem.objects.apply_deltas(order, {}, removals=[(self.product.pk, None)])
+        self.assertGreater(Order.objects.get(pk=order.pk).updated_at, self.long_ago)
+
+    def test_only_untouched_open_carts_are_deleted(self):
+        abandoned = self.cart()
+        # Keranjang lama yang barusan diubah (quantity baris yang sudah ada naik)
+        active = self.cart()
+        OrderItem.objects.apply_deltas(active, {(self.product.pk, None): 2})
+        completed = self.cart(complete=True)
+        paid = self.cart()
+        Transaction.objects.create(
+            user=self.customer.user, order=paid, transaction_id='ORDER-1', amount=20000, payment_response={},
+        )
+
+        call_command('compact_abandoned_carts', '--sleep', '0', stdout=StringIO())
+
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {active.pk, completed.pk, paid.pk},
+        )
+        self.assertFalse(OrderItem.objects.filter(order_id=abandoned.pk).exists())
+        self.assertFalse(OrderItem.objects.filter(order__isnull=True).exists())
+
+
+class ForgetCompletedCartTests(TestCase):
+    """Keranjang di cache hanya dibuang saat keranjang terbuka diselesaikan."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli')
+        self.product = Product.objects.create(name="Kopi", price=20000)
+        self.old_order = Order.objects.create(customer=self.user.customer, complete=True)
+        cart_store.apply_changes(self.user.id, {(self.product.pk, None): 2})
+
+    def cached(self):
+        return cache.get(f'cart:user:{self.user.id}') is not None
+
+    def test_resaving_completed_order_keeps_cart(self):
+        self.old_order.transaction_id = 'ulang'
+        self.old_order.save()
+        Order.objects.get(pk=self.old_order.pk).save(update_fields=['complete'])
+        self.assertTrue(self.cached())
+
+    def test_completing_open_order_forgets_cart(self):
+        cart_store.flush(self.user.id)
+        order = Order.objects.get(customer=self.user.customer, complete=False)
+        order.transaction_id = 'draft'
+        order.save(update_fields=['transaction_id'])
+        self.assertTrue(self.cached())
+
+        order.complete = True
+        order.save(update_fields=['transaction_id', 'complete'])
+        self.assertFalse(self.cached())
+
+
+class ProcessOrderTests(TestCase):
+    """Finalisasi order lewat processOrder."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli')
+        self.order = Order.objects.create(customer=self.user.customer, complete=False)
+        self.product = Product.objects.create(name="E-book", price=45000, digital=True)
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+        self.client.force_login(self.user)
+
+    def post(self, body):
+        return self.client.post(reverse('process_order'), body, content_type='application/json')
+
+    def test_malformed_body_returns_400(self):
+        for body in (b'{"form": ', b'\xff\xfe', b''):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_invalid_total_returns_400(self):
+        self.assertEqual(self.post(json.dumps({'form': {'total': 'abc'}})).status_code, 400)
+        self.assertEqual(self.post(json.dumps(['form'])).status_code, 400)
+
+    def test_guest_without_name_or_email_returns_400(self):
+        self.client.logout()
+        orders = Order.objects.count()
+        for form in ({'total': '0'}, {'total': '0', 'name': 'Budi'}, {'total': '0', 'name': ' ', 'email': 'b@x.id'}):
+            with self.subTest(form=form):
+                self.assertEqual(self.post(json.dumps({'form': form})).status_code, 400)
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_matching_total_completes_order(self):
+        response = self.post(json.dumps({'form': {'total': '90000.00'}}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_mismatched_total_leaves_order_open(self):
+        self.post(json.dumps({'form': {'total': '1000'}}))
+
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_client_payment_result_is_ignored(self):
+        payment = Transaction.objects.create(
+            order=self.order, user=self.user, transaction_id='ORDER-1', amount=90000, payment_response={},
+        )
+        body = {'form': {'total': '1000'}, 'payment_result': {'transaction_status': 'settlement'}}
+        self.assertEqual(self.post(json.dumps(body)).status_code, 200)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+
+class IdempotencyMixin:
+    """View contoh yang dibungkus idempotent() dan menghitung berapa kali dijalankan."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli')
+        self.product = Product.objects.create(name="Kopi", price=20000)
+        self.calls = 0
+        self.view = idempotency.idempotent('test')(self.handle)
+
+    def handle(self, request):
+        self.calls += 1
+        return JsonResponse({'call': self.calls})
+
+    def post(self, body=None, **headers):
+        request = RequestFactory().post(
+            '/checkout/', body or {'form': {'total': '20000'}}, content_type='application/json', **headers,
+        )
+        request.user = self.user
+        return self.view(request)
+
+
+class IdempotencyTests(IdempotencyMixin, TestCase):
+    def test_header_key_replays_stored_response(self):
+        first = self.post(HTTP_IDEMPOTENCY_KEY='klik-1')
+        second = self.post(HTTP_IDEMPOTENCY_KEY='klik-1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second[idempotency.REPLAY_HEADER], 'true')
+        self.assertFalse(first.has_header(idempotency.REPLAY_HEADER))
+
+        self.post(HTTP_IDEMPOTENCY_KEY='klik-2')
+        self.assertEqual(self.calls, 2)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self.post(HTTP_IDEMPOTENCY_KEY='klik-1')
+        response = self.post({'form': {'total': '1'}}, HTTP_IDEMPOTENCY_KEY='klik-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_failed_response_is_not_stored(self):
+        self.handle = lambda request: JsonResponse({'error': 'gagal'}, status=502)
+        self.view = idempotency.idempotent('test')(self.handle)
+        self.post(HTTP_IDEMPOTENCY_KEY='klik-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_derived_key_changes_when_same_cart_is_bought_again(self):
+        cart_store.apply_changes(self.user.id, {(self.product.pk, None): 1})
+        self.post()
+        self.assertEqual(self.post()[idempotency.REPLAY_HEADER], 'true')
+        self.assertEqual(self.calls, 1)
+
+        # Order selesai, lalu keranjang identik diisi lagi di order terbuka baru
+        order = Order.objects.get(customer=self.user.customer, complete=False)
+        order.complete = True
+        order.save()
+        cart_store.apply_changes(self.user.id, {(self.product.pk, None): 1})
+
+        response = self.post()
+        self.assertFalse(response.has_header(idempotency.REPLAY_HEADER))
+        self.assertEqual(self.calls, 2)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class IdempotencyConcurrencyTests(IdempotencyMixin, TransactionTestCase):
+    def test_concurrent_duplicate_waits_for_first_response(self):
+        entered, release = threading.Event(), threading.Event()
+        responses = {}
+
+        def handle(request):
+            entered.set()
+            release.wait(5)
+            self.calls += 1
+            return JsonResponse({'call': self.calls})
+        self.view = idempotency.idempotent('test')(handle)
+
+        def send(name):
+            try:
+                responses[name] = self.post(HTTP_IDEMPOTENCY_KEY='klik-1')
+            finally:
+                close_old_connections()
+
+        first = threading.Thread(target=send, args=('first',))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        duplicate = threading.Thread(target=send, args=('duplicate',))
+        duplicate.start()
+        # Duplikat harus menunggu, bukan ikut menjalankan view
+        duplicate.join(0.3)
+        self.assertTrue(duplicate.is_alive())
+        release.set()
+        first.join()
+        duplicate.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(responses['duplicate'].content, responses['first'].content)
+        self.assertEqual(responses['duplicate'][idempotency.REPLAY_HEADER], 'true')
+
+
+class FakeSnapMixin:
+    """Jalankan FakeSnapServer dan arahkan payment_gateway ke sana selama test."""
+
+    server_key = 'SB-Mid-server-test'
+    gateway_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.server = FakeSnapServer(server_key=self.server_key)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        gateway = override_settings(
+            MIDTRANS_SERVER_KEY=self.server_key,
+            MIDTRANS_SNAP_BASE_URL=self.server.snap_base_url,
+            MIDTRANS_CORE_API_BASE_URL=self.server.base_url,
+            MIDTRANS_RETRY_BACKOFF=0,
+            **self.gateway_settings,
+        )
+        gateway.enable()
+        self.addCleanup(gateway.disable)
+
+    def snap_parameters(self, order_id='ORDER-1', gross_amount=90000):
+        return {'transaction_details': {'order_id': order_id, 'gross_amount': gross_amount}}
+
+
+class PaymentGatewayTests(FakeSnapMixin, TestCase):
+    """Client Midtrans bersama di store/payment_gateway.py terhadap FakeSnapServer."""
+
+    gateway_settings = {'MIDTRANS_RETRIES': 2, 'MIDTRANS_READ_TIMEOUT': 0.5}
+
+    def test_create_transaction_returns_token(self):
+        response = payment_gateway.create_transaction(self.snap_parameters())
+
+        self.assertTrue(response['token'])
+        self.assertEqual(self.server.lookup('ORDER-1')['gross_amount'], 90000)
+
+    def test_acreate_transaction_returns_token(self):
+        response = async_to_sync(payment_gateway.acreate_transaction)(self.snap_parameters())
+
+        self.assertTrue(response['token'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_connections_are_reused(self):
+        for index in range(5):
+            payment_gateway.create_transaction(self.snap_parameters(f'ORDER-{index}'))
+
+        self.assertEqual(self.server.connections, 1)
+
+    def test_429_and_503_are_retried(self):
+        self.server.fail_next(503, 429)
+
+        response = payment_gateway.create_transaction(self.snap_parameters())
+
+        self.assertTrue(response['token'])
+        self.assertEqual(self.server.requests, 3)
+
+    def test_retries_are_limited(self):
+        self.server.fail_next(503, 503, 503, 503)
+
+        with self.assertRaises(MidtransAPIError) as raised:
+            payment_gateway.create_transaction(self.snap_parameters())
+
+        self.assertEqual(raised.exception.http_status_code, 503)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_other_server_errors_are_not_retried(self):
+        self.server.fail_next(500)
+
+        with self.assertRaises(MidtransAPIError):
+            payment_gateway.create_transaction(self.snap_parameters())
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_read_timeout_is_not_retried(self):
+        # Midtrans mungkin sudah memproses order_id ini; mengulang akan ditolak sebagai duplikat
+        self.server.latency = 1.0
+
+        with self.assertRaises(requests.RequestException):
+            payment_gateway.create_transaction(self.snap_parameters())
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_connect_error_is_raised(self):
+        # Port yang baru dilepas: koneksi ditolak, request pasti belum sampai ke Midtrans
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+
+        with override_settings(MIDTRANS_SNAP_BASE_URL=f'http://127.0.0.1:{port}/snap/v1'):
+            with self.assertRaises(requests.ConnectionError):
+                payment_gateway.create_transaction(self.snap_parameters())
+
+
+class CreateTransactionViewTests(FakeSnapMixin, TestCase):
+    """View create_transaction (sync dan async) dengan Midtrans palsu."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='pembeli')
+        order = Order.objects.create(customer=self.user.customer, complete=False)
+        OrderItem.objects.change_quantity(order, Product.objects.create(name="E-book", price=45000, digital=True), 2)
+
+    def test_sync_view_returns_token_and_saves_transaction(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('create_transaction'), json.dumps({'gross_amount': 90000}), content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['token'])
+        payment = Transaction.objects.get(transaction_id=data['order_id'])
+        self.assertEqual((payment.status, payment.amount), ('pending', 90000))
+        self.assertEqual(self.server.lookup(data['order_id'])['gross_amount'], 90000)
+
+    def test_async_view_returns_token(self):
+        request = AsyncRequestFactory().post(
+            '/create-transaction/', json.dumps({'gross_amount': 90000}), content_type='application/json',
+        )
+        request.user = AnonymousUser()
+
+        response = async_to_sync(views.create_transaction_async)(request)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['token'])
+        self.assertIsNotNone(self.server.lookup(data['order_id']))
+
+    def test_gateway_error_returns_500_and_releases_stock(self):
+        product = Product.objects.create(name="Kaos", price=50000, stock=3)
+        OrderItem.objects.change_quantity(Order.objects.get(customer=self.user.customer), product, 2)
+        self.server.fail_next(500)
+        self.client.force_login(self.user)
+
+        with self.assertLogs('store.views', 'ERROR'):
+            response = self.client.post(
+                reverse('create_transaction'), json.dumps({'gross_amount': 190000}), content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 500)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+
+    def test_repeat_checkout_does_not_overwrite_settled_transaction(self):
+        order = Order.objects.get(customer=self.user.customer)
+        payment = Transaction.objects.create(
+            order=order, user=self.user, transaction_id='ORDER-LUNAS', amount=90000,
+            status='settlement', payment_response={},
+        )
+        self.client.force_login(self.user)
+
+        with self.assertLogs('store.views', 'WARNING'):
+            response = self.client.post(
+                reverse('create_transaction'), json.dumps({'gross_amount': 90000}), content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id), ('settlement', 'ORDER-LUNAS'))
+
+    def test_repeat_checkout_restarts_failed_transaction(self):
+        order = Order.objects.get(customer=self.user.customer)
+        payment = Transaction.objects.create(
+            order=order, user=self.user, transaction_id='ORDER-GAGAL', amount=90000,
+            status='expired', payment_response={},
+        )
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('create_transaction'), json.dumps({'gross_amount': 90000}), content_type='application/json',
+        )
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id), ('pending', response.json()['order_id']))
+
+
+SERVER_KEY = 'SB-Mid-server-test'
+
+
+class PaymentFixtureMixin:
+    """Order berisi 2 x produk (stok 5) yang sudah direservasi, dengan Transaction pending."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='pembeli')
+        self.order = Order.objects.create(customer=self.user.customer, complete=False)
+        self.product = Product.objects.create(name="Kaos", price=50000, stock=5)
+        OrderItem.objects.change_quantity(self.order, self.product, 2)
+        inventory.reserve_order(self.order)
+        self.payment = Transaction.objects.create(
+            order=self.order, user=self.user, transaction_id='ORDER-1700000000-1a2b3c4d',
+            amount=100000, status='pending', payment_response={},
+        )
+
+    def notification(self, transaction_status, gross_amount='100000.00', **extra):
+        status_code = {'pending': '201', 'deny': '202', 'expire': '407'}.get(transaction_status, '200')
+        notification = {
+            'order_id': self.payment.transaction_id,
+            'transaction_status': transaction_status,
+            'fraud_status': 'accept',
+            'status_code': status_code,
+            'gross_amount': gross_amount,
+            'signature_key': payment_signature.signature_for(
+                self.payment.transaction_id, status_code, gross_amount, SERVER_KEY,
+            ),
+        }
+        notification.update(extra)
+        return notification
+
+    def status(self):
+        return Transaction.objects.values_list('status', flat=True).get(pk=self.payment.pk)
+
+
+@override_settings(MIDTRANS_SERVER_KEY=SERVER_KEY, MIDTRANS_VERIFY_FALLBACK=False, PAYMENT_INBOX_MAX_ATTEMPTS=3)
+class PaymentInboxTests(PaymentFixtureMixin, TestCase):
+    """Webhook Midtrans dan worker inbox di store/payment_inbox.py."""
+
+    def post(self, body):
+        return self.client.post(reverse('midtrans_notification'), body, content_type='application/json')
+
+    def receive(self, notification):
+        return payment_inbox.receive(json.dumps(notification).encode())
+
+    def drain(self):
+        return payment_inbox.run_worker(threading.Event(), drain=True)
+
+    def test_webhook_stores_and_dedupes_notification(self):
+        body = json.dumps(self.notification('settlement'))
+
+        self.assertEqual(self.post(body).status_code, 200)
+        self.assertEqual(self.post(body).status_code, 200)
+
+        notification = PaymentNotification.objects.get()
+        self.assertEqual(notification.order_id, self.payment.transaction_id)
+        # Handler tidak menyentuh Transaction; itu tugas worker
+        self.assertEqual(self.status(), 'pending')
+
+    def test_webhook_rejects_invalid_body(self):
+        for body in (b'bukan json', b'\xff', b'[]', b'{"transaction_status": "settlement"}'):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(PaymentNotification.objects.exists())
+
+    def test_worker_applies_notification(self):
+        self.receive(self.notification('settlement'))
+
+        self.assertEqual(self.drain(), {'done': 1, 'retry': 0, 'failed': 0})
+
+        self.assertEqual(self.status(), 'settlement')
+        self.assertTrue(Order.objects.get(pk=self.order.pk).complete)
+        notification = PaymentNotification.objects.get()
+        self.assertEqual(notification.status, PaymentNotification.DONE)
+        self.assertIsNotNone(notification.processed_at)
+
+    def test_only_latest_notification_per_order_is_applied(self):
+        self.receive(self.notification('pending'))
+        self.receive(self.notification('settlement'))
+
+        self.assertEqual(self.drain()['done'], 2)
+        self.assertEqual(self.status(), 'settlement')
+
+    def test_late_pending_does_not_overwrite_settlement(self):
+        self.receive(self.notification('settlement'))
+        self.drain()
+        self.receive(self.notification('pending'))
+
+        self.assertEqual(self.drain()['done'], 1)
+        self.assertEqual(self.status(), 'settlement')
+
+    def test_invalid_signature_fails_without_retry(self):
+        self.receive(self.notification('settlement', signature_key='0' * 128))
+
+        self.assertEqual(self.drain(), {'done': 0, 'retry': 0, 'failed': 1})
+
+        self.assertEqual(self.status(), 'pending')
+        self.assertIn('InvalidNotification', PaymentNotification.objects.get().last_error)
+
+    def test_tampered_amount_fails(self):
+        notification = self.notification('settlement', gross_amount='1000.00')
+        self.receive(notification)
+
+        self.assertEqual(self.drain()['failed'], 1)
+        self.assertEqual(self.status(), 'pending')
+
+    def test_unknown_transaction_is_retried_with_backoff(self):
+        self.receive(self.notification('settlement', order_id='ORDER-BELUM-ADA'))
+
+        self.assertEqual(self.drain(), {'done': 0, 'retry': 1, 'failed': 0})
+
+        notification = PaymentNotification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (PaymentNotification.PENDING, 1))
+        self.assertGreater(notification.available_at, timezone.now())
+        self.assertIn('DoesNotExist', notification.last_error)
+        # Belum waktunya diulang
+        self.assertEqual(payment_inbox.claim_batch(), [])
+
+    def test_retries_stop_after_max_attempts(self):
+        self.receive(self.notification('settlement', order_id='ORDER-BELUM-ADA'))
+
+        for _ in range(3):
+            PaymentNotification.objects.update(available_at=timezone.now())
+            self.drain()
+
+        notification = PaymentNotification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (PaymentNotification.FAILED, 3))
+
+    def test_claimed_notifications_are_not_claimed_again(self):
+        self.receive(self.notification('settlement'))
+
+        self.assertEqual(len(payment_inbox.claim_batch()), 1)
+        self.assertEqual(payment_inbox.claim_batch(), [])
+
+    def test_metrics(self):
+        self.receive(self.notification('pending'))
+        self.receive(self.notification('settlement'))
+        payment_inbox.process_batch(payment_inbox.claim_batch(batch_size=1))
+
+        metrics = payment_inbox.inbox_metrics()
+
+        self.assertEqual((metrics['pending'], metrics['processed'], metrics['failed']), (1, 1, 0))
+
+
+class PaymentStateTests(PaymentFixtureMixin, TestCase):
+    """Transisi Transaction.status di store/payment_state.py."""
+
+    def stale_payment(self):
+        """Salinan payment yang dibaca sebelum transisi lain terjadi."""
+        return Transaction.objects.get(pk=self.payment.pk)
+
+    def test_midtrans_status(self):
+        cases = {
+            ('capture', 'accept'): 'success',
+            ('capture', 'challenge'): 'challenge',
+            ('settlement', 'accept'): 'settlement',
+            ('expire', 'accept'): 'canceled',
+            ('refund', 'accept'): None,
+        }
+        for (transaction_status, fraud_status), expected in cases.items():
+            with self.subTest(transaction_status=transaction_status, fraud_status=fraud_status):
+                response = {'transaction_status': transaction_status, 'fraud_status': fraud_status}
+                self.assertEqual(payment_state.midtrans_status(response), expected)
+
+    def test_transition_updates_status_and_response(self):
+        self.assertTrue(payment_state.transition(self.payment, 'challenge', {'transaction_status': 'capture'}))
+
+        payment = self.stale_payment()
+        self.assertEqual(payment.status, 'challenge')
+        self.assertEqual(payment.payment_response, {'transaction_status': 'capture'})
+        self.assertEqual(self.payment.status, 'challenge')
+
+    def test_transition_returns_false_when_no_row_matches(self):
+        stale = self.stale_payment()
+        payment_state.transition(self.payment, 'settlement', {'transaction_status': 'settlement'})
+
+        self.assertFalse(payment_state.transition(stale, 'expired', {'transaction_status': 'expire'}))
+        self.assertFalse(payment_state.transition(stale, 'challenge'))
+        self.assertFalse(payment_state.transition(stale, 'pending'))
+
+        payment = self.stale_payment()
+        self.assertEqual(payment.status, 'settlement')
+        self.assertEqual(payment.payment_response, {'transaction_status': 'settlement'})
+
+    def test_late_pending_does_not_overwrite_settlement(self):
+        payment_state.transition(self.payment, 'settlement')
+
+        status = payment_state.midtrans_status({'transaction_status': 'pending'})
+
+        self.assertFalse(payment_state.transition(self.stale_payment(), status))
+        self.assertEqual(self.status(), 'settlement')
+
+    def test_paid_transition_completes_order_once(self):
+        cart_store.get_cart(self.user.pk)
+        self.assertIsNotNone(cache.get(f'cart:user:{self.user.pk}'))
+
+        self.assertTrue(payment_state.transition(self.payment, 'success'))
+        self.assertTrue(payment_state.transition(self.payment, 'settlement'))
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(order.complete and order.stock_committed)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.sales_count), (3, 2))
+        self.assertEqual(self.order.stock_reservations.get().status, StockReservation.COMMITTED)
+        self.assertIsNone(cache.get(f'cart:user:{self.user.pk}'))
+
+    def test_failed_transition_releases_reservation(self):
+        self.assertTrue(payment_state.transition(self.payment, 'deny'))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(self.order.stock_reservations.get().status, StockReservation.RELEASED)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_redirect_failure_is_not_final(self):
+        self.assertTrue(payment_state.transition(self.payment, 'failed'))
+        self.assertTrue(payment_state.transition(self.payment, 'settlement'))
+
+        self.assertTrue(Order.objects.get(pk=self.order.pk).complete)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.sales_count), (3, 2))
+
+    def test_transition_many_skips_changed_rows(self):
+        other_user = User.objects.create_user(username='pembeli-lain')
+        other = Transaction.objects.create(
+            order=Order.objects.create(customer=other_user.customer, complete=False), user=other_user,
+            transaction_id='ORDER-2', amount=50000, status='pending', payment_response={},
+        )
+        stale = [self.stale_payment(), Transaction.objects.get(pk=other.pk)]
+        payment_state.transition(other, 'settlement')
+
+        changed = payment_state.transition_many(stale, 'canceled', {
+            self.payment.pk: {'transaction_status': 'cancel'}, other.pk: {'transaction_status': 'cancel'},
+        })
+
+        self.assertEqual([payment.pk for payment in changed], [self.payment.pk])
+        self.assertEqual(self.status(), 'canceled')
+        self.assertEqual(Transaction.objects.get(pk=other.pk).status, 'settlement')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_restart_only_replaces_unpaid_transactions(self):
+        for status, restarted in (('expired', True), ('pending', True), ('challenge', False), ('settlement', False)):
+            with self.subTest(status=status):
+                Transaction.objects.filter(pk=self.payment.pk).update(status=status, transaction_id='ORDER-LAMA')
+                payment = self.stale_payment()
+
+                self.assertIs(payment_state.restart(payment, 'ORDER-BARU', 100000, {'token': 'x'}), restarted)
+                stored = Transaction.objects.get(pk=self.payment.pk)
+                expected = ('pending', 'ORDER-BARU') if restarted else (status, 'ORDER-LAMA')
+                self.assertEqual((stored.status, stored.transaction_id), expected)
+
+
+# (order_id, status_code, gross_amount, server_key, signature_key) sesuai rumus
+# Midtrans SHA512(order_id + status_code + gross_amount + server_key)
+SIGNATURE_VECTORS = (
+    ('ORDER-1700000000-1a2b3c4d', '200', '10000.00', 'SB-Mid-server-TEST',
+     'd43240a63afe7855edb4f39d7813c83b4295e91c8cbd7ee8fae8e18eaa7cdea9'
+     '214003819497ff6c04265ea45ecda8a4d49c4c4a4ec978dd781c11a71efb8d52'),
+    ('ORDER-1700000000-1a2b3c4d', '201', '10000.00', 'SB-Mid-server-TEST',
+     '0ed735385d4f358e31c9e24768672a7f63245bb1e2f38fa2f256b75a27a43c53'
+     '8578bd0a2b10f0342b2c09ae09b6bf58f58a448f4223f55a749f19b41a3565c1'),
+    ('ORDER-1700000500-9f8e7d6c', '202', '1250000.00', 'Mid-server-PRODUCTION-KEY',
+     '802cd8b87ffd2d147c2ec228f8b44b281471832d868f4a551db99e36ca07fbe1'
+     '1f17337664f241286bae4af915a72c2dfa09a96eaa1769449d89148ed7fed677'),
+)
+
+
+class PaymentSignatureTests(TestCase):
+    """signature_key Midtrans di store/payment_signature.py."""
+
+    def vector_notifications(self):
+        for order_id, status_code, gross_amount, server_key, signature_key in SIGNATURE_VECTORS:
+            yield server_key, {
+                'order_id': order_id, 'status_code': status_code,
+                'gross_amount': gross_amount, 'signature_key': signature_key,
+            }
+
+    def test_vectors(self):
+        for server_key, notification in self.vector_notifications():
+            with self.subTest(order_id=notification['order_id'], status_code=notification['status_code']):
+                self.assertEqual(
+                    payment_signature.signature_for(
+                        notification['order_id'], notification['status_code'],
+                        notification['gross_amount'], server_key,
+                    ),
+                    notification['signature_key'],
+                )
+                self.assertTrue(payment_signature.signature_valid(notification, server_key))
+                upper = {**notification, 'signature_key': notification['signature_key'].upper()}
+                self.assertTrue(payment_signature.signature_valid(upper, server_key))
+
+    def test_tampered_fields_are_rejected(self):
+        for server_key, notification in self.vector_notifications():
+            tampered = (
+                {'gross_amount': '1.00'},
+                {'gross_amount': notification['gross_amount'].replace('.00', '')},
+                {'order_id': 'ORDER-LAIN'},
+                {'status_code': '200' if notification['status_code'] != '200' else '201'},
+                {'signature_key': None},
+            )
+            for change in tampered:
+                with self.subTest(order_id=notification['order_id'], change=change):
+                    self.assertFalse(payment_signature.signature_valid({**notification, **change}, server_key))
+            self.assertFalse(payment_signature.signature_valid(notification, 'SB-Mid-server-LAIN'))
+
+    @override_settings(MIDTRANS_SERVER_KEY='')
+    def test_empty_server_key_rejects_everything(self):
+        # Tanda tangan yang dihitung dengan key kosong tetap ditolak
+        notification = {'order_id': 'ORDER-1', 'status_code': '200', 'gross_amount': '10000.00'}
+        notification['signature_key'] = payment_signature.signature_for('ORDER-1', '200', '10000.00', '')
+
+        self.assertFalse(payment_signature.signature_valid(notification))
+
+    def test_amount_matches(self):
+        self.assertTrue(payment_signature.amount_matches({'gross_amount': '100000.00'}, 100000))
+        self.assertTrue(payment_signature.amount_matches({'gross_amount': '100000'}, '100000.00'))
+        self.assertFalse(payment_signature.amount_matches({'gross_amount': '100001.00'}, 100000))
+        self.assertFalse(payment_signature.amount_matches({'gross_amount': 'abc'}, 100000))
+        self.assertFalse(payment_signature.amount_matches({}, 100000))
+
+
+@override_settings(MIDTRANS_VERIFY_FALLBACK=True)
+class VerifyNotificationTests(FakeSnapMixin, PaymentFixtureMixin, TestCase):
+    """verify_notification: lokal lebih dulu, status API hanya sebagai fallback."""
+
+    server_key = SERVER_KEY
+
+    def setUp(self):
+        super().setUp()
+        self.server.register(self.payment.transaction_id, 100000)
+        self.server.set_status(self.payment.transaction_id, 'settlement')
+
+    def test_valid_notification_is_verified_locally(self):
+        notification = self.notification('settlement')
+
+        self.assertIs(payment_signature.verify_notification(notification, self.payment), notification)
+        self.assertEqual(self.server.requests, 0)
+
+    def test_invalid_signature_uses_status_api(self):
+        notification = self.notification('pending', signature_key='0' * 128)
+
+        response = payment_signature.verify_notification(notification, self.payment)
+
+        self.assertEqual(response['transaction_status'], 'settlement')
+        self.assertEqual(self.server.requests, 1)
+
+    def test_wrong_order_id_uses_status_api_for_the_stored_transaction(self):
+        notification = self.notification('settlement', order_id='ORDER-LAIN')
+
+        response = payment_signature.verify_notification(notification, self.payment)
+
+        self.assertEqual(response['order_id'], self.payment.transaction_id)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_status_api_amount_mismatch_is_rejected(self):
+        self.payment.amount = 90000
+
+        with self.assertRaises(payment_signature.InvalidNotification):
+            payment_signature.verify_notification(self.notification('settlement'), self.payment)
+        self.assertEqual(self.server.requests, 1)
+
+    @override_settings(MIDTRANS_VERIFY_FALLBACK=False)
+    def test_without_fallback_invalid_notification_is_rejected(self):
+        for change in ({'signature_key': '0' * 128}, {'order_id': 'ORDER-LAIN'}, {'gross_amount': '1000.00'}):
+            with self.subTest(change=change):
+                with self.assertRaises(payment_signature.InvalidNotification):
+                    payment_signature.verify_notification(self.notification('settlement', **change), self.payment)
+        self.assertEqual(self.server.requests, 0)
+
+    @override_settings(MIDTRANS_VERIFY_FALLBACK=False, MIDTRANS_SERVER_KEY='')
+    def test_empty_server_key_rejects_notification(self):
+        with self.assertRaises(payment_signature.InvalidNotification):
+            payment_signature.verify_notification(self.notification('settlement'), self.payment)
+
+
+class PaymentRedirectTests(FakeSnapMixin, PaymentFixtureMixin, TestCase):
+    """Redirect Snap (payment/success, payment/error) hanya menerapkan status yang terverifikasi."""
+
+    server_key = SERVER_KEY
+
+    def setUp(self):
+        super().setUp()
+        self.server.register(self.payment.transaction_id, 100000)
+        self.params = {'order_id': self.payment.transaction_id, 'transaction_status': 'settlement'}
+
+    def status_after(self, name):
+        self.client.get(reverse(name), self.params)
+        self.payment.refresh_from_db()
+        return self.payment.status
+
+    def test_success_redirect_uses_midtrans_status(self):
+        self.assertEqual(self.status_after('payment_success'), 'pending')
+        self.assertFalse(Order.objects.get(pk=self.order.pk).complete)
+
+        self.server.set_status(self.payment.transaction_id, 'settlement')
+        self.assertEqual(self.status_after('payment_success'), 'settlement')
+        self.assertTrue(Order.objects.get(pk=self.order.pk).complete)
+
+    def test_error_redirect_does_not_fail_pending_payment(self):
+        self.assertEqual(self.status_after('payment_error'), 'pending')
+
+    @override_settings(MIDTRANS_VERIFY_FALLBACK=False)
+    def test_unverifiable_redirect_changes_nothing(self):
+        with self.assertLogs('store.views', 'WARNING'):
+            self.assertEqual(self.status_after('payment_success'), 'pending')
+        self.assertEqual(self.server.requests, 0)
+
+
+class ReconcileTransactionsTests(TransactionTestCase):
+    """Command reconcile_transactions terhadap FakeSnapServer."""
+
+    def setUp(self):
+        cache.clear()
+        self.server = FakeSnapServer(server_key=SERVER_KEY)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        self.checkpoint = os.path.join(checkpoint_dir.name, 'reconcile.json')
+        self.product = Product.objects.create(name="Kaos", price=50000, stock=10)
+
+    def seed(self, name, status='pending', gateway_status=None, age=timedelta(hours=1)):
+        """Transaction berumur age dengan 1 x produk direservasi; gateway_status None = tidak dikenal Midtrans."""
+        user = User.objects.create_user(username=name)
+        order = Order.objects.create(customer=user.customer, complete=False)
+        OrderItem.objects.change_quantity(order, self.product, 1)
+        inventory.reserve_order(order)
+        payment = Transaction.objects.create(
+            order=order, user=user, transaction_id=f'ORDER-{name}', amount=50000, status=status, payment_response={},
+        )
+        Transaction.objects.filter(pk=payment.pk).update(created_at=timezone.now() - age, updated_at=timezone.now() - age)
+        if gateway_status:
+            self.server.register(payment.transaction_id, 50000)
+            self.server.set_status(payment.transaction_id, gateway_status)
+        return payment
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command(
+            'reconcile_transactions', '--gateway-url', self.server.base_url, '--checkpoint', self.checkpoint,
+            '--rate', '0', '--batch-size', '2', *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def status(self, payment):
+        return Transaction.objects.values_list('status', flat=True).get(pk=payment.pk)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_reconcile_applies_gateway_status(self):
+        settled = self.seed('lunas', gateway_status='settlement')
+        challenged = self.seed('challenge', status='challenge', gateway_status='capture')
+        denied = self.seed('ditolak', gateway_status='deny')
+        waiting = self.seed('menunggu', gateway_status='pending')
+        stale = self.seed('basi', age=timedelta(days=2))
+        fresh_unknown = self.seed('baru', age=timedelta(hours=1))
+        recent = self.seed('terlalu-baru', gateway_status='settlement', age=timedelta(minutes=1))
+
+        output = self.reconcile()
+
+        self.assertEqual(self.status(settled), 'settlement')
+        self.assertTrue(Order.objects.get(pk=settled.order_id).complete)
+        self.assertEqual(self.status(challenged), 'success')
+        self.assertEqual(self.status(denied), 'deny')
+        self.assertEqual(self.status(waiting), 'pending')
+        # Tidak dikenal Midtrans: hanya yang sudah basi yang ditandai expired dan stoknya dilepas
+        self.assertEqual(self.status(stale), 'expired')
+        self.assertEqual(self.status(fresh_unknown), 'pending')
+        self.assertEqual(self.status(recent), 'pending')
+        # 7 direservasi, 3 dilepas (deny, expired), 2 terjual
+        self.assertEqual(self.stock(), 10 - 7 + 2)
+        self.assertIn('6 transaksi diperiksa', output)
+        self.assertIn('pending -> expired: 1', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_row_changed_by_webhook_mid_run_is_skipped(self):
+        racing = self.seed('balapan', gateway_status='expire')
+        transition_many = payment_state.transition_many
+
+        def webhook_first(payments, status, responses=None):
+            # Webhook settlement masuk di antara cek status dan update
+            payment_state.transition(Transaction.objects.get(pk=racing.pk), 'settlement')
+            return transition_many(payments, status, responses)
+
+        with mock.patch.object(payment_state, 'transition_many', webhook_first):
+            output = self.reconcile()
+
+        self.assertEqual(self.status(racing), 'settlement')
+        self.assertIn('dilewati: 1', output)
+
+    def test_checkpoint_resume(self):
+        first = self.seed('pertama', gateway_status='settlement')
+        second = self.seed('kedua', gateway_status='settlement')
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'cutoff': timezone.now().isoformat(), 'last_pk': first.pk}, checkpoint)
+
+        output = self.reconcile()
+
+        self.assertIn(f'Melanjutkan dari checkpoint: transaksi setelah id {first.pk}', output)
+        self.assertEqual(self.status(first), 'pending')
+        self.assertEqual(self.status(second), 'settlement')
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_is_saved_per_batch(self):
+        payments = [self.seed(f'batch-{index}', gateway_status='settlement') for index in range(3)]
+        saved = []
+        save_checkpoint = reconcile_command.Command._save_checkpoint
+
+        def spy(command, path, cutoff, last_pk):
+            save_checkpoint(command, path, cutoff, last_pk)
+            with open(path) as checkpoint:
+                saved.append(json.load(checkpoint)['last_pk'])
+
+        with mock.patch.object(reconcile_command.Command, '_save_checkpoint', spy):
+            self.reconcile()
+
+        self.assertEqual(saved, [payments[1].pk, payments[2].pk])
+
+    def test_restart_ignores_checkpoint(self):
+        first = self.seed('pertama', gateway_status='settlement')
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'cutoff': timezone.now().isoformat(), 'last_pk': first.pk}, checkpoint)
+
+        self.reconcile('--restart')
+
+        self.assertEqual(self.status(first), 'settlement')
+
+    def test_dry_run_writes_nothing(self):
+        settled = self.seed('lunas', gateway_status='settlement')
+        stale = self.seed('basi', age=timedelta(days=2))
+
+        output = self.reconcile('--dry-run')
+
+        self.assertEqual((self.status(settled), self.status(stale)), ('pending', 'pending'))
+        self.assertFalse(Order.objects.get(pk=settled.order_id).complete)
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(Transaction.objects.get(pk=settled.pk).payment_response, {})
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertIn('pending -> settlement: 1', output)
+        self.assertIn('pending -> expired: 1', output)
+
+    def test_gateway_settings_are_untouched(self):
+        shared = payment_gateway.get_core_api()
+
+        self.reconcile('--concurrency', '50')
+
+        self.assertIs(payment_gateway.get_core_api(), shared)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from django.views.generic import TemplateView
@@ -28,9 +29,16 @@ urlpatterns = [
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     
     # API endpoints
-    path('create-transaction/', views.create_transaction, name='create_transaction'),
+    # Versi async untuk deployment ASGI (ecommerce/asgi.py), lihat MIDTRANS_ASYNC_CHECKOUT
+    path('create-transaction/',
+         views.create_transaction_async if getattr(settings, 'MIDTRANS_ASYNC_CHECKOUT', False)
+         else views.create_transaction,
+         name='create_transaction'),
     path('update_item/', views.updateItem, name="update_item"),
+    path('cart/batch/', views.batchUpdateCart, name="batch_update_cart"),
     path('process_order/', views.processOrder, name="process_order"),
+    path('checkout/queue/<str:ticket>/', views.checkout_queue_status, name='checkout_queue_status'),
+    path('api/facets/', views.catalog_facets_api, name='catalog_facets'),
     
     # Payment callback routes
     path('payment/success/', views.payment_success, name='payment_success'),
@@ -40,4 +48,5 @@ urlpatterns = [
     
     # Midtrans webhook
     path('midtrans-notification/', views.midtrans_notification_handler, name='midtrans_notification'),
+    path('midtrans-notification/metrics/', views.payment_inbox_metrics, name='payment_inbox_metrics'),
 ]
\ No newline at end of file
@@ -1,88 +1,129 @@
-import json
+from django.db import transaction
+
 from .models import *
+from . import cart_cookie, cart_store
+
+def cookieCart(request, count_only=False):
+    """
+    Resolve keranjang guest dari cookie.
+
+    Semua produk dan varian diambil sekaligus (maksimal dua query, berapapun
+    jumlah barisnya). Dengan count_only=True jumlah item dan snapshot total
+    dibaca dari cookie v2, tanpa query database sama sekali.
+    """
+    lines, snapshot = cart_cookie.read(request)
+    cartItems = snapshot['n'] if snapshot else sum(quantity for _, _, quantity in lines)
+
+    if count_only:
+        total = snapshot['t'] if snapshot else 0
+        order = {'get_cart_total':total, 'get_cart_items':cartItems, 'shipping':False}
+        return {'cartItems':cartItems, 'order':order, 'items':[]}
 
-def cookieCart(request):
-    # Create empty cart for now for non-logged in user
-    try:
-        cart = json.loads(request.COOKIES['cart'])
-    except:
-        cart = {}
-        print('CART:', cart)
+    order, items = price_cart_lines(lines)
+    return {'cartItems':cartItems, 'order':order, 'items':items}
 
+def price_cart_lines(lines):
+    """
+    Hitung harga baris keranjang (product_id, variant_id, quantity) tanpa
+    menyentuh Order: maksimal dua query (produk dan varian) berapapun jumlah
+    barisnya. Mengembalikan (order dict, items) dengan format cookieCart.
+    """
     items = []
     order = {'get_cart_total':0, 'get_cart_items':0, 'shipping':False}
-    cartItems = order['get_cart_items']
-
-    for i in cart:
-        # We use try block to prevent items in cart that may have been removed from causing error
-        try:    
-            if(cart[i]['quantity']>0): # items with negative quantity = lot of freebies  
-                cartItems += cart[i]['quantity']
-
-                product = Product.objects.get(id=i)
-                
-                # Check if variant specified
-                variant = None
-                variant_id = cart[i].get('variant_id')
-                if variant_id:
-                    try:
-                        variant = ProductVariant.objects.get(id=variant_id)
-                    except ProductVariant.DoesNotExist:
-                        pass
-                
-                # Calculate total based on variant if available
-                if variant:
-                    total = variant.get_adjusted_price * cart[i]['quantity']
-                else:
-                    total = product.get_discount_price * cart[i]['quantity']
-
-                order['get_cart_total'] += total
-                order['get_cart_items'] += cart[i]['quantity']
-
-                item = {
-                    'id': product.id,
-                    'product': {
-                        'id': product.id,
-                        'name': product.name, 
-                        'price': product.price, 
-                        'discount_percent': product.discount_percent,
-                        'format_discount_price': product.format_discount_price,
-                        'imageURL': product.imageURL
-                    }, 
-                    'quantity': cart[i]['quantity'],
-                    'digital': product.digital,
-                    'get_total': total,
-                }
-                
-                # Add variant info if available
-                if variant:
-                    item['variant'] = {
-                        'id': variant.id,
-                        'name': variant.name,
-                        'value': variant.value,
-                        'variant_type': variant.get_variant_type_display(),
-                        'price_adjustment': variant.price_adjustment,
-                        'adjusted_price': variant.get_adjusted_price,
-                        'format_adjusted_price': variant.format_adjusted_price
-                    }
-                
-                items.append(item)
-
-                if product.digital == False:
-                    order['shipping'] = True
-        except:
+
+    products = Product.objects.in_bulk({product_id for product_id, _, _ in lines})
+
+    variant_ids = set()
+    for _, variant_id, _ in lines:
+        try:
+            variant_ids.add(int(variant_id))
+        except (TypeError, ValueError):
             pass
+    variants = {}
+    if variant_ids:
+        variants = ProductVariant.objects.select_related('product').in_bulk(variant_ids)
+
+    for product_id, variant_id, quantity in lines:
+        # Produk yang sudah dihapus tetap ada di cookie, lewati saja
+        product = products.get(product_id)
+        if product is None:
+            continue
+
+        variant = None
+        if variant_id:
+            try:
+                variant = variants.get(int(variant_id))
+            except (TypeError, ValueError):
+                pass
+
+        # Calculate total based on variant if available
+        if variant:
+            total = variant.get_adjusted_price * quantity
+        else:
+            total = product.get_discount_price * quantity
+
+        order['get_cart_total'] += total
+        order['get_cart_items'] += quantity
+
+        item = {
+            'id': product.id,
+            'product': {
+                'id': product.id,
+                'name': product.name, 
+                'price': product.price, 
+                'discount_percent': product.discount_percent,
+                'format_discount_price': product.format_discount_price,
+                'imageURL': product.imageURL
+            }, 
+            'quantity': quantity,
+            'digital': product.digital,
+            'get_total': total,
+        }
+        
+        # Add variant info if available
+        if variant:
+            item['variant'] = {
+                'id': variant.id,
+                'name': variant.name,
+                'value': variant.value,
+                'variant_type': variant.get_variant_type_display(),
+                'price_adjustment': variant.price_adjustment,
+                'adjusted_price': variant.get_adjusted_price,
+                'format_adjusted_price': variant.format_adjusted_price
+            }
+        
+        items.append(item)
+
+        if product.digital == False:
+            order['shipping'] = True
             
-    return {'cartItems':cartItems, 'order':order, 'items':items}
+    return order, items
 
-def cartData(request):
-    if request.user.is_authenticated:
+def cartData(request, count_only=False):
+    """
+    Data keranjang untuk user login maupun guest.
+
+    Halaman katalog yang hanya butuh badge jumlah item sebaiknya memanggil
+    dengan count_only=True: keranjang guest tidak di-resolve penuh dan
+    keranjang user login dibaca dari cart_store tanpa query.
+    """
+    if request.user.is_authenticated and count_only:
+        # Badge keranjang dibaca dari cache, tanpa query database
+        cartItems = cart_store.item_count(request.user.id)
+        order = {'get_cart_total':0, 'get_cart_items':cartItems, 'shipping':False}
+        items = []
+    elif request.user.is_authenticated:
+        # Halaman cart/checkout membaca database: tulis dulu perubahan tertunda
+        try:
+            cart_store.flush(request.user.id)
+        except cart_store.CartBusy:
+            pass
         customer = request.user.customer
-        order, created = Order.objects.get_or_create(customer=customer, complete=False)
-        items = order.orderitem_set.all()
+        order, created = Order.objects.with_totals().get_or_create(customer=customer, complete=False)
+        items = order.orderitem_set.select_related('product', 'variant__product')
         cartItems = order.get_cart_items
     else:
-        cookieData = cookieCart(request)
+        cookieData = cookieCart(request, count_only=count_only)
         cartItems = cookieData['cartItems']
         order = cookieData['order']
         items = cookieData['items']
@@ -90,38 +131,46 @@ def cartData(request):
     return {'cartItems':cartItems, 'order':order, 'items':items}
 
 def guestOrder(request, data):
+    """
+    Buat customer, order dan semua OrderItem untuk checkout guest dalam satu
+    transaksi. Produk dan varian sudah di-resolve sekaligus oleh cookieCart,
+    item disimpan dengan satu bulk_create.
+    """
     name = data['form']['name']
     email = data['form']['email']
 
     cookieData = cookieCart(request)
     items = cookieData['items']
 
-    customer, created = Customer.objects.get_or_create(
-        email=email,
-    )
-    customer.name = name
-    customer.save()
+    # Baris yang sama (produk + varian) digabung agar lolos unique_order_item_line
+    quantities = {}
+    for item in items:
+        key = (item['id'], item['variant']['id'] if item.get('variant') else None)
+        quantities[key] = quantities.get(key, 0) + abs(item['quantity']) # negative quantity = freebies
 
-    order = Order.objects.create(
-        customer=customer,
-        complete=False,
-    )
+    with transaction.atomic():
+        customer, created = Customer.objects.get_or_create(
+            email=email,
+            defaults={'name': name},
+        )
+        if not created and customer.name != name:
+            customer.name = name
+            customer.save(update_fields=['name'])
 
-    for item in items:
-        product = Product.objects.get(id=item['id'])
-        
-        # Check for variant
-        variant = None
-        if 'variant' in item and item['variant']:
-            try:
-                variant = ProductVariant.objects.get(id=item['variant']['id'])
-            except ProductVariant.DoesNotExist:
-                pass
-                
-        orderItem = OrderItem.objects.create(
-            product=product,
-            order=order,
-            variant=variant,
-            quantity=(item['quantity'] if item['quantity']>0 else -1*item['quantity']), # negative quantity = freebies
+        order = Order.objects.create(
+            customer=customer,
+            complete=False,
         )
-    return customer, order
\ No newline at end of file
+
+        # bulk_create tidak memanggil save(), jadi variant_key diisi di sini
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                variant_id=variant_id,
+                variant_key=variant_id or 0,
+                quantity=quantity,
+            )
+            for (product_id, variant_id), quantity in quantities.items()
+        ])
+    return customer, order
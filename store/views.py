@@ -4,23 +4,34 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.urls import reverse
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q
+from asgiref.sync import sync_to_async
 import json
 import datetime
+import logging
 import time
-import midtransclient
 from .models import *
-from .utils import cookieCart, cartData, guestOrder
+from .utils import cookieCart, cartData, guestOrder, price_cart_lines
+from . import cart_cookie, cart_store, inventory, payment_gateway, payment_inbox, payment_state
 from .forms import UserProfileForm, UserUpdateForm
-from django.db.models import Q, Avg
+from .search import search_products
+from .pagination import PageMoved, paginate_request, page_querystring
+from .facets import catalog_facets, subtree_counts
+from .related import related_products_for
+from .admission import checkout_admission, ticket_status
+from .idempotency import idempotent
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
 def store(request):
-    data = cartData(request)
+    data = cartData(request, count_only=True)
     cartItems = data['cartItems']
     
     # Get search query
@@ -32,48 +43,74 @@ def store(request):
     # Start with all products
     products_list = Product.objects.all()
     
-    # Apply search filter if provided
+    # Apply search filter if provided (urut berdasarkan relevansi)
     if search_query:
-        products_list = products_list.filter(
-            Q(name__icontains=search_query) | 
-            Q(kategori__icontains=search_query)
-        )
+        products_list = search_products(products_list, search_query)
     
-    # Apply category filter if specified
+    # Apply category filter if specified (slug, atau nama untuk link lama)
+    selected = None
     if category and category != 'Semua':
-        products_list = products_list.filter(kategori=category)
+        selected = Category.objects.filter(Q(slug=category) | Q(name=category)).first()
+        if selected:
+            products_list = products_list.filter(selected.subtree_q('category__'))
+        else:
+            products_list = products_list.none()
     
-    # Pagination - 12 products per page
-    paginator = Paginator(products_list, 12)
-    page_number = request.GET.get('page', 1)
-    products = paginator.get_page(page_number)
+    # Pagination - 12 products per page. Hasil pencarian diurutkan berdasarkan
+    # relevansi dan jumlahnya terbatas, jadi tetap memakai Paginator biasa.
+    if search_query:
+        paginator = Paginator(products_list, 12)
+        page_number = request.GET.get('page', 1)
+        products = paginator.get_page(page_number)
+        total_count = paginator.count
+    else:
+        count_key = f"store:product_count:{selected.pk if selected else 'all'}"
+        try:
+            products = paginate_request(request, products_list, 12, count_cache_key=count_key)
+        except PageMoved as moved:
+            return redirect(moved.url)
+        total_count = products.approximate_count
     
-    # Get all unique categories for the filter dropdown
-    categories = Product.objects.values_list('kategori', flat=True).distinct()
+    # Get all active categories for the filter dropdown, dengan jumlah produk
+    # dari facet (ter-cache) untuk pencarian aktif
+    facets = catalog_facets(search_query)
+    counts = subtree_counts(facets)
+    categories = list(Category.objects.filter(is_active=True))
+    for item in categories:
+        item.facet_count = counts.get(item.pk, 0)
     
     context = {
         'products': products, 
+        'total_count': total_count,
+        'facets': facets,
+        'page_query': page_querystring(request),
         'cartItems': cartItems,
         'categories': categories,
-        'selected_category': category or 'Semua'
+        'selected_category': selected.slug if selected else (category or 'Semua'),
+        'selected_category_name': selected.name if selected else category,
     }
     return render(request, 'store/store.html', context)
 
+def catalog_facets_api(request):
+    """
+    Facet katalog (kategori, stok, diskon, rentang harga) dalam format JSON
+    untuk filter di sisi client.
+    """
+    return JsonResponse(catalog_facets(request.GET.get('search', '')))
+
 def product_detail(request, product_id):
     """
     View untuk menampilkan detail produk.
     """
     # Ambil data produk berdasarkan ID
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
     
     # Ambil data keranjang
-    data = cartData(request)
+    data = cartData(request, count_only=True)
     cartItems = data['cartItems']
     
-    # Dapatkan produk terkait (dari kategori yang sama)
-    related_products = Product.objects.filter(
-        kategori=product.kategori
-    ).exclude(id=product.id)[:4]  # Ambil maksimal 4 produk terkait
+    # Produk terkait dari data co-purchase, dilengkapi produk kategori yang sama
+    related_products = related_products_for(product)
     
     # Siapkan context untuk template
     context = {
@@ -92,7 +129,10 @@ def add_review(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     
     if request.method == 'POST':
-        rating = int(request.POST.get('rating', 5))
+        try:
+            rating = min(max(int(request.POST.get('rating', 5)), 1), 5)
+        except ValueError:
+            rating = 5
         review_text = request.POST.get('review_text', '')
         
         # Periksa apakah pengguna sudah memberikan ulasan sebelumnya
@@ -121,12 +161,7 @@ def add_review(request, product_id):
                 is_verified_purchase=is_verified
             )
             messages.success(request, 'Terima kasih atas ulasan Anda.')
-            
-            # Perbarui rating produk
-            product_reviews = ProductReview.objects.filter(product=product)
-            product.rating = product_reviews.aggregate(Avg('rating'))['rating__avg']
-            product.review_count = product_reviews.count()
-            product.save()
+            # Rating produk diperbarui oleh ProductReview.save()
     
     # Redirect kembali ke halaman detail produk
     return redirect('product_detail', product_id=product_id)
@@ -138,7 +173,11 @@ def cart(request):
     items = data['items']
 
     context = {'items':items, 'order':order, 'cartItems':cartItems}
-    return render(request, 'store/cart.html', context)
+    response = render(request, 'store/cart.html', context)
+    if not request.user.is_authenticated:
+        # Harga sudah divalidasi ulang; perbarui snapshot di cookie guest
+        cart_cookie.sync(request, response, data)
+    return response
 
 def checkout(request):
     data = cartData(request)
@@ -150,7 +189,7 @@ def checkout(request):
     if isinstance(items, list):  # For non-authenticated users (cookie data)
         total_amount = sum([item.get('get_total', 0) for item in items])
     else:  # For authenticated users (database data)
-        total_amount = sum([item.get_total for item in items])
+        total_amount = order.get_cart_total
 
     # Generate unique order ID
     unique_order_id = f"ORDER-{order.id if hasattr(order, 'id') else int(time.time())}"
@@ -166,7 +205,10 @@ def checkout(request):
         'TOTAL_AMOUNT': total_amount
     }
     
-    return render(request, 'store/checkout.html', context)
+    response = render(request, 'store/checkout.html', context)
+    if not request.user.is_authenticated:
+        cart_cookie.sync(request, response, data)
+    return response
 
 # GANTI function updateItem di views.py dengan ini:
 
@@ -175,121 +217,201 @@ def updateItem(request):
         data = json.loads(request.body)
         productId = data['productId']
         action = data['action']
-        print('Action:', action)
-        print('Product:', productId)
+        logger.debug("updateItem %s produk %s", action, productId)
 
         # Pastikan user sudah login
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'User not authenticated'}, status=401)
 
-        customer = request.user.customer
         product = Product.objects.get(id=productId)
-        order, created = Order.objects.get_or_create(customer=customer, complete=False)
 
-        # PERBAIKAN: Handle multiple OrderItems yang mungkin ada
-        # Cari semua OrderItem yang ada untuk order dan product ini
-        existing_items = OrderItem.objects.filter(order=order, product=product)
-        
-        if existing_items.count() > 1:
-            # Jika ada lebih dari 1, gabungkan quantity dan hapus sisanya
-            total_quantity = sum(item.quantity for item in existing_items)
-            
-            # Hapus semua existing items
-            existing_items.delete()
-            
-            # Buat item baru dengan total quantity
-            orderItem = OrderItem.objects.create(
-                order=order, 
-                product=product, 
-                quantity=total_quantity
-            )
-        elif existing_items.count() == 1:
-            # Jika hanya ada 1, gunakan yang ada
-            orderItem = existing_items.first()
+        # Keranjang diubah di cache; OrderItem ditulis belakangan (cart_store)
+        deltas = {'add': 1, 'remove': -1}
+        if action in deltas:
+            cart = cart_store.apply_changes(request.user.id, {(product.pk, None): deltas[action]})
         else:
-            # Jika tidak ada, buat baru
-            orderItem = OrderItem.objects.create(
-                order=order, 
-                product=product, 
-                quantity=0
-            )
-
-        # Update quantity berdasarkan action
-        if action == 'add':
-            orderItem.quantity += 1
-        elif action == 'remove':
-            orderItem.quantity -= 1
+            cart = cart_store.get_cart(request.user.id)
+        quantity = cart['l'].get(cart_store.line_key(product.pk), 0)
+        totals, _ = price_cart_lines(cart_store.cart_lines(cart))
 
-        # Simpan perubahan
-        orderItem.save()
-
-        # Hapus item jika quantity <= 0
-        if orderItem.quantity <= 0:
-            orderItem.delete()
+        if quantity <= 0:
             return JsonResponse({
                 'message': 'Item removed from cart',
-                'cartItems': order.get_cart_items,
-                'cartTotal': float(order.get_cart_total)
+                'cartItems': totals['get_cart_items'],
+                'cartTotal': float(totals['get_cart_total'])
             })
 
         return JsonResponse({
             'message': 'Item updated successfully',
-            'quantity': orderItem.quantity,
-            'cartItems': order.get_cart_items,
-            'cartTotal': float(order.get_cart_total)
+            'quantity': quantity,
+            'cartItems': totals['get_cart_items'],
+            'cartTotal': float(totals['get_cart_total'])
         })
 
     except Product.DoesNotExist:
         return JsonResponse({'error': 'Product not found'}, status=404)
     except Customer.DoesNotExist:
         return JsonResponse({'error': 'Customer profile not found'}, status=404)
+    except cart_store.CartBusy:
+        return JsonResponse({'error': 'Cart is busy, please retry'}, status=503)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
-    except Exception as e:
-        print(f"Error in updateItem: {str(e)}")
+    except Exception:
+        logger.exception("Gagal memperbarui item keranjang")
         return JsonResponse({'error': 'Internal server error'}, status=500)
     
-def processOrder(request):
-    transaction_id = datetime.datetime.now().timestamp()
-    data = json.loads(request.body)
+def _parse_cart_operations(data):
+    """
+    Validasi payload batch keranjang. Mengembalikan (deltas, removals) dengan
+    key (product_id, variant_id); operasi untuk baris yang sama digabung.
+    """
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    if len(operations) > getattr(settings, 'CART_BATCH_MAX_OPERATIONS', 50):
+        raise ValueError('Too many operations')
+
+    deltas, removals = {}, set()
+    for operation in operations:
+        try:
+            key = (int(operation['productId']), int(operation['variantId']) if operation.get('variantId') else None)
+            delta = int(operation.get('delta', 0))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Invalid operation')
+        if operation.get('remove'):
+            removals.add(key)
+            deltas.pop(key, None)
+        elif key not in removals:
+            deltas[key] = deltas.get(key, 0) + delta
+    return deltas, removals
+
+def batchUpdateCart(request):
+    """
+    Terapkan banyak perubahan keranjang sekaligus:
+    {"operations": [{"productId": 1, "variantId": null, "delta": 2}, {"productId": 3, "remove": true}]}
+    Semua operasi diterapkan sekaligus ke keranjang (cart_store untuk user
+    login, cookie bertanda tangan untuk guest), lalu ringkasan keranjang dikembalikan.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-    if request.user.is_authenticated:
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(customer=customer, complete=False)
-    else:
-        customer, order = guestOrder(request, data)
+    try:
+        deltas, removals = _parse_cart_operations(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    total = float(data['form']['total'])
-    order.transaction_id = transaction_id
+    keys = set(deltas) | removals
+    product_ids = {product_id for product_id, _ in keys}
+    variant_ids = {variant_id for _, variant_id in keys if variant_id}
+    if len(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)) != len(product_ids):
+        return JsonResponse({'error': 'Product not found'}, status=404)
+    if variant_ids:
+        variant_products = dict(ProductVariant.objects.filter(pk__in=variant_ids).values_list('pk', 'product_id'))
+        if any(variant_id and variant_products.get(variant_id) != product_id for product_id, variant_id in keys):
+            return JsonResponse({'error': 'Variant not found'}, status=404)
 
-    # Check if payment was successful (if payment_result exists)
-    payment_result = data.get('payment_result', None)
-    if payment_result:
-        # Update transaction status in database
+    if request.user.is_authenticated:
         try:
-            transaction = Transaction.objects.get(order=order)
-            transaction.status = payment_result.get('transaction_status', 'settlement')
-            transaction.payment_response = payment_result
-            transaction.save()
-        except Transaction.DoesNotExist:
-            pass  # Transaction not found, may have been created via create_transaction
-
-    # Mark order as complete
-    if total == float(order.get_cart_total):
-        order.complete = True
-    order.save()
-
-    if order.shipping == True:
-        ShippingAddress.objects.create(
-        customer=customer,
-        order=order,
-        address=data['shipping']['address'],
-        city=data['shipping']['city'],
-        state=data['shipping']['state'],
-        zipcode=data['shipping']['zipcode'],
+            cart = cart_store.apply_changes(request.user.id, deltas, removals)
+        except cart_store.CartBusy:
+            return JsonResponse({'error': 'Cart is busy, please retry'}, status=503)
+        except Customer.DoesNotExist:
+            return JsonResponse({'error': 'Customer profile not found'}, status=404)
+        lines = cart_store.cart_lines(cart)
+    else:
+        # Guest: keranjang ada di cookie bertanda tangan, ditulis ulang di response
+        current = {(product_id, variant_id): quantity for product_id, variant_id, quantity in cart_cookie.read(request)[0]}
+        for key, delta in deltas.items():
+            current[key] = current.get(key, 0) + delta
+        for key in removals:
+            current.pop(key, None)
+        lines = [(product_id, variant_id, quantity) for (product_id, variant_id), quantity in current.items() if quantity > 0]
+
+    # Ringkasan dihitung dari baris keranjang (harga: maksimal dua query)
+    totals, priced_items = price_cart_lines(lines)
+    quantities = {(product_id, variant_id): quantity for product_id, variant_id, quantity in lines}
+    response = JsonResponse({
+        'message': 'Cart updated successfully',
+        'cartItems': totals['get_cart_items'],
+        'cartTotal': float(totals['get_cart_total']),
+        'items': [
+            {'productId': product_id, 'variantId': variant_id, 'quantity': quantities.get((product_id, variant_id), 0)}
+            for product_id, variant_id in sorted(keys, key=lambda key: (key[0], key[1] or 0))
+        ],
+    })
+    if not request.user.is_authenticated:
+        cart_cookie.write(
+            response, cart_cookie.lines_from_items(priced_items),
+            totals['get_cart_items'], totals['get_cart_total'],
         )
+    return response
 
-    return JsonResponse('Payment submitted..', safe=False)
+@idempotent('process_order')
+@checkout_admission
+def processOrder(request):
+    """
+    Finalisasi order dalam satu transaksi: order dikunci sekali, total, jumlah
+    item dan kebutuhan pengiriman dihitung dengan satu query agregat, dan total
+    dari client dibandingkan sebagai integer Rupiah.
+    """
+    try:
+        data = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    try:
+        submitted_total = to_rupiah(data['form']['total'])
+    except (KeyError, TypeError, ArithmeticError, ValueError):
+        return JsonResponse({'error': 'Total tidak valid'}, status=400)
+    if not request.user.is_authenticated:
+        name, email = data['form'].get('name'), data['form'].get('email')
+        if not (isinstance(name, str) and name.strip() and isinstance(email, str) and email.strip()):
+            return JsonResponse({'error': 'Nama dan email wajib diisi'}, status=400)
+
+    if request.user.is_authenticated:
+        # Total harus dihitung dari database, jadi keranjang di cache ditulis dulu
+        cart_store.flush(request.user.id)
+        customer = request.user.customer
+
+    with transaction.atomic():
+        if request.user.is_authenticated:
+            order = Order.objects.select_for_update().filter(customer=customer, complete=False).first()
+            if order is None:
+                order = Order.objects.create(customer=customer, complete=False)
+        else:
+            # Order guest baru dibuat di transaksi ini, jadi barisnya sudah terkunci
+            customer, order = guestOrder(request, data)
+        totals = order.orderitem_set.cart_totals()
+
+        shipping = data.get('shipping') or {}
+        shipping_fields = ('address', 'city', 'state', 'zipcode')
+        if totals['needs_shipping'] and not all(shipping.get(field) for field in shipping_fields):
+            transaction.set_rollback(True)
+            return JsonResponse({'error': 'Alamat pengiriman wajib diisi'}, status=400)
+
+        # Status pembayaran tidak diambil dari body client: hanya notifikasi
+        # Midtrans yang terverifikasi (payment_inbox) dan reconcile_transactions
+        # yang boleh mengubah Transaction
+
+        # Mark order as complete
+        order.transaction_id = time.time()
+        if submitted_total == to_rupiah(totals['cart_total']):
+            order.complete = True
+        order.save(update_fields=['transaction_id', 'complete'])
+
+        if totals['needs_shipping']:
+            ShippingAddress.objects.create(
+                customer=customer,
+                order=order,
+                **{field: shipping[field] for field in shipping_fields},
+            )
+
+    response = JsonResponse('Payment submitted..', safe=False)
+    if not request.user.is_authenticated and order.complete:
+        # Keranjang guest sudah menjadi order
+        response.delete_cookie(cart_cookie.COOKIE_NAME)
+    return response
 
 def login_user(request):
     if request.method == 'POST':
@@ -328,150 +450,218 @@ import uuid
 import time
 from datetime import datetime
 
+def _prepare_transaction(request, body):
+    """Bagian create_transaction sebelum memanggil Midtrans: susun data Snap dan
+    reservasi stok. Mengembalikan (context, None) atau (None, response_error)."""
+    # Generate UNIQUE order ID dengan timestamp dan random
+    timestamp = int(time.time())
+    random_str = str(uuid.uuid4())[:8]
+    order_id = f"ORDER-{timestamp}-{random_str}"
+
+    # Ambil detail pengiriman
+    shipping_details = body.get('shipping', {})
+
+    # Transaction details
+    transaction_data = {
+        "transaction_details": {
+            "order_id": order_id,
+            "gross_amount": int(body.get('gross_amount', 10000)),
+        },
+        "customer_details": {
+            "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
+            "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
+            "phone": body.get('phone', "081234567890"),
+            "billing_address": {
+                "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
+                "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
+                "phone": body.get('phone', "081234567890"),
+                "address": shipping_details.get('address', 'Alamat Default'),
+                "city": shipping_details.get('city', 'Jakarta'),
+                "postal_code": shipping_details.get('zipcode', '12345'),
+                "country_code": "IDN"
+            },
+            "shipping_address": {
+                "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
+                "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
+                "phone": body.get('phone', "081234567890"),
+                "address": shipping_details.get('address', 'Alamat Default'),
+                "city": shipping_details.get('city', 'Jakarta'),
+                "postal_code": shipping_details.get('zipcode', '12345'),
+                "country_code": "IDN"
+            }
+        },
+        "credit_card": {
+            "secure": True
+        },
+        # URL untuk redirect setelah pembayaran selesai
+        "callbacks": {
+            "finish": request.build_absolute_uri(reverse('payment_success')) + f"?order_id={order_id}",
+            "error": request.build_absolute_uri(reverse('payment_error')) + f"?order_id={order_id}",
+            "pending": request.build_absolute_uri(reverse('payment_pending')) + f"?order_id={order_id}"
+        },
+        # Set ke false untuk menggunakan redirect alih-alih popup
+        "enable_redirect": True
+    }
+
+    # Data pembeli (nama, email, alamat) tidak ikut dicatat
+    logger.debug("Membuat transaksi Snap %s sebesar %s", order_id,
+                 transaction_data["transaction_details"]["gross_amount"])
+
+    # Reservasi stok sebelum pembayaran dibuat (keranjang di cache ditulis dulu)
+    order = None
+    if request.user.is_authenticated:
+        cart_store.flush(request.user.id)
+        order, created = Order.objects.get_or_create(customer=request.user.customer, complete=False)
+        try:
+            inventory.reserve_order(order)
+        except inventory.InsufficientStock as exc:
+            return None, JsonResponse({
+                "error": "Stok tidak mencukupi",
+                "items": [
+                    {"productId": product_id, "variantId": variant_id, "quantity": quantity}
+                    for product_id, variant_id, quantity in exc.items
+                ],
+            }, status=409)
+
+    return {
+        'order_id': order_id,
+        'order': order,
+        'shipping_details': shipping_details,
+        'transaction_data': transaction_data,
+    }, None
+
+def _abort_transaction(context):
+    """Lepas reservasi stok jika transaksi Snap gagal dibuat."""
+    if context['order'] is not None:
+        inventory.release_order(context['order'])
+
+def _save_transaction(request, context, snap_response):
+    """Bagian create_transaction setelah Midtrans menjawab: simpan transaksi dan kembalikan token."""
+    order_id, order = context['order_id'], context['order']
+    shipping_details, transaction_data = context['shipping_details'], context['transaction_data']
+    logger.debug("Token Snap diterima untuk %s", order_id)
+
+    # Save transaction to database
+    if request.user.is_authenticated:
+        try:
+            customer = request.user.customer
+
+            # Isi transaction_id jika order belum punya
+            if not order.transaction_id:
+                order.transaction_id = order_id
+                order.save()
+
+            # Cek apakah transaction sudah ada untuk order ini
+            transaction, tx_created = Transaction.objects.get_or_create(
+                order=order,
+                defaults={
+                    'user': request.user,
+                    'transaction_id': order_id,
+                    'amount': transaction_data["transaction_details"]["gross_amount"],
+                    'status': "pending",
+                    'payment_response': snap_response
+                }
+            )
+
+            # Transaksi lama order ini diganti lewat state machine (hanya jika
+            # belum lunas), bukan save() yang bisa menimpa status final
+            if not tx_created and not payment_state.restart(
+                transaction, order_id, transaction_data["transaction_details"]["gross_amount"], snap_response,
+            ):
+                logger.warning("Transaksi %s berstatus %s, tidak diganti dengan %s",
+                               transaction.transaction_id, transaction.status, order_id)
+
+            # Simpan alamat pengiriman jika belum ada
+            if order.shipping and not ShippingAddress.objects.filter(order=order).exists():
+                ShippingAddress.objects.create(
+                    customer=customer,
+                    order=order,
+                    address=shipping_details.get('address', 'Alamat Default'),
+                    city=shipping_details.get('city', 'Jakarta'),
+                    state=shipping_details.get('state', 'DKI Jakarta'),
+                    zipcode=shipping_details.get('zipcode', '12345')
+                )
+
+        except Exception:
+            logger.exception("Gagal menyimpan transaksi %s ke database", order_id)
+            # Continue even if saving to DB fails
+
+    # Return Snap Token and redirect URL
+    return JsonResponse({
+        "token": snap_response['token'],
+        "redirect_url": snap_response['redirect_url'],
+        "order_id": order_id  # Return order_id untuk referensi
+    })
+
+def _transaction_error(e):
+    logger.exception("Gagal membuat transaksi Snap")
+
+    # Return lebih detail error untuk debugging
+    return JsonResponse({
+        "error": str(e),
+        "error_type": type(e).__name__,
+        "timestamp": datetime.now().isoformat()
+    }, status=500)
+
 @csrf_exempt
+@idempotent('create_transaction')
+@checkout_admission
 def create_transaction(request):
     if request.method == 'POST':
         try:
             # Parse request body
             body = json.loads(request.body)
+            context, error = _prepare_transaction(request, body)
+            if error is not None:
+                return error
 
-            # Midtrans configuration
-            snap = midtransclient.Snap(
-                is_production=settings.MIDTRANS_IS_PRODUCTION,
-                server_key=settings.MIDTRANS_SERVER_KEY,
-                client_key=settings.MIDTRANS_CLIENT_KEY,
-            )
+            # Create Snap Transaction (client Midtrans bersama per proses, lihat payment_gateway)
+            try:
+                snap_response = payment_gateway.create_transaction(context['transaction_data'])
+            except Exception:
+                _abort_transaction(context)
+                raise
+            return _save_transaction(request, context, snap_response)
 
-            # Generate UNIQUE order ID dengan timestamp dan random
-            timestamp = int(time.time())
-            random_str = str(uuid.uuid4())[:8]
-            order_id = f"ORDER-{timestamp}-{random_str}"
-            
-            print(f"Generated Order ID: {order_id}")  # Debug log
-            
-            # Ambil detail pengiriman
-            shipping_details = body.get('shipping', {})
-            
-            # Transaction details
-            transaction_data = {
-                "transaction_details": {
-                    "order_id": order_id,
-                    "gross_amount": int(body.get('gross_amount', 10000)),
-                },
-                "customer_details": {
-                    "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
-                    "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
-                    "phone": body.get('phone', "081234567890"),
-                    "billing_address": {
-                        "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
-                        "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
-                        "phone": body.get('phone', "081234567890"),
-                        "address": shipping_details.get('address', 'Alamat Default'),
-                        "city": shipping_details.get('city', 'Jakarta'),
-                        "postal_code": shipping_details.get('zipcode', '12345'),
-                        "country_code": "IDN"
-                    },
-                    "shipping_address": {
-                        "first_name": body.get('first_name', request.user.username if request.user.is_authenticated else "Guest"),
-                        "email": body.get('email', request.user.email if request.user.is_authenticated else "guest@example.com"),
-                        "phone": body.get('phone', "081234567890"),
-                        "address": shipping_details.get('address', 'Alamat Default'),
-                        "city": shipping_details.get('city', 'Jakarta'),
-                        "postal_code": shipping_details.get('zipcode', '12345'),
-                        "country_code": "IDN"
-                    }
-                },
-                "credit_card": {
-                    "secure": True
-                },
-                # URL untuk redirect setelah pembayaran selesai
-                "callbacks": {
-                    "finish": request.build_absolute_uri(reverse('payment_success')) + f"?order_id={order_id}",
-                    "error": request.build_absolute_uri(reverse('payment_error')) + f"?order_id={order_id}",
-                    "pending": request.build_absolute_uri(reverse('payment_pending')) + f"?order_id={order_id}"
-                },
-                # Set ke false untuk menggunakan redirect alih-alih popup
-                "enable_redirect": True
-            }
+        except Exception as e:
+            return _transaction_error(e)
 
-            print(f"Transaction data: {transaction_data}")  # Debug log
+    return JsonResponse({"error": "Invalid request method"}, status=400)
 
-            # Create Snap Transaction
-            snap_response = snap.create_transaction(transaction_data)
-            print(f"Midtrans response: {snap_response}")  # Debug log
-            
-            # Save transaction to database
-            if request.user.is_authenticated:
-                try:
-                    # Ambil atau buat order baru
-                    customer = request.user.customer
-                    order, created = Order.objects.get_or_create(
-                        customer=customer, 
-                        complete=False,
-                        defaults={
-                            'transaction_id': order_id
-                        }
-                    )
-                    
-                    # Update transaction_id jika order sudah ada tapi belum ada transaction_id
-                    if not created and not order.transaction_id:
-                        order.transaction_id = order_id
-                        order.save()
-                    
-                    # Cek apakah transaction sudah ada untuk order ini
-                    transaction, tx_created = Transaction.objects.get_or_create(
-                        order=order,
-                        defaults={
-                            'user': request.user,
-                            'transaction_id': order_id,
-                            'amount': transaction_data["transaction_details"]["gross_amount"],
-                            'status': "pending",
-                            'payment_response': snap_response
-                        }
-                    )
-                    
-                    if not tx_created:
-                        # Update existing transaction
-                        transaction.transaction_id = order_id
-                        transaction.amount = transaction_data["transaction_details"]["gross_amount"]
-                        transaction.status = "pending"
-                        transaction.payment_response = snap_response
-                        transaction.save()
-                    
-                    # Simpan alamat pengiriman jika belum ada
-                    if order.shipping and not ShippingAddress.objects.filter(order=order).exists():
-                        ShippingAddress.objects.create(
-                            customer=customer,
-                            order=order,
-                            address=shipping_details.get('address', 'Alamat Default'),
-                            city=shipping_details.get('city', 'Jakarta'),
-                            state=shipping_details.get('state', 'DKI Jakarta'),
-                            zipcode=shipping_details.get('zipcode', '12345')
-                        )
-                        
-                except Exception as tx_error:
-                    print(f"Error saving transaction to database: {str(tx_error)}")
-                    # Continue even if saving to DB fails
-            
-            # Return Snap Token and redirect URL
-            return JsonResponse({
-                "token": snap_response['token'],
-                "redirect_url": snap_response['redirect_url'],
-                "order_id": order_id  # Return order_id untuk referensi
-            })
+@csrf_exempt
+@idempotent('create_transaction')
+@checkout_admission
+async def create_transaction_async(request):
+    """
+    Versi async create_transaction untuk deployment ASGI (ecommerce/asgi.py),
+    dipasang di URL create-transaction/ jika MIDTRANS_ASYNC_CHECKOUT aktif.
+    Bagian database tetap sync lewat sync_to_async; selama menunggu Midtrans
+    request tidak menahan thread worker.
+    """
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            context, error = await sync_to_async(_prepare_transaction)(request, body)
+            if error is not None:
+                return error
+
+            try:
+                snap_response = await payment_gateway.acreate_transaction(context['transaction_data'])
+            except Exception:
+                await sync_to_async(_abort_transaction)(context)
+                raise
+            return await sync_to_async(_save_transaction)(request, context, snap_response)
 
         except Exception as e:
-            print(f"Error creating transaction: {str(e)}")
-            
-            # Return lebih detail error untuk debugging
-            return JsonResponse({
-                "error": str(e),
-                "error_type": type(e).__name__,
-                "timestamp": datetime.now().isoformat()
-            }, status=500)
+            return _transaction_error(e)
 
     return JsonResponse({"error": "Invalid request method"}, status=400)
 
+def checkout_queue_status(request, ticket):
+    """Posisi dan perkiraan waktu tunggu tiket antrian checkout (dipoll halaman checkout)."""
+    status = ticket_status(ticket)
+    return JsonResponse(status, status=404 if status['status'] == 'expired' else 200)
+
 @login_required
 def profil_user(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
@@ -498,32 +688,39 @@ def edit_profile(request):
     }
     return render(request, 'store/edit_profile.html', context)
 
+def _apply_redirect_status(request):
+    """
+    Terapkan status pembayaran dari redirect Snap. Parameter URL berasal dari
+    browser, jadi diverifikasi seperti notifikasi (tanda tangan atau status API).
+    Mengembalikan status Transaction setelahnya, atau None jika belum bisa diverifikasi.
+    """
+    order_id = request.GET.get('order_id', '')
+    try:
+        payment_inbox.apply_notification(order_id, request.GET.dict())
+    except Transaction.DoesNotExist:
+        raise
+    except Exception:
+        logger.warning("Status pembayaran %s dari redirect belum bisa diverifikasi", order_id, exc_info=True)
+        return None
+    return Transaction.objects.filter(transaction_id=order_id).values_list('status', flat=True).first()
+
 # Callback handler untuk Midtrans
 def payment_success(request):
-    # Proses order berhasil
-    order_id = request.GET.get('order_id', '')
+    # Order ditandai selesai oleh payment_state hanya jika Midtrans mengonfirmasi
     try:
-        transaction = Transaction.objects.get(transaction_id=order_id)
-        transaction.status = 'settlement'
-        transaction.save()
-        
-        # Update order status
-        order = transaction.order
-        order.complete = True
-        order.save()
-        
-        messages.success(request, "Pembayaran berhasil! Terima kasih atas pesanan Anda.")
+        status = _apply_redirect_status(request)
+        if status in payment_state.PAID:
+            messages.success(request, "Pembayaran berhasil! Terima kasih atas pesanan Anda.")
+        else:
+            messages.info(request, "Pembayaran sedang diverifikasi. Status pesanan akan diperbarui otomatis.")
     except Transaction.DoesNotExist:
         messages.warning(request, "Pesanan tidak ditemukan, tapi pembayaran berhasil diproses.")
     
     return redirect('payment_confirmation')
 
 def payment_error(request):
-    order_id = request.GET.get('order_id', '')
     try:
-        transaction = Transaction.objects.get(transaction_id=order_id)
-        transaction.status = 'failed'
-        transaction.save()
+        _apply_redirect_status(request)
     except Transaction.DoesNotExist:
         pass
         
@@ -532,13 +729,10 @@ def payment_error(request):
 
 def payment_pending(request):
     order_id = request.GET.get('order_id', '')
-    try:
-        transaction = Transaction.objects.get(transaction_id=order_id)
-        transaction.status = 'pending'
-        transaction.save()
-        
+    # Transaksi baru selalu pending; status yang sudah berubah tidak dikembalikan ke pending
+    if Transaction.objects.filter(transaction_id=order_id).exists():
         messages.info(request, "Pembayaran Anda sedang diproses. Kami akan memberi tahu Anda setelah pembayaran dikonfirmasi.")
-    except Transaction.DoesNotExist:
+    else:
         messages.warning(request, "Pesanan tidak ditemukan, tapi pembayaran sedang diproses.")
     
     return redirect('payment_confirmation')
@@ -561,65 +755,25 @@ def payment_confirmation(request):
 # Webhook untuk notifikasi Midtrans
 @csrf_exempt
 def midtrans_notification_handler(request):
+    """
+    Simpan notifikasi ke inbox dan langsung jawab 200; verifikasi dan update
+    Transaction/Order dikerjakan worker process_payment_notifications
+    (lihat store/payment_inbox.py).
+    """
     if request.method == 'POST':
         try:
-            # Inisialisasi Midtrans Core API
-            core_api = midtransclient.CoreApi(
-                is_production=settings.MIDTRANS_IS_PRODUCTION,
-                server_key=settings.MIDTRANS_SERVER_KEY,
-                client_key=settings.MIDTRANS_CLIENT_KEY
-            )
-            
-            # Parse JSON dari request body
-            notification_body = json.loads(request.body)
-            
-            # Verifikasi notifikasi dari Midtrans
-            transaction_status_response = core_api.transactions.notification(notification_body)
-            
-            # Ambil informasi penting
-            order_id = transaction_status_response.get('order_id')
-            transaction_status = transaction_status_response.get('transaction_status')
-            fraud_status = transaction_status_response.get('fraud_status')
-            
-            # Update status transaksi
-            try:
-                transaction = Transaction.objects.get(transaction_id=order_id)
-                
-                # Perbarui status berdasarkan notifikasi Midtrans
-                if transaction_status == 'capture':
-                    if fraud_status == 'challenge':
-                        transaction.status = 'challenge'
-                    else:
-                        transaction.status = 'success'
-                        # Update order juga
-                        transaction.order.complete = True
-                        transaction.order.save()
-                elif transaction_status == 'settlement':
-                    transaction.status = 'settlement'
-                    # Update order juga
-                    transaction.order.complete = True
-                    transaction.order.save()
-                elif transaction_status == 'deny':
-                    transaction.status = 'deny'
-                elif transaction_status == 'cancel' or transaction_status == 'expire':
-                    transaction.status = 'canceled'
-                elif transaction_status == 'pending':
-                    transaction.status = 'pending'
-                    
-                # Simpan response lengkap
-                transaction.payment_response = transaction_status_response
-                transaction.save()
-                
-                return JsonResponse({'status': 'OK'})
-                
-            except Transaction.DoesNotExist:
-                return JsonResponse({'status': 'Transaction not found'}, status=404)
-                
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
-            
+            payment_inbox.receive(request.body)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'OK'})
+
     return JsonResponse({'status': 'Method not allowed'}, status=405)
 
+@staff_member_required
+def payment_inbox_metrics(request):
+    """Ukuran antrian dan lag inbox notifikasi pembayaran untuk monitoring."""
+    return JsonResponse(payment_inbox.inbox_metrics())
+
 @login_required
 def order_detail(request, order_id):
     """View untuk menampilkan detail pesanan."""
@@ -650,7 +804,7 @@ def category_list(request):
     categories = Category.objects.filter(is_active=True, parent=None)
     
     # Ambil data keranjang
-    data = cartData(request)
+    data = cartData(request, count_only=True)
     cartItems = data['cartItems']
     
     context = {
@@ -663,26 +817,26 @@ def category_detail(request, slug):
     """View untuk menampilkan produk dalam kategori tertentu."""
     category = get_object_or_404(Category, slug=slug, is_active=True)
     
-    # Dapatkan produk dari kategori ini dan subkategorinya
-    products_list = Product.objects.filter(kategori=category.name)
-    
-    # Jika kategori memiliki anak, tambahkan produk mereka juga
-    for child in category.children.filter(is_active=True):
-        child_products = Product.objects.filter(kategori=child.name)
-        products_list = products_list | child_products
+    # Dapatkan produk dari kategori ini dan seluruh subkategorinya (semua level)
+    products_list = category.get_subtree_products()
     
-    # Pagination - 12 products per page
-    paginator = Paginator(products_list, 12)
-    page_number = request.GET.get('page', 1)
-    products = paginator.get_page(page_number)
+    # Keyset pagination - 12 products per page
+    try:
+        products = paginate_request(
+            request, products_list, 12, count_cache_key=f"store:product_count:{category.pk}"
+        )
+    except PageMoved as moved:
+        return redirect(moved.url)
     
     # Ambil data keranjang
-    data = cartData(request)
+    data = cartData(request, count_only=True)
     cartItems = data['cartItems']
     
     context = {
         'category': category,
         'products': products,
+        'total_count': products.approximate_count,
+        'page_query': page_querystring(request),
         'cartItems': cartItems
     }
     return render(request, 'store/category_detail.html', context)
\ No newline at end of file